@@ -0,0 +1,134 @@
+"""
+Benchmarks the streaming compression of the file emitters. For each emitter and codec it reports the time spent in
+emit_vector (the cost seen by the sampling loop), the total time including the final flush, the compression ratio, and
+the throughput.
+
+Run from the project root with:
+    python -m benchmarks.bench_compression --samples 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from utils.compression import available_codecs
+from utils.emitters import CsvVectorEmitter, TsvVectorEmitter, BinaryVectorEmitter
+
+EMITTERS = {
+    "csv": CsvVectorEmitter,
+    "tsv": TsvVectorEmitter,
+    "bin": BinaryVectorEmitter,
+}
+
+
+def make_vectors(num_samples: int, seed: int = 0) -> list[tuple[float, float, float]]:
+    """
+    Builds a survey-like series of vectors: a slow walk in x and y with a smoothly varying depth
+
+    Args:
+        num_samples: The number of vectors to build
+        seed: A seed for the random number generator
+
+    Returns:
+        vectors: a list of [x y z] tuples
+    """
+    rng = random.Random(seed)
+    vectors = []
+    x, y, z = 0.0, 0.0, -20.0
+    for _ in range(num_samples):
+        x += 0.2
+        y += rng.uniform(-0.01, 0.01)
+        z += rng.gauss(0, 0.05)
+        vectors.append((x, y, z))
+    return vectors
+
+
+def bench_emitter(emitter_name: str, codec: str | None, vectors: list, directory: str) -> dict:
+    """
+    Times writing the vectors through one emitter and codec
+
+    Args:
+        emitter_name: A key of EMITTERS
+        codec: A codec name, or None for an uncompressed file
+        vectors: The vectors to write
+        directory: The directory to write the output file in
+
+    Returns:
+        result: the timings, output size, and throughput of the run
+    """
+    filename = os.path.join(directory, f"bench_{emitter_name}_{codec or 'none'}.out")
+    emitter = EMITTERS[emitter_name](filename, compression=codec)
+
+    start = time.perf_counter()
+    for vector in vectors:
+        emitter.emit_vector(vector)
+    emitted = time.perf_counter()
+    emitter.close()
+    closed = time.perf_counter()
+
+    return {
+        "emitter": emitter_name,
+        "codec": codec or "none",
+        "emit_secs": emitted - start,
+        "total_secs": closed - start,
+        "bytes": os.path.getsize(filename),
+        "samples_per_sec": len(vectors) / (closed - start),
+    }
+
+
+def run(num_samples: int) -> list[dict]:
+    """
+    Runs every emitter against no compression and every available codec
+
+    Args:
+        num_samples: The number of vectors to write per run
+
+    Returns:
+        results: one result per emitter and codec, with compression ratios relative to the uncompressed run
+    """
+    vectors = make_vectors(num_samples)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for emitter_name in EMITTERS:
+            raw = bench_emitter(emitter_name, None, vectors, directory)
+            raw["ratio"] = 1.0
+            results.append(raw)
+            for codec in available_codecs():
+                result = bench_emitter(emitter_name, codec, vectors, directory)
+                result["ratio"] = raw["bytes"] / result["bytes"]
+                result["mb_per_sec"] = raw["bytes"] / result["total_secs"] / 1e6
+                results.append(result)
+            raw["mb_per_sec"] = raw["bytes"] / raw["total_secs"] / 1e6
+    return results
+
+
+def print_table(results: list[dict]) -> None:
+    """
+    Prints the results as a table
+
+    Args:
+        results: The results of run()
+
+    Returns:
+        None
+    """
+    print(f"{'emitter':<8}{'codec':<8}{'emit s':>10}{'total s':>10}{'bytes':>14}{'ratio':>8}{'MB/s':>10}{'samples/s':>14}")
+    for r in results:
+        print(f"{r['emitter']:<8}{r['codec']:<8}{r['emit_secs']:>10.3f}{r['total_secs']:>10.3f}{r['bytes']:>14}"
+              f"{r['ratio']:>8.2f}{r['mb_per_sec']:>10.2f}{r['samples_per_sec']:>14.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the compression codecs of the file emitters")
+    parser.add_argument("--samples", type=int, default=100000, help="The number of vectors to write per run")
+    parser.add_argument("--output", default=None, help="Write the results to this json file")
+    cli_args = parser.parse_args(sys.argv[1:])
+
+    bench_results = run(cli_args.samples)
+    print_table(bench_results)
+    if cli_args.output:
+        with open(cli_args.output, "w") as f:
+            json.dump(bench_results, f, indent=4)
@@ -0,0 +1,214 @@
+"""
+Compares benchmark results against a stored baseline for the same machine, and exits non-zero when a benchmark has
+become slower by more than a tolerance.
+
+Run from the project root with:
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.compare results.json
+
+Baselines are stored per machine profile in benchmarks/baselines/<profile>.json, because timings from different
+machines cannot be compared. Record or refresh the baseline with --update.
+
+A benchmark is a regression only when both:
+    - its median duration is worse than the baseline's by more than the tolerance, and
+    - a one-sided Mann-Whitney U test on the repeats says the slowdown is unlikely to be noise.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+from functools import lru_cache
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Above this many repeats per side the normal approximation of the U distribution is used
+EXACT_LIMIT = 20
+
+
+@lru_cache(maxsize=None)
+def _u_count_(m: int, n: int, u: int) -> int:
+    """
+    Counts the orderings of m and n samples with a U statistic of exactly u
+
+    Args:
+        m: the size of the first sample
+        n: the size of the second sample
+        u: the U statistic
+
+    Returns:
+        count: the number of orderings
+    """
+    if u < 0 or u > m * n:
+        return 0
+    if m == 0 or n == 0:
+        return 1 if u == 0 else 0
+    return _u_count_(m - 1, n, u - n) + _u_count_(m, n - 1, u)
+
+
+def mann_whitney_greater(current: list[float], baseline: list[float]) -> float:
+    """
+    One-sided Mann-Whitney U test of whether the current samples tend to be larger (slower) than the baseline samples
+
+    Args:
+        current: the current durations
+        baseline: the baseline durations
+
+    Returns:
+        p_value: the probability of seeing a U statistic at least this large if both came from the same distribution
+    """
+    m, n = len(current), len(baseline)
+    if m == 0 or n == 0:
+        return 1.0
+
+    # Rank the pooled samples, giving ties their average rank
+    pooled = sorted([(v, 0) for v in current] + [(v, 1) for v in baseline])
+    ranks = [0.0] * len(pooled)
+    tie_term = 0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tie_term += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+
+    rank_sum = sum(r for r, (_, group) in zip(ranks, pooled) if group == 0)
+    u = rank_sum - m * (m + 1) / 2
+
+    if tie_term == 0 and m <= EXACT_LIMIT and n <= EXACT_LIMIT:
+        total = math.comb(m + n, m)
+        return sum(_u_count_(m, n, k) for k in range(math.ceil(u), m * n + 1)) / total
+
+    mean = m * n / 2
+    variance = m * n / 12 * ((m + n + 1) - tie_term / ((m + n) * (m + n - 1)))
+    if variance <= 0:
+        return 1.0
+    # Continuity corrected normal approximation
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(current: dict, baseline: dict, tolerance: float, alpha: float) -> list[dict]:
+    """
+    Compares every benchmark in the current results with the baseline
+
+    Args:
+        current: results written by benchmarks.run_benchmarks
+        baseline: baseline results in the same format
+        tolerance: the allowed fractional slowdown of the median, e.g. 0.1 for 10%
+        alpha: the significance level of the statistical test
+
+    Returns:
+        rows: one row per benchmark with the medians, change, p-value, and a status of ok, faster, slower (within
+            tolerance or not significant), regression, new, or missing
+    """
+    rows = []
+    current_benchmarks = current["benchmarks"]
+    baseline_benchmarks = baseline["benchmarks"]
+
+    for name in sorted(set(current_benchmarks) | set(baseline_benchmarks)):
+        row = {"name": name, "baseline_secs": None, "current_secs": None, "change": None, "p_value": None}
+        if name not in baseline_benchmarks:
+            row.update(current_secs=current_benchmarks[name]["median_secs"], status="new")
+        elif name not in current_benchmarks:
+            row.update(baseline_secs=baseline_benchmarks[name]["median_secs"], status="missing")
+        else:
+            # Durations are per repeat, so normalise by the operation count in case it changed
+            cur = [s / current_benchmarks[name]["ops"] for s in current_benchmarks[name]["samples"]]
+            base = [s / baseline_benchmarks[name]["ops"] for s in baseline_benchmarks[name]["samples"]]
+            cur_median = statistics.median(cur)
+            base_median = statistics.median(base)
+            change = cur_median / base_median - 1 if base_median > 0 else 0.0
+            p_value = mann_whitney_greater(cur, base)
+
+            if change > tolerance and p_value < alpha:
+                status = "regression"
+            elif change > 0:
+                status = "slower"
+            elif -change > tolerance and mann_whitney_greater(base, cur) < alpha:
+                status = "faster"
+            else:
+                status = "ok"
+            row.update(baseline_secs=base_median, current_secs=cur_median, change=change, p_value=p_value,
+                       status=status)
+        rows.append(row)
+    return rows
+
+
+def format_table(rows: list[dict]) -> str:
+    """
+    Formats the comparison as a diff table of per operation durations
+
+    Args:
+        rows: the rows returned by compare()
+
+    Returns:
+        table: the formatted table
+    """
+    def fmt_us(secs):
+        return f"{secs * 1e6:.2f}" if secs is not None else "-"
+
+    lines = [f"{'benchmark':<36}{'baseline us':>14}{'current us':>14}{'change':>10}{'p':>8}  status"]
+    for r in rows:
+        change = f"{r['change'] * 100:+.1f}%" if r["change"] is not None else "-"
+        p_value = f"{r['p_value']:.3f}" if r["p_value"] is not None else "-"
+        lines.append(f"{r['name']:<36}{fmt_us(r['baseline_secs']):>14}{fmt_us(r['current_secs']):>14}{change:>10}"
+                     f"{p_value:>8}  {r['status'].upper() if r['status'] == 'regression' else r['status']}")
+    return "\n".join(lines)
+
+
+def baseline_path(profile: str) -> str:
+    """
+    Finds where the baseline of a machine profile is stored
+
+    Args:
+        profile: the machine profile recorded in the results
+
+    Returns:
+        path: the path of the baseline file
+    """
+    return os.path.join(BASELINE_DIR, f"{profile}.json")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a stored baseline")
+    parser.add_argument("results", help="A results file written by benchmarks.run_benchmarks")
+    parser.add_argument("--baseline", default=None,
+                        help="The baseline file. Defaults to benchmarks/baselines/<profile>.json")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="The allowed slowdown of a median before it can fail, as a fraction. Defaults to 0.10")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="The significance level of the Mann-Whitney U test. Defaults to 0.05")
+    parser.add_argument("--update", action="store_true", help="Store the results as the new baseline")
+    cli_args = parser.parse_args(sys.argv[1:])
+
+    with open(cli_args.results) as f:
+        current_results = json.load(f)
+    path = cli_args.baseline or baseline_path(current_results["meta"]["profile"])
+
+    if cli_args.update:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(current_results, f, indent=4)
+        print(f"Stored the baseline at {path}")
+        sys.exit(0)
+
+    if not os.path.exists(path):
+        print(f"No baseline at {path}. Record one with --update.")
+        sys.exit(2)
+
+    with open(path) as f:
+        baseline_results = json.load(f)
+
+    comparison = compare(current_results, baseline_results, cli_args.tolerance, cli_args.alpha)
+    print(format_table(comparison))
+
+    regressions = [r["name"] for r in comparison if r["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {cli_args.tolerance:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,301 @@
+"""
+Runs the performance benchmark suite against synthetic meshes (see utils.mesh_generation) at several scales and
+writes the results as json, so that numbers can be compared across commits.
+
+Run from the project root with:
+    python -m benchmarks.run_benchmarks --scales 10k 100k 1M --output results.json
+
+Every benchmark is repeated and keeps the raw duration of each repeat, so later comparisons can use the spread of the
+measurements and not just a single number.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils.emitters import StdOutVectorEmitter, CsvVectorEmitter, TsvVectorEmitter, BinaryVectorEmitter, \
+    LasVectorEmitter, NmeaUdpVectorEmitter, SharedMemoryVectorEmitter
+from utils.error_pipeline import Noise, FalseBottom, Dropout, run_pipeline
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh, parse_face_count
+from utils.sampling_procedures import parallel_track_sampling_generator
+
+
+def time_repeats(func, repeats: int) -> list[float]:
+    """
+    Times repeated calls of a function
+
+    Args:
+        func: a function that takes no arguments
+        repeats: the number of times to call it
+
+    Returns:
+        samples: the duration of each call in seconds
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_result(samples: list[float], ops: int, scale: int = None) -> dict:
+    """
+    Summarises the samples of one benchmark
+
+    Args:
+        samples: the duration of each repeat in seconds
+        ops: the number of operations performed per repeat
+        scale: [Optional] the number of faces in the mesh the benchmark ran against
+
+    Returns:
+        result: the raw samples, the operation count, and summary statistics
+    """
+    median = statistics.median(samples)
+    return {
+        "scale": scale,
+        "ops": ops,
+        "samples": samples,
+        "median_secs": median,
+        "min_secs": min(samples),
+        "secs_per_op": median / ops,
+        "ops_per_sec": ops / median if median > 0 else math.inf,
+    }
+
+
+def bench_mesh(num_faces: int, repeats: int, num_points: int) -> dict:
+    """
+    Benchmarks index construction and depth lookups against a synthetic mesh
+
+    Args:
+        num_faces: the approximate number of faces in the mesh
+        repeats: the number of repeats per benchmark
+        num_points: the number of lookups per repeat
+
+    Returns:
+        results: a mapping of benchmark name to result
+    """
+    results = {}
+    mesh = generate_trimesh(num_faces, terrain="fractal", channels=1, trenches=1, overhangs=10, seed=0)
+    scale = len(mesh.faces)
+
+    holder = {}
+
+    def build():
+        with contextlib.redirect_stdout(io.StringIO()):
+            holder["mesh"] = CustomTriMesh(mesh)
+
+    # Index construction dominates at large scales, so it is repeated less. Four repeats is the fewest that lets
+    # benchmarks.compare flag a slowdown at the 5% significance level.
+    results[f"index_build[{num_faces}]"] = make_result(time_repeats(build, max(1, min(repeats, 4))), 1, scale)
+    custom_mesh = holder["mesh"]
+
+    rng = np.random.default_rng(1)
+    (min_x, min_y, _), (max_x, max_y, _) = custom_mesh.bounds
+    points = np.column_stack((rng.uniform(min_x, max_x, num_points), rng.uniform(min_y, max_y, num_points))).tolist()
+
+    # Each lookup moves on to the next point, so repeats do not keep finding the same face in the cpu caches
+    next_point = itertools.cycle(points).__next__
+
+    def single():
+        x, y = next_point()
+        custom_mesh.get_shallowest_depth(x, y)
+
+    def sweep():
+        for x, y in points:
+            custom_mesh.get_shallowest_depth(x, y)
+
+    # A single lookup is too quick to time on its own, so each sample is the mean of a block of lookups
+    block = 100
+    single_samples = [s / block for s in time_repeats(lambda: [single() for _ in range(block)], repeats)]
+    results[f"single_lookup[{num_faces}]"] = make_result(single_samples, 1, scale)
+    # There is no batched lookup, so this is one call per point over every point, timed together
+    results[f"lookup_sweep[{num_faces}]"] = make_result(time_repeats(sweep, repeats), num_points, scale)
+
+    def path():
+        count = 0
+        for _ in parallel_track_sampling_generator(min_x, max_x, min_y, max_y, sample_rate=1,
+                                                   velocity=(max_x - min_x) / 200):
+            count += 1
+        holder["path_len"] = count
+
+    path()
+    results[f"path_generation[{num_faces}]"] = make_result(time_repeats(path, repeats), holder["path_len"], scale)
+    return results
+
+
+def bench_error_pipeline(repeats: int, num_vectors: int) -> dict:
+    """
+    Benchmarks a noise, false bottom, and dropout error pipeline
+
+    Args:
+        repeats: the number of repeats
+        num_vectors: the number of vectors per repeat
+
+    Returns:
+        results: a mapping of benchmark name to result
+    """
+    rng = random.Random(2)
+    vectors = [(rng.uniform(0, 1000), rng.uniform(0, 1000), rng.uniform(-50, -10)) for _ in range(num_vectors)]
+    false_bottom = FalseBottom(debris_size=5000, seed=3)
+    false_bottom.init_debris(0, 0, 1000, 1000)
+    errors = [Noise(0.05), false_bottom, Dropout(0.01)]
+
+    def pipeline():
+        for v in vectors:
+            run_pipeline(errors, v)
+
+    return {"error_pipeline": make_result(time_repeats(pipeline, repeats), num_vectors)}
+
+
+def bench_emitters(repeats: int, num_vectors: int) -> dict:
+    """
+    Benchmarks every emitter that does not need an external service
+
+    Args:
+        repeats: the number of repeats
+        num_vectors: the number of vectors per repeat
+
+    Returns:
+        results: a mapping of benchmark name to result
+    """
+    results = {}
+    vectors = [(i * 0.5, i * 0.25, -20.0 - (i % 100) * 0.01) for i in range(num_vectors)]
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink_address = f"127.0.0.1:{sink.getsockname()[1]}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        factories = {
+            "stdout": lambda i: StdOutVectorEmitter(),
+            "csv": lambda i: CsvVectorEmitter(os.path.join(directory, f"{i}.csv")),
+            "csv_gzip": lambda i: CsvVectorEmitter(os.path.join(directory, f"{i}.csv.gz")),
+            "tsv": lambda i: TsvVectorEmitter(os.path.join(directory, f"{i}.tsv")),
+            "bin": lambda i: BinaryVectorEmitter(os.path.join(directory, f"{i}.bin")),
+            "las": lambda i: LasVectorEmitter(os.path.join(directory, f"{i}.las")),
+            "nmea": lambda i: NmeaUdpVectorEmitter(sink_address, start_time=0),
+            "shm": lambda i: SharedMemoryVectorEmitter(f"echo_sim_bench_{os.getpid()}_{i}"),
+        }
+        for name, factory in factories.items():
+            samples = []
+            for i in range(repeats):
+                emitter = factory(i)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    for v in vectors:
+                        emitter.emit_vector(v)
+                    emitter.close()
+                    samples.append(time.perf_counter() - start)
+            results[f"emitter[{name}]"] = make_result(samples, num_vectors)
+
+    sink.close()
+    return results
+
+
+def git_commit() -> str | None:
+    """
+    Finds the commit the benchmarks are running against
+
+    Returns:
+        commit: the commit hash, or None if it could not be determined
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_profile() -> str:
+    """
+    Names the machine the benchmarks run on, so results are only compared against baselines from the same machine
+
+    Returns:
+        profile: a short name made of the host, platform, and cpu count
+    """
+    return f"{platform.node()}-{platform.system().lower()}-{platform.machine()}-{os.cpu_count()}cpu"
+
+
+def run(scales: list[int], repeats: int, num_points: int, num_vectors: int) -> dict:
+    """
+    Runs the full suite
+
+    Args:
+        scales: the face counts of the meshes to benchmark against
+        repeats: the number of repeats per benchmark
+        num_points: the number of lookups per repeat of the lookup benchmarks
+        num_vectors: the number of vectors per repeat of the pipeline and emitter benchmarks
+
+    Returns:
+        results: the run metadata and a mapping of benchmark name to result
+    """
+    benchmarks = {}
+    for num_faces in scales:
+        print(f"Benchmarking a mesh with ~{num_faces} faces", file=sys.stderr)
+        benchmarks.update(bench_mesh(num_faces, repeats, num_points))
+    print("Benchmarking the error pipeline", file=sys.stderr)
+    benchmarks.update(bench_error_pipeline(repeats, num_vectors))
+    print("Benchmarking the emitters", file=sys.stderr)
+    benchmarks.update(bench_emitters(repeats, num_vectors))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "profile": machine_profile(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "repeats": repeats,
+        },
+        "benchmarks": benchmarks,
+    }
+
+
+def print_table(results: dict) -> None:
+    """
+    Prints the median duration and throughput of every benchmark
+
+    Args:
+        results: The results of run()
+
+    Returns:
+        None
+    """
+    print(f"{'benchmark':<36}{'faces':>10}{'median s':>12}{'per op us':>12}{'ops/s':>14}")
+    for name, r in results["benchmarks"].items():
+        scale = r["scale"] if r["scale"] is not None else ""
+        print(f"{name:<36}{scale:>10}{r['median_secs']:>12.4f}{r['secs_per_op'] * 1e6:>12.2f}{r['ops_per_sec']:>14.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the echo sounding simulator benchmark suite")
+    parser.add_argument("--scales", nargs="+", default=["10k", "100k", "1M"],
+                        help="The face counts of the synthetic meshes, e.g. 10k 100k 1M 10M")
+    parser.add_argument("--repeats", type=int, default=5, help="The number of repeats per benchmark")
+    parser.add_argument("--points", type=int, default=2000, help="The number of depth lookups per repeat")
+    parser.add_argument("--vectors", type=int, default=20000,
+                        help="The number of vectors per repeat of the pipeline and emitter benchmarks")
+    parser.add_argument("--output", default=None, help="Write the results to this json file")
+    cli_args = parser.parse_args(sys.argv[1:])
+
+    bench_results = run([parse_face_count(s) for s in cli_args.scales], cli_args.repeats, cli_args.points,
+                        cli_args.vectors)
+    print_table(bench_results)
+    if cli_args.output:
+        with open(cli_args.output, "w") as f:
+            json.dump(bench_results, f, indent=4)
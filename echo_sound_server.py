@@ -0,0 +1,65 @@
+"""
+Simulator daemon entrypoint. Keeps meshes loaded and indexed between jobs and answers depth queries and simulation
+jobs over local HTTP, see utils.server
+"""
+import argparse
+import sys
+
+from utils.mesh import load_mesh
+from utils.server import MeshCache, make_server
+
+
+def parse_server_args(args) -> argparse.Namespace:
+    """
+    Parses the command line arguments of the daemon.
+    Args:
+        args: The arguments from sys.argv[1:]
+
+    Returns:
+        namespace: The parsed arguments in an argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="Serve depth queries and simulation jobs against cached meshes")
+    parser.add_argument("--host",
+                        default="127.0.0.1",
+                        help="The address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port",
+                        type=int,
+                        default=8765,
+                        help="The TCP port to listen on. Defaults to 8765.")
+    parser.add_argument("--unix_socket",
+                        default=None,
+                        help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--cache_size",
+                        type=int,
+                        default=4,
+                        help="The number of meshes to keep loaded before evicting the least recently used. Defaults "
+                             "to 4.")
+    parser.add_argument("--field_split",
+                        type=int,
+                        default=1000,
+                        help="The number of search bins along each axis of a mesh index. Defaults to 1000.")
+    parser.add_argument("--preload",
+                        nargs="+",
+                        default=[],
+                        help="Meshes to load and index before accepting requests")
+    parser.add_argument("--quiet",
+                        action="store_true",
+                        help="Do not log requests")
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_server_args(sys.argv[1:])
+    cache = MeshCache(args.cache_size, loader=lambda key: load_mesh(key, field_split=args.field_split))
+    for data_file in args.preload:
+        cache.get(data_file)
+
+    server = make_server(cache, args.host, args.port, args.unix_socket, args.quiet)
+    where = args.unix_socket if args.unix_socket else f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -2,48 +2,171 @@
 Main program entrypoint
 """
 import sys
-import time
 
-import trimesh
+from utils.checkpoint import Checkpointer
+from utils.coherence import CoherentLookup
+from utils.cli_parsing import parse_args, checkpoint_settings
+from utils.config_files import load_config
+from utils.depth_cache import DepthCache
+from utils.error_pipeline import init_pipeline
+from utils.fleet import Vessel, vessels_from_config, run_fleet
+from utils.footprint import FootprintSounder
+from utils.mesh import load_mesh
+from utils.multibeam import MultibeamSounder, sample_swaths
+from utils.profiling import Profiler, phase
+from utils.report import RunReport
+from utils.sampling_procedures import parallel_track_sampling_generator, drawn_path_sampling_generator, \
+    planned_path_sampling_generator, sample_path, calculate_step_value
+from utils.scheduling import DeadlineScheduler
+from utils.survey_planning import plan_survey
+from utils.timing import registry
+from utils.truth import record_truth, load_truth, init_replay_errors, replay
 
-from utils.cli_parsing import parse_args
-from utils.error_pipeline import FalseBottom
-from utils.mesh import CustomTriMesh
-from utils.sampling_procedures import parallel_track_sampling_generator, process_position, \
-    drawn_path_sampling_generator
 
-
-def run_sampling(path, wait_secs, side_effect=None) -> None:
+def run_sampling(path, scheduler, side_effect=None) -> None:
     """
-    Takes an iterator the yields x and y coordinates and runs a sampling path
+    Takes an iterator the yields x and y coordinates and runs a sampling path with the run's sounder, pinging every
+    beam at each position if it is a multibeam sounder
     Args:
         path (iterator): an iterator the yields x and y coordinates
-        wait_secs (float): a number of seconds to wait between samples
+        scheduler (DeadlineScheduler): paces the samples, including those off the mesh, to the sample rate
         side_effect (callable): a function that takes a vector that we want to have as
             a side effect of the path sampling
 
     Returns:
         None
     """
-    for x, y in path:
-        t1 = time.time()
-        new_vector = process_position(mesh, x, y, args.errors)
-        if new_vector is not None:
-            emitter.emit_vector(new_vector)
+    if isinstance(sounder, MultibeamSounder):
+        sample_swaths(sounder, path, args.errors, emitter, scheduler, report)
+    else:
+        sample_path(sounder, path, args.errors, emitter, scheduler, report, side_effect, checkpointer)
+
+
+def make_sounder():
+    """
+    Makes what looks up the depths of the run: a multibeam sounder if --beams was given, the footprint of a single
+    beam if --beam_width was given, a coherent lookup if --coherent_lookup was given, or otherwise the mesh itself.
+    Single beam lookups go through a depth cache if --depth_cache was given.
+
+    Returns:
+        sounder: a MultibeamSounder, or anything with a get_shallowest_depth(x, y)
+    """
+    if args.beams is not None:
+        return MultibeamSounder(mesh, beams=args.beams, swath_angle=args.swath_angle)
+    if args.beam_width is not None:
+        sounder = FootprintSounder(mesh, args.beam_width, args.sub_rays)
+    elif args.coherent_lookup:
+        sounder = CoherentLookup(mesh)
+    else:
+        sounder = mesh
+    if args.depth_cache is not None:
+        sounder = DepthCache(sounder, args.depth_cache, args.depth_cache_entries)
+    return sounder
+
+
+def single_pass_path():
+    """
+    Makes the path of a parallel track or planned survey, which are sampled once
+
+    Returns:
+        path (iterator): an iterator the yields x and y coordinates
+    """
+    if args.path_type == "planned":
+        line_spacing = args.line_spacing or calculate_step_value(args.sample_rate, args.velocity)
+        plan = plan_survey(mesh, line_spacing, args.heading)
+        print(plan.format_text())
+        return planned_path_sampling_generator(plan.lines, velocity=args.velocity, sample_rate=args.sample_rate)
+    return parallel_track_sampling_generator(
+        min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y, velocity=args.velocity, sample_rate=args.sample_rate
+    )
+
+
+def make_checkpointer() -> Checkpointer | None:
+    """
+    Sets up checkpoints of the run and restores the last one when resuming, if they were asked for
+
+    Returns:
+        checkpointer: the run's Checkpointer, or None
+    """
+    if args.checkpoint is None:
+        return None
+    checkpointer = Checkpointer(args.checkpoint, args.checkpoint_every, checkpoint_settings(args))
+    if args.resume:
+        print(f"Resuming from position {checkpointer.resume(args.errors, emitter)} of {args.checkpoint}")
+    return checkpointer
+
+
+def make_fleet() -> list[Vessel]:
+    """
+    Builds the vessels of the --fleet configuration, exiting with an error if it is invalid
+
+    Returns:
+        vessels: the configured vessels
+    """
+    try:
+        return vessels_from_config(load_config(args.fleet), sample_rate=args.sample_rate, velocity=args.velocity,
+                                   time_scale=args.time_scale, late_policy=args.late_policy, paced=not args.no_wait,
+                                   compression=args.compression, origin=args.origin)
+    except ValueError as e:
+        sys.exit(f"Invalid fleet configuration {args.fleet}: {e}")
+
+
+def replay_recording() -> None:
+    """
+    Replays the error pipeline over the ground truth recording given as the data file
+
+    Returns:
+        None
+    """
+    soundings = load_truth(args.data_file)
+    init_replay_errors(soundings, args.errors)
+    summary = replay(soundings, args.errors, emitter, report=report)
+    print(f"Replayed {summary['soundings']} soundings in {summary['secs']:.2f} s "
+          f"({summary['soundings_per_sec']:.0f} soundings/s)")
 
-            if side_effect:
-                side_effect(new_vector)
 
-            t2 = time.time()
-            time.sleep(max(wait_secs - (t2 - t1), 0))
+def finish() -> None:
+    """
+    Releases the emitter and reports the run's metrics, performance, and profile, if they were asked for
+
+    Returns:
+        None
+    """
+    with phase("emission"):
+        emitter.close()
+    if registry.enabled:
+        print(registry.format_text())
+        if args.metrics:
+            registry.dump(args.metrics)
+    if args.report is not None:
+        print(report.format_text())
+        if args.report:
+            report.dump(args.report)
+    if profiler is not None:
+        paths = profiler.stop()
+        print(profiler.format_text())
+        print(f"Profile written to {', '.join(paths)}")
 
 
 if __name__ == '__main__':
     # Get cli arguments
     args = parse_args(sys.argv[1:])
+    registry.enabled = args.metrics is not None
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler(args.profile, args.profile_output)
+        profiler.start()
+
+    emitter = args.emitter_type
+    report = RunReport(sample_rate=args.sample_rate * args.time_scale, record_stages=args.report is not None)
+
+    # A replay only reads the recording, so no mesh is loaded
+    if args.replay:
+        replay_recording()
+        finish()
+        sys.exit(0)
 
-    # Import data file
-    mesh = CustomTriMesh(trimesh.load(args.data_file))
+    mesh = load_mesh(args.data_file, merge_vertices=args.merge_vertices)
 
     # get movement parameters
     min_x, min_y, _ = mesh.bounds[0]
@@ -60,18 +183,22 @@ if __name__ == '__main__':
     }
 
     # Perform any additional setup for the error pipeline
-    for err in args.errors:
-        if isinstance(err, FalseBottom):
-            err.init_debris(min_x, min_y, max_x, max_y)
-
-    # calculate wait time
-    wait = not args.no_wait
-    if wait:
-        wait_secs = 1 / args.sample_rate
-    else:
-        wait_secs = 0
+    init_pipeline(args.errors, min_x, min_y, max_x, max_y)
+
+    # Pace samples against the wall clock, unless waiting is disabled
+    scheduler = DeadlineScheduler(args.sample_rate, time_scale=args.time_scale, late_policy=args.late_policy,
+                                  paced=not args.no_wait)
+
+    checkpointer = make_checkpointer()
+
+    # A fleet shares the mesh between its vessels and runs them all at once
+    if args.fleet is not None:
+        report = run_fleet(mesh, make_fleet(), record_stages=args.report is not None)
+        finish()
+        sys.exit(0)
+
+    sounder = make_sounder()
 
-    emitter = args.emitter_type
     while True:
         # Get the Sampling Path Type
         if args.path_type == "drawn":
@@ -79,16 +206,20 @@ if __name__ == '__main__':
             # Exit if we don't get a path
             if len(path_points) == 0:
                 print("No Path received")
+                finish()
                 sys.exit(0)
 
             path_generator = drawn_path_sampling_generator(
                 path_coords=path_points, velocity=args.velocity, sample_rate=args.sample_rate
             )
-            run_sampling(path=path_generator, wait_secs=wait_secs, side_effect=mesh.add_depth_reading)
-        elif args.path_type == "parallel":
-            path_generator = parallel_track_sampling_generator(
-                min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y, velocity=args.velocity, sample_rate=args.sample_rate
-            )
-            run_sampling(path_generator, wait_secs)
+            run_sampling(path=path_generator, scheduler=scheduler, side_effect=mesh.add_depth_reading)
+        else:
+            path_generator = single_pass_path()
+            if args.record_truth is not None:
+                count = record_truth(mesh, path_generator, args.record_truth)
+                print(f"Recorded {count} soundings to {args.record_truth}")
+            else:
+                run_sampling(path_generator, scheduler)
             # exit after the pass
+            finish()
             sys.exit(0)
@@ -19,7 +19,31 @@ class TestArgumentParsing(unittest.TestCase):
                                                              "velocity",
                                                              "emitter_type",
                                                              "no_wait",
-                                                             "path_type"})
+                                                             "fleet",
+                                                             "time_scale",
+                                                             "late_policy",
+                                                             "path_type",
+                                                             "compression",
+                                                             "origin",
+                                                             "metrics",
+                                                             "report",
+                                                             "profile",
+                                                             "profile_output",
+                                                             "checkpoint",
+                                                             "checkpoint_every",
+                                                             "resume",
+                                                             "record_truth",
+                                                             "replay",
+                                                             "line_spacing",
+                                                             "heading",
+                                                             "beams",
+                                                             "swath_angle",
+                                                             "beam_width",
+                                                             "sub_rays",
+                                                             "coherent_lookup",
+                                                             "depth_cache",
+                                                             "depth_cache_entries",
+                                                             "merge_vertices"})
         self.assertEqual(arg_space.errors, [])
         self.assertEqual(arg_space.sample_rate, 1)
         self.assertEqual(arg_space.data_file, "test.stl")
@@ -79,6 +103,9 @@ class TestArgumentParsing(unittest.TestCase):
         self.assertEqual(arg_space1.errors, [Noise(0.05), Noise(0.1), Noise(0.01)])
         self.assertEqual(arg_space2.errors, [Noise(0.1), Noise(0.006), Noise(0.9)])
 
+    def test_checkpointing_a_truth_recording_causes_system_exit(self):
+        self.assertRaises(SystemExit, parse_args, ["test.stl", "--checkpoint", "run.json", "--record_truth", "t.bin"])
+
     def test_custom_velocity(self):
         args1 = ["test.stl", "--velocity=5"]
         args2 = ["test.stl", "-vel=0.1"]
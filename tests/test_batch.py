@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils import batch
+from utils.batch import scenarios_from_config, group_by_mesh, run_batch, run_pooled_scenario, format_manifest
+
+
+class TestScenarioConfig(unittest.TestCase):
+    def test_defaults_fill_in_missing_settings(self):
+        config = {
+            "defaults": {"mesh": "a.stl", "sample_rate": 5},
+            "scenarios": [{"name": "one", "velocity": 3}, {"mesh": "b.stl", "errors": ["noise@0.05"]}],
+        }
+        one, two = scenarios_from_config(config)
+
+        self.assertEqual({"name": "one", "mesh": "a.stl", "sample_rate": 5, "velocity": 3, "errors": [],
+                          "emitter": "stdout"}, one)
+        self.assertEqual("scenario-2", two["name"])
+        self.assertEqual("b.stl", two["mesh"])
+        self.assertEqual(["noise@0.05"], two["errors"])
+
+    def test_invalid_configurations(self):
+        self.assertRaises(ValueError, scenarios_from_config, {"scenarios": []})
+        self.assertRaises(ValueError, scenarios_from_config, {"scenarios": [{"name": "no mesh"}]})
+        self.assertRaises(ValueError, scenarios_from_config, {"scenarios": [{"mesh": "a.stl", "speed": 1}]})
+        self.assertRaises(ValueError, scenarios_from_config,
+                          {"scenarios": [{"mesh": "a.stl", "name": "x"}, {"mesh": "b.stl", "name": "x"}]})
+        self.assertRaises(ValueError, scenarios_from_config, {"scenarios": [{"mesh": "a.stl", "depth_cache": 0}]})
+
+    def test_relative_paths_are_resolved_against_the_configuration(self):
+        config = {"scenarios": [
+            {"name": "file", "mesh": "meshes/a.stl", "emitter": "csv@out/a.csv"},
+            {"name": "absolute", "mesh": "/data/b.stl", "emitter": "bin@/data/out/b.bin"},
+            {"name": "other", "mesh": "synthetic:200:flat:0", "emitter": "nmea@localhost:10110"},
+        ]}
+        relative, absolute, other = scenarios_from_config(config, base_dir="/configs")
+
+        self.assertEqual(os.path.join("/configs", "meshes/a.stl"), relative["mesh"])
+        self.assertEqual("csv@" + os.path.join("/configs", "out/a.csv"), relative["emitter"])
+        self.assertEqual("/data/b.stl", absolute["mesh"])
+        self.assertEqual("bin@/data/out/b.bin", absolute["emitter"])
+        self.assertEqual("synthetic:200:flat:0", other["mesh"])
+        self.assertEqual("nmea@localhost:10110", other["emitter"])
+        self.assertEqual("meshes/a.stl", scenarios_from_config(config)[0]["mesh"])
+
+    def test_scenarios_are_grouped_by_mesh_largest_first(self):
+        scenarios = scenarios_from_config({"scenarios": [
+            {"mesh": "a.stl"}, {"mesh": "b.stl"}, {"mesh": "b.stl"}, {"mesh": "a.stl"}, {"mesh": "b.stl"},
+        ]})
+        groups = group_by_mesh(scenarios)
+
+        self.assertEqual(["b.stl", "a.stl"], list(groups))
+        self.assertEqual(["scenario-2", "scenario-3", "scenario-5"], [s["name"] for s in groups["b.stl"]])
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_batch_writes_outputs_and_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = {
+                "field_split": 50,
+                "defaults": {"mesh": "synthetic:200:flat:0", "velocity": 100},
+                "scenarios": [
+                    {"name": "clean", "emitter": f"bin@{directory}/out/clean.bin"},
+                    {"name": "noisy", "errors": ["noise@0.05", "drop@0.01"],
+                     "emitter": f"bin@{directory}/out/noisy.bin"},
+                    {"name": "other", "mesh": "synthetic:200:perlin:1", "emitter": f"csv@{directory}/other.csv"},
+                    {"name": "missing", "mesh": os.path.join(directory, "missing.stl")},
+                ],
+            }
+            manifest = run_batch(config, workers=2)
+
+            clean = np.fromfile(os.path.join(directory, "out", "clean.bin"), dtype="<f8").reshape(-1, 3)
+            noisy = np.fromfile(os.path.join(directory, "out", "noisy.bin"), dtype="<f8").reshape(-1, 3)
+            self.assertTrue(os.path.exists(os.path.join(directory, "other.csv")))
+
+        self.assertEqual(["clean", "noisy", "other", "missing"], [r["name"] for r in manifest["scenarios"]])
+        self.assertEqual(["ok", "ok", "ok", "failed"], [r["status"] for r in manifest["scenarios"]])
+        self.assertEqual(1, manifest["failed"])
+        self.assertEqual(3, len(manifest["meshes"]))
+        self.assertTrue(all(1 <= m["loads"] <= 2 for m in manifest["meshes"]))
+        self.assertEqual(len(clean), manifest["scenarios"][0]["report"]["emitted"])
+        self.assertEqual(len(clean), len(noisy))
+        self.assertIn("Could not load the mesh", manifest["scenarios"][3]["error"])
+        self.assertIn("noisy", format_manifest(manifest))
+
+    def test_outputs_are_written_next_to_the_configuration(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = {"field_split": 50, "scenarios": [
+                {"mesh": "synthetic:200:flat:0", "velocity": 100, "emitter": "bin@out/clean.bin"},
+            ]}
+            manifest = run_batch(config, workers=1, base_dir=directory)
+
+            self.assertEqual("ok", manifest["scenarios"][0]["status"])
+            self.assertTrue(os.path.exists(os.path.join(directory, "out", "clean.bin")))
+
+
+class TestPooledScenario(unittest.TestCase):
+    def tearDown(self):
+        batch._worker_mesh_.clear()
+
+    def test_a_worker_loads_each_mesh_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first, second, other = scenarios_from_config({
+                "defaults": {"mesh": "synthetic:200:flat:0", "velocity": 100},
+                "scenarios": [{"emitter": f"bin@{directory}/first.bin"}, {"emitter": f"bin@{directory}/second.bin"},
+                              {"mesh": "synthetic:200:perlin:1", "emitter": f"bin@{directory}/other.bin"}],
+            })
+            results = [run_pooled_scenario(s, field_split=50) for s in (first, second, other)]
+
+        self.assertEqual(["ok"] * 3, [r["status"] for r in results])
+        self.assertIsNotNone(results[0]["load_secs"])
+        self.assertIsNone(results[1]["load_secs"])
+        self.assertIsNotNone(results[2]["load_secs"])
+
+    def test_a_mesh_that_fails_to_load_fails_its_scenarios(self):
+        scenario = scenarios_from_config({"scenarios": [{"mesh": "missing.stl"}]})[0]
+        first, second = run_pooled_scenario(scenario), run_pooled_scenario(scenario)
+
+        self.assertEqual(["failed", "failed"], [first["status"], second["status"]])
+        self.assertIn("Could not load the mesh", second["error"])
+        self.assertIsNone(second["load_secs"])
+
+    def test_scenarios_with_the_same_tolerance_share_a_depth_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            scenarios = scenarios_from_config({
+                "defaults": {"mesh": "synthetic:200:perlin:1", "velocity": 100, "depth_cache": 0.5},
+                "scenarios": [{"name": "first", "emitter": f"bin@{directory}/first.bin"},
+                              {"name": "second", "emitter": f"bin@{directory}/second.bin"}],
+            })
+            first, second = (run_pooled_scenario(s, field_split=50) for s in scenarios)
+
+            self.assertEqual(0, first["report"]["lookups"]["hits"])
+            self.assertEqual(0, second["report"]["lookups"]["misses"] - first["report"]["lookups"]["misses"])
+            self.assertEqual(first["report"]["samples"], second["report"]["lookups"]["hits"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from benchmarks.compare import mann_whitney_greater, compare
+
+
+def results(**benchmarks):
+    return {"meta": {}, "benchmarks": {
+        name: {"ops": 1, "samples": samples, "median_secs": sorted(samples)[len(samples) // 2]}
+        for name, samples in benchmarks.items()
+    }}
+
+
+class TestMannWhitney(unittest.TestCase):
+    def test_fully_separated_samples_have_smallest_exact_p(self):
+        # 1 of the C(10, 5) = 252 orderings has every current sample above every baseline sample
+        p = mann_whitney_greater([6, 7, 8, 9, 10], [1, 2, 3, 4, 5])
+        self.assertAlmostEqual(1 / 252, p)
+
+    def test_faster_samples_are_not_significant(self):
+        p = mann_whitney_greater([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertAlmostEqual(1.0, p)
+
+    def test_identical_samples_are_not_significant(self):
+        p = mann_whitney_greater([1.0] * 5, [1.0] * 5)
+        self.assertGreater(p, 0.4)
+
+    def test_large_samples_use_normal_approximation(self):
+        p = mann_whitney_greater([i + 100 for i in range(30)], list(range(30)))
+        self.assertLess(p, 1e-6)
+
+
+class TestCompare(unittest.TestCase):
+    def test_significant_slowdown_beyond_tolerance_is_a_regression(self):
+        rows = compare(results(a=[2.0, 2.1, 2.2, 2.3, 2.4]), results(a=[1.0, 1.1, 1.2, 1.3, 1.4]), 0.1, 0.05)
+        self.assertEqual("regression", rows[0]["status"])
+        self.assertGreater(rows[0]["change"], 0.1)
+
+    def test_slowdown_within_tolerance_is_not_a_regression(self):
+        rows = compare(results(a=[1.05, 1.06, 1.07, 1.08, 1.09]), results(a=[1.0, 1.01, 1.02, 1.03, 1.04]), 0.1, 0.05)
+        self.assertEqual("slower", rows[0]["status"])
+
+    def test_noisy_slowdown_is_not_a_regression(self):
+        rows = compare(results(a=[0.5, 1.5, 3.0]), results(a=[1.0, 1.2, 0.4]), 0.1, 0.05)
+        self.assertNotEqual("regression", rows[0]["status"])
+
+    def test_speedup_is_faster(self):
+        rows = compare(results(a=[1.0, 1.1, 1.2, 1.3, 1.4]), results(a=[2.0, 2.1, 2.2, 2.3, 2.4]), 0.1, 0.05)
+        self.assertEqual("faster", rows[0]["status"])
+
+    def test_new_and_missing_benchmarks(self):
+        rows = compare(results(new=[1.0]), results(old=[1.0]), 0.1, 0.05)
+        self.assertEqual({"new": "new", "old": "missing"}, {r["name"]: r["status"] for r in rows})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.checkpoint import Checkpointer, load_checkpoint
+from utils.cli_parsing import parse_args, checkpoint_settings
+from utils.emitters import CsvVectorEmitter, BinaryVectorEmitter, LasVectorEmitter
+from utils.error_pipeline import Noise, FalseBottom, Dropout
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.report import RunReport
+from utils.sampling_procedures import parallel_track_sampling_generator, sample_path
+from utils.scheduling import DeadlineScheduler
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(path, positions):
+    for i, position in enumerate(path):
+        if i == positions:
+            raise Crash()
+        yield position
+
+
+class TestErrorStates(unittest.TestCase):
+    def test_noise_and_dropout_carry_on_from_a_restored_state(self):
+        for make in (lambda seed: Noise(0.1, seed=seed), lambda seed: Dropout(0.4, seed=seed)):
+            err = make(1)
+            first = [err.eval((0, 0, 10.0)) for _ in range(5)]
+            state = json.loads(json.dumps(err.get_state()))
+            expected = [err.eval((0, 0, 10.0)) for _ in range(20)]
+
+            restored = make(2)
+            restored.set_state(state)
+            self.assertNotEqual(first, [make(2).eval((0, 0, 10.0)) for _ in range(5)])
+            self.assertEqual(expected, [restored.eval((0, 0, 10.0)) for _ in range(20)])
+
+    def test_dropout_state_includes_its_streak(self):
+        err = Dropout(1.0, seed=0)
+        for _ in range(3):
+            err.eval((0, 0, 10.0))
+        restored = Dropout(1.0)
+        restored.set_state(err.get_state())
+        self.assertEqual(3, restored.drops_in_a_row)
+
+    def test_false_bottom_state_includes_unseeded_debris_and_depth(self):
+        err = FalseBottom(debris_size=1e6)
+        err.init_debris(0, 0, 1000, 1000)
+        p1, p2, p4 = err.debris_tris[0]
+        centre = (p1 + p4) / 2
+        err.eval((centre[0], centre[1], -20.0))
+
+        restored = FalseBottom(debris_size=1e6)
+        restored.init_debris(0, 0, 1000, 1000)
+        restored.set_state(json.loads(json.dumps(err.get_state())))
+        self.assertEqual((centre[0], centre[1], -10.0), restored.eval((centre[0], centre[1], -30.0)))
+
+
+class TestCheckpointer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                     field_split=50)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.directory.name, "run.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_path(self, emitter, errors, checkpointer, crash_at=None):
+        (min_x, min_y, _), (max_x, max_y, _) = self.mesh.bounds
+        path = parallel_track_sampling_generator(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+                                                 sample_rate=1, velocity=100)
+        if crash_at is not None:
+            path = crash_after(path, crash_at)
+        sample_path(self.mesh, path, errors, emitter, DeadlineScheduler(1, paced=False), RunReport(), None,
+                    checkpointer)
+        emitter.close()
+
+    def test_resumed_run_output_is_byte_identical(self):
+        emitters = [
+            ("csv", lambda f: CsvVectorEmitter(f)),
+            ("csv.gz", lambda f: CsvVectorEmitter(f)),
+            ("bin", lambda f: BinaryVectorEmitter(f, chunk_records=8)),
+            ("las", lambda f: LasVectorEmitter(f, chunk_records=8)),
+        ]
+        for extension, make_emitter in emitters:
+            with self.subTest(extension):
+                # gzip headers hold the file name, so both runs write files of the same name
+                os.makedirs(os.path.join(self.directory.name, "reference"), exist_ok=True)
+                reference = os.path.join(self.directory.name, "reference", f"out.{extension}")
+                self.run_path(make_emitter(reference), [Noise(0.1, seed=1), Dropout(0.2, seed=2)],
+                              Checkpointer(os.path.join(self.directory.name, "reference.json"), every=7))
+
+                resumed = os.path.join(self.directory.name, f"out.{extension}")
+                with self.assertRaises(Crash):
+                    self.run_path(make_emitter(resumed), [Noise(0.1, seed=1), Dropout(0.2, seed=2)],
+                                  Checkpointer(self.checkpoint, every=7), crash_at=45)
+
+                checkpointer = Checkpointer(self.checkpoint, every=7)
+                errors = [Noise(0.1, seed=3), Dropout(0.2, seed=4)]
+                emitter = make_emitter(resumed)
+                self.assertEqual(42, checkpointer.resume(errors, emitter))
+                self.run_path(emitter, errors, checkpointer)
+
+                with open(reference, "rb") as f1, open(resumed, "rb") as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+    def test_resume_rejects_different_settings_or_pipeline(self):
+        Checkpointer(self.checkpoint, settings={"velocity": 1.0}).save([Noise(0.1)], CsvVectorEmitter("unused.csv"))
+
+        with self.assertRaises(ValueError):
+            Checkpointer(self.checkpoint, settings={"velocity": 2.0}).resume([Noise(0.1)], CsvVectorEmitter("x.csv"))
+        with self.assertRaises(ValueError):
+            Checkpointer(self.checkpoint, settings={"velocity": 1.0}).resume([Dropout(0.1)], CsvVectorEmitter("x.csv"))
+        with self.assertRaises(ValueError):
+            Checkpointer(self.checkpoint, settings={"velocity": 1.0}).resume([Noise(0.1)], BinaryVectorEmitter("x.bin"))
+
+    def test_resume_rejects_a_run_with_a_different_lookup_or_pipeline(self):
+        def settings(*args, errors="noise@0.05"):
+            return checkpoint_settings(parse_args(["synthetic:200:flat:0", "-e", errors, *args]))
+
+        Checkpointer(self.checkpoint, settings=settings()).save([Noise(0.05)], CsvVectorEmitter("unused.csv"))
+
+        for different in (settings(errors="noise@0.1"), settings(errors="fb@0.05"), settings("--merge_vertices"),
+                          settings("--coherent_lookup"), settings("--depth_cache", "0.5"),
+                          settings("--depth_cache_entries", "10")):
+            with self.subTest(different):
+                with self.assertRaisesRegex(ValueError, "different settings"):
+                    Checkpointer(self.checkpoint, settings=different).resume([Noise(0.05)], CsvVectorEmitter("x.csv"))
+        resumed = Checkpointer(self.checkpoint, settings=settings())
+        self.assertEqual(0, resumed.resume([Noise(0.05)], CsvVectorEmitter("x.csv")))
+
+    def test_output_is_synced_before_the_checkpoint(self):
+        real_fsync = os.fsync
+        for extension, make_emitter in [("csv", CsvVectorEmitter), ("csv.gz", CsvVectorEmitter),
+                                        ("las", LasVectorEmitter)]:
+            with self.subTest(extension):
+                output = os.path.join(self.directory.name, f"synced.{extension}")
+                emitter = make_emitter(output)
+                checkpointer = Checkpointer(self.checkpoint)
+                synced = []
+
+                def fsync(fd):
+                    synced.append(os.fstat(fd).st_ino)
+                    real_fsync(fd)
+
+                with mock.patch("os.fsync", fsync):
+                    emitter.emit_vector([1.0, 2.0, -3.0])
+                    checkpointer.save([], emitter)
+                    emitter.emit_vector([1.0, 2.0, -4.0])
+                    checkpointer.save([], emitter)
+                emitter.close()
+
+                names = {os.stat(output).st_ino: "output", os.stat(self.directory.name).st_ino: "directory"}
+                synced = [names.get(inode, "checkpoint") for inode in synced]
+                first_save = ["output", "directory"] if os.name == "posix" else ["output"]
+                self.assertEqual(first_save + ["checkpoint", "output", "checkpoint"], synced)
+
+    def test_checkpoints_are_saved_every_n_positions(self):
+        checkpointer = Checkpointer(self.checkpoint, every=3)
+        saved = [checkpointer.advance([], CsvVectorEmitter(os.path.join(self.directory.name, "out.csv")))
+                 for _ in range(7)]
+
+        self.assertEqual([False, False, True, False, False, True, False], saved)
+        self.assertEqual(2, checkpointer.saves)
+        self.assertEqual(6, load_checkpoint(self.checkpoint)["position"])
+        self.assertFalse(os.path.exists(self.checkpoint + ".tmp"))
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+import trimesh
+
+from utils.cli_parsing import parse_args
+from utils.coherence import CoherentLookup, _connected_
+from utils.emitters import VectorEmitter
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.report import RunReport
+from utils.sampling_procedures import sample_path
+from utils.scheduling import DeadlineScheduler
+
+
+class TestCoherentLookup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(generate_trimesh(2000, terrain="fractal", channels=0, trenches=0, seed=0),
+                                     field_split=20)
+
+    def test_depths_match_the_mesh(self):
+        lookup = CoherentLookup(self.mesh)
+        path = [(x, y) for y in np.linspace(-50, 1050, 12) for x in np.linspace(-50, 1050, 300)]
+        for x, y in path:
+            expected = self.mesh.get_shallowest_depth(x, y)
+            if expected is None:
+                self.assertIsNone(lookup.get_shallowest_depth(x, y))
+            else:
+                self.assertAlmostEqual(expected, lookup.get_shallowest_depth(x, y))
+
+    def test_consecutive_samples_are_found_near_the_last_face(self):
+        lookup = CoherentLookup(self.mesh)
+        self.assertTrue(lookup.single_layer)
+        for x in np.linspace(100, 900, 2000):
+            lookup.get_shallowest_depth(x, 500.0)
+
+        stats = lookup.stats()
+        self.assertEqual(2000, stats["face_hits"] + stats["neighbour_hits"] + stats["bin_hits"] + stats["searches"])
+        self.assertGreater(stats["face_hits"], stats["neighbour_hits"])
+        self.assertGreater(lookup.hit_rate, 0.9)
+
+    def test_neighbours_share_a_vertex(self):
+        lookup = CoherentLookup(self.mesh)
+        face = set(self.mesh.faces[10].tolist())
+        neighbours = lookup.neighbours(10)
+        self.assertNotIn(10, neighbours)
+        self.assertGreater(len(neighbours), 3)
+        for n in neighbours:
+            self.assertTrue(face & set(self.mesh.faces[n].tolist()))
+
+    def test_layered_meshes_always_search(self):
+        floor = trimesh.Trimesh(vertices=[[0, 0, -20], [100, 0, -20], [100, 100, -20], [0, 100, -20]],
+                                faces=[[0, 1, 2], [0, 2, 3]])
+        shelf = trimesh.Trimesh(vertices=[[40, 40, -5], [60, 40, -5], [60, 60, -5], [40, 60, -5]],
+                                faces=[[0, 1, 2], [0, 2, 3]])
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(trimesh.util.concatenate([floor, shelf]), field_split=10)
+        lookup = CoherentLookup(mesh)
+
+        self.assertFalse(lookup.single_layer)
+        self.assertEqual(-20.0, lookup.get_shallowest_depth(30, 50))
+        self.assertEqual(-5.0, lookup.get_shallowest_depth(45, 50))
+        self.assertEqual(0, lookup.face_hits + lookup.neighbour_hits)
+
+    def test_sample_path_reports_the_lookup_stats(self):
+        report = RunReport()
+        emitter = mock.Mock(spec=VectorEmitter)
+        sample_path(CoherentLookup(self.mesh), [(x, 500.0) for x in range(100, 200)], [], emitter,
+                    DeadlineScheduler(1, paced=False), report)
+
+        self.assertEqual(100, emitter.emit_vector.call_count)
+        self.assertEqual(100, sum(v for k, v in report.summary()["lookups"].items() if k != "hit_rate"))
+        self.assertIn("hit rate", report.format_text())
+
+    def test_cli_only_allows_coherent_lookup_on_vertical_single_beam_runs(self):
+        self.assertTrue(parse_args(["test.stl", "--coherent_lookup", "--checkpoint", "c.json"]).coherent_lookup)
+        for args in (["--beams", "8"], ["--beam_width", "5"], ["--record_truth", "t.bin"], ["--replay"]):
+            with self.subTest(args), contextlib.redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, parse_args, ["test.stl", "--coherent_lookup"] + args)
+
+
+class TestConnected(unittest.TestCase):
+    def test_components_are_found(self):
+        self.assertTrue(_connected_(4, np.asarray([[3, 2], [2, 1], [1, 0]])))
+        self.assertFalse(_connected_(4, np.asarray([[0, 1], [2, 3]])))
+        self.assertFalse(_connected_(2, np.empty((0, 2), dtype=int)))
+        self.assertTrue(_connected_(1, np.empty((0, 2), dtype=int)))
+
+
+if __name__ == '__main__':
+    unittest.main()
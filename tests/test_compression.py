@@ -0,0 +1,130 @@
+import contextlib
+import gzip
+import io
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.cli_parsing import parse_args
+from utils.compression import codec_from_filename, available_codecs, CompressedStreamWriter
+from utils.emitters import CsvVectorEmitter, BinaryVectorEmitter, LasVectorEmitter
+
+
+class TestCodecSelection(unittest.TestCase):
+    def test_codec_is_inferred_from_extension(self):
+        self.assertEqual("gzip", codec_from_filename("out.csv.gz"))
+        self.assertEqual("zstd", codec_from_filename("out.tsv.zst"))
+        self.assertEqual("lz4", codec_from_filename("out.bin.LZ4"))
+        self.assertIsNone(codec_from_filename("out.csv"))
+
+    def test_gzip_is_always_available(self):
+        self.assertIn("gzip", available_codecs())
+
+    def test_unknown_codec_raises_value_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertRaises(ValueError, CompressedStreamWriter, os.path.join(directory, "out"), "brotli")
+
+    def test_unusable_codec_or_path_fails_when_the_emitter_is_made(self):
+        with tempfile.TemporaryDirectory() as directory:
+            missing = os.path.join(directory, "missing", "out.csv")
+            self.assertRaises(ValueError, CsvVectorEmitter, os.path.join(directory, "out.csv"), compression="brotli")
+            self.assertRaises(ValueError, CsvVectorEmitter, missing + ".gz")
+            self.assertRaises(ValueError, LasVectorEmitter, os.path.join(directory, "missing", "out.las"))
+            with mock.patch("utils.compression.zstandard", None):
+                self.assertRaises(ValueError, CsvVectorEmitter, os.path.join(directory, "out.csv.zst"))
+            self.assertFalse(os.listdir(directory))
+
+    def test_cli_rejects_unusable_codec_or_path(self):
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parse_args(["test.stl", "-em", f"csv@{os.path.join(directory, 'missing', 'out.csv.gz')}"])
+            with mock.patch("utils.compression.lz4_frame", None), self.assertRaises(SystemExit):
+                parse_args(["test.stl", "-em", f"csv@{os.path.join(directory, 'out.csv')}", "--compression", "lz4"])
+
+    def test_compression_flag_overrides_extension(self):
+        arg_space = parse_args(["test.stl", "-em", "csv@out.csv", "--compression", "gzip"])
+        self.assertEqual("gzip", arg_space.emitter_type.compression)
+
+    def test_compression_flag_none_disables_extension_codec(self):
+        arg_space = parse_args(["test.stl", "--compression", "none", "-em", "csv@out.csv.gz"])
+        self.assertIsNone(arg_space.emitter_type.compression)
+
+
+class TestCompressedEmitters(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.vectors = [(float(i), i * 0.5, -10.0 - i) for i in range(3000)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_gzip_csv_round_trips(self):
+        filename = os.path.join(self.directory.name, "out.csv.gz")
+        emitter = CsvVectorEmitter(filename, chunk_records=100)
+        for v in self.vectors:
+            emitter.emit_vector(v)
+        emitter.close()
+
+        with gzip.open(filename, "rt") as f:
+            rows = [tuple(float(c) for c in line.split(",")) for line in f]
+
+        self.assertListEqual(self.vectors, rows)
+
+    def test_gzip_binary_round_trips(self):
+        filename = os.path.join(self.directory.name, "out.bin")
+        emitter = BinaryVectorEmitter(filename, compression="gzip")
+        for v in self.vectors:
+            emitter.emit_vector(v)
+        emitter.close()
+
+        with gzip.open(filename, "rb") as f:
+            data = f.read()
+
+        self.assertListEqual(self.vectors, list(struct.iter_unpack("<3d", data)))
+
+    @unittest.skipUnless("zstd" in available_codecs(), "zstandard is not installed")
+    def test_zstd_csv_round_trips(self):
+        import zstandard
+
+        filename = os.path.join(self.directory.name, "out.csv.zst")
+        emitter = CsvVectorEmitter(filename)
+        for v in self.vectors:
+            emitter.emit_vector(v)
+        emitter.close()
+
+        with open(filename, "rb") as f:
+            text = zstandard.ZstdDecompressor().stream_reader(f).read().decode()
+        rows = [tuple(float(c) for c in line.split(",")) for line in text.splitlines()]
+
+        self.assertListEqual(self.vectors, rows)
+
+    @unittest.skipUnless("lz4" in available_codecs(), "lz4 is not installed")
+    def test_lz4_csv_round_trips(self):
+        import lz4.frame
+
+        filename = os.path.join(self.directory.name, "out.csv.lz4")
+        emitter = CsvVectorEmitter(filename)
+        for v in self.vectors:
+            emitter.emit_vector(v)
+        emitter.close()
+
+        with lz4.frame.open(filename, "rt") as f:
+            rows = [tuple(float(c) for c in line.split(",")) for line in f]
+
+        self.assertListEqual(self.vectors, rows)
+
+    def test_appending_to_a_gzip_file_keeps_earlier_records(self):
+        filename = os.path.join(self.directory.name, "out.csv.gz")
+        for v in self.vectors[:2]:
+            emitter = CsvVectorEmitter(filename)
+            emitter.emit_vector(v)
+            emitter.close()
+
+        with gzip.open(filename, "rt") as f:
+            self.assertEqual(2, len(f.readlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
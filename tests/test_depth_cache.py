@@ -0,0 +1,87 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from utils.cli_parsing import parse_args
+from utils.depth_cache import DepthCache
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.simulation import simulate, parallel_path
+
+
+class CountingSource:
+    def __init__(self):
+        self.lookups = []
+
+    def get_shallowest_depth(self, x, y):
+        self.lookups.append((x, y))
+        return None if x < 0 else -x - y
+
+
+class TestDepthCache(unittest.TestCase):
+    def test_positions_are_looked_up_once_at_their_grid_point(self):
+        source = CountingSource()
+        cache = DepthCache(source, tolerance=0.5)
+
+        self.assertEqual(-3.0, cache.get_shallowest_depth(1.1, 1.9))
+        self.assertEqual(-3.0, cache.get_shallowest_depth(0.9, 2.2))
+        self.assertIsNone(cache.get_shallowest_depth(-4, 0))
+        self.assertIsNone(cache.get_shallowest_depth(-4.1, 0.1))
+
+        self.assertEqual([(1.0, 2.0), (-4.0, 0.0)], source.lookups)
+        self.assertEqual((2, 2, 0.5), (cache.hits, cache.misses, cache.hit_rate))
+
+    def test_least_recently_used_depths_are_evicted(self):
+        source = CountingSource()
+        cache = DepthCache(source, tolerance=1, max_entries=2)
+        for x in (1, 2, 1, 3, 1, 2):
+            cache.get_shallowest_depth(x, 0)
+
+        # 2 was evicted to make room for 3, so it is looked up again, evicting 3
+        self.assertEqual([(1, 0), (2, 0), (3, 0), (2, 0)], source.lookups)
+        stats = cache.stats()
+        self.assertEqual((2, 4, 2, 2), (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]))
+
+    def test_memory_grows_with_entries_and_clear_empties_the_cache(self):
+        cache = DepthCache(CountingSource(), tolerance=1)
+        empty = cache.memory_bytes
+        for x in range(1000):
+            cache.get_shallowest_depth(x, 0)
+        self.assertGreater(cache.memory_bytes, empty + 1000 * 100)
+
+        cache.clear()
+        stats = cache.stats()
+        self.assertEqual((0, 0, 0, 0), (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]))
+
+    def test_invalid_caches_are_rejected(self):
+        self.assertRaises(ValueError, DepthCache, CountingSource(), 0)
+        self.assertRaises(ValueError, DepthCache, CountingSource(), 1, max_entries=0)
+
+    def test_cache_is_shared_between_simulations(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                 field_split=50)
+        cache = DepthCache(mesh, tolerance=0.01)
+        first = simulate(cache, parallel_path(mesh, velocity=50))
+        misses = cache.misses
+        second = simulate(cache, parallel_path(mesh, velocity=50))
+
+        self.assertEqual(misses, cache.misses)
+        self.assertEqual(len(second), cache.hits)
+        np.testing.assert_array_equal(first["true_z"], second["true_z"])
+        # Positions on the 50 m track are already on the grid, so the depths are the mesh's own
+        np.testing.assert_array_equal(simulate(mesh, parallel_path(mesh, velocity=50))["true_z"], first["true_z"])
+
+    def test_cli_only_allows_the_cache_on_single_beam_runs(self):
+        args = parse_args(["test.stl", "--depth_cache", "0.1", "--coherent_lookup"])
+        self.assertEqual((0.1, 1000000), (args.depth_cache, args.depth_cache_entries))
+        for extra in (["--depth_cache", "0"], ["--depth_cache", "1", "--depth_cache_entries", "0"],
+                      ["--depth_cache", "1", "--beams", "8"], ["--depth_cache", "1", "--record_truth", "t.bin"]):
+            with self.subTest(extra), contextlib.redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, parse_args, ["test.stl"] + extra)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import contextlib
+import io
+import os
+import socket
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.cli_parsing import parse_args, parse_emitter
+from utils.emitters import LasVectorEmitter, NmeaUdpVectorEmitter
+from utils.report import RunReport
+from utils.sampling_procedures import sample_path
+from utils.scheduling import DeadlineScheduler
+
+
+class OffMeshAt:
+    def __init__(self, *xs):
+        self.xs = xs
+
+    def get_shallowest_depth(self, x, y):
+        return None if x in self.xs else -10.0
+
+
+class TestLasVectorEmitter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "out.las")
+        self.vectors = [(100.25 + i, 200.5 - i * 0.5, -10.125 - i * 0.001) for i in range(10)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, vectors, **kwargs):
+        emitter = LasVectorEmitter(self.filename, **kwargs)
+        for v in vectors:
+            emitter.emit_vector(v)
+        emitter.close()
+
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        header = LasVectorEmitter.header.unpack(data[:LasVectorEmitter.header.size])
+        points = list(LasVectorEmitter.point.iter_unpack(data[LasVectorEmitter.header.size:]))
+        return header, points
+
+    def test_header_has_signature_version_and_sizes(self):
+        header, _ = self.write(self.vectors)
+
+        self.assertEqual(b"LASF", header[0])
+        self.assertEqual((1, 2), header[7:9])
+        self.assertEqual(227, header[13])
+        self.assertEqual(227, header[14])
+        self.assertEqual(20, header[17])
+
+    def test_point_count_is_patched_at_close(self):
+        header, points = self.write(self.vectors, chunk_records=3)
+
+        self.assertEqual(len(self.vectors), header[18])
+        self.assertEqual(len(self.vectors), header[19])
+        self.assertEqual(len(self.vectors), len(points))
+
+    def test_bounds_are_patched_at_close(self):
+        header, _ = self.write(self.vectors)
+        max_x, min_x, max_y, min_y, max_z, min_z = header[30:36]
+
+        self.assertAlmostEqual(max(v[0] for v in self.vectors), max_x)
+        self.assertAlmostEqual(min(v[0] for v in self.vectors), min_x)
+        self.assertAlmostEqual(max(v[1] for v in self.vectors), max_y)
+        self.assertAlmostEqual(min(v[1] for v in self.vectors), min_y)
+        self.assertAlmostEqual(max(v[2] for v in self.vectors), max_z)
+        self.assertAlmostEqual(min(v[2] for v in self.vectors), min_z)
+
+    def test_scaled_coordinates_round_trip_to_the_millimeter(self):
+        header, points = self.write(self.vectors)
+        scale = header[24:27]
+        offset = header[27:30]
+
+        for v, p in zip(self.vectors, points):
+            for i in range(3):
+                self.assertAlmostEqual(v[i], p[i] * scale[i] + offset[i], places=3)
+
+    def test_closing_without_points_writes_an_empty_cloud(self):
+        header, points = self.write([])
+
+        self.assertEqual(0, header[18])
+        self.assertListEqual([], points)
+
+    def test_records_are_fixed_size(self):
+        self.write(self.vectors)
+
+        expected_size = 227 + 20 * len(self.vectors)
+        self.assertEqual(expected_size, os.path.getsize(self.filename))
+        self.assertEqual(20, struct.calcsize("<lllHBBbBH"))
+
+
+class TestNmeaUdpVectorEmitter(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.settimeout(2)
+        self.address = f"127.0.0.1:{self.listener.getsockname()[1]}"
+
+    def tearDown(self):
+        self.listener.close()
+
+    def receive(self):
+        return self.listener.recv(4096).decode("ascii").split("\r\n")[:-1]
+
+    def test_each_vector_is_sent_as_gga_and_dbt(self):
+        emitter = NmeaUdpVectorEmitter(self.address, start_time=0)
+        emitter.emit_vector((0, 0, -12.5))
+        emitter.close()
+
+        gga, dbt = self.receive()
+        self.assertTrue(gga.startswith("$GPGGA,000000.00,0000.0000,N,00000.0000,E,"))
+        self.assertTrue(dbt.startswith("$SDDBT,41.0,f,12.50,M,6.8,F*"))
+
+    def test_checksums_are_valid(self):
+        emitter = NmeaUdpVectorEmitter(self.address, start_time=1000)
+        emitter.emit_vector((10, -20, -3))
+        emitter.close()
+
+        for sentence in self.receive():
+            body, checksum = sentence[1:].split("*")
+            expected = 0
+            for c in body.encode("ascii"):
+                expected ^= c
+            self.assertEqual(f"{expected:02X}", checksum)
+
+    def test_timestamps_step_with_the_sample_rate(self):
+        emitter = NmeaUdpVectorEmitter(self.address, sample_rate=4, start_time=3600)
+        for _ in range(3):
+            emitter.emit_vector((0, 0, -1))
+        emitter.close()
+
+        times = [self.receive()[0].split(",")[1] for _ in range(3)]
+        self.assertListEqual(["010000.00", "010000.25", "010000.50"], times)
+
+    def test_timestamps_follow_the_path_position(self):
+        emitter = NmeaUdpVectorEmitter(self.address, sample_rate=4, start_time=3600)
+        off_mesh = OffMeshAt(1, 2)
+        sample_path(off_mesh, [(x, 0) for x in range(5)], [], emitter, DeadlineScheduler(4, paced=False), RunReport())
+        emitter.close()
+
+        times = [self.receive()[0].split(",")[1] for _ in range(3)]
+        self.assertListEqual(["010000.00", "010000.75", "010001.00"], times)
+
+    def test_vectors_share_the_timestamp_of_their_position(self):
+        emitter = NmeaUdpVectorEmitter(self.address, sample_rate=2, start_time=0)
+        emitter.set_position(5)
+        emitter.emit_vectors(np.asarray([(0, 0, -1), (1, 0, -1)]))
+        emitter.close()
+
+        times = [self.receive()[0].split(",")[1] for _ in range(2)]
+        self.assertListEqual(["000002.50", "000002.50"], times)
+
+    def test_minutes_never_round_up_to_sixty(self):
+        emitter = NmeaUdpVectorEmitter(self.address, origin=(44.9999999, -63.9999999), start_time=0)
+        emitter.emit_vector((0, 0, -1))
+        emitter.close()
+
+        fields = self.receive()[0].split(",")
+        self.assertEqual(("4500.0000", "N"), (fields[2], fields[3]))
+        self.assertEqual(("06400.0000", "W"), (fields[4], fields[5]))
+
+    def test_positions_are_offset_from_the_origin(self):
+        emitter = NmeaUdpVectorEmitter(self.address, origin=(44.5, -63.5), start_time=0)
+        # One minute of latitude is about 1853 m
+        emitter.emit_vector((0, 1853.25, -1))
+        emitter.close()
+
+        fields = self.receive()[0].split(",")
+        self.assertEqual(("4431.0000", "N"), (fields[2], fields[3]))
+        self.assertEqual(("06330.0000", "W"), (fields[4], fields[5]))
+
+    def test_cli_applies_sample_rate_and_origin(self):
+        arg_space = parse_args(["test.stl", "-em", f"nmea@{self.address}", "-sr=5", "--origin", "10", "20"])
+        arg_space.emitter_type.close()
+
+        self.assertEqual(5, arg_space.emitter_type.sample_rate)
+        self.assertTupleEqual((10, 20), arg_space.emitter_type.origin)
+
+    def test_an_unknown_host_is_a_usage_error(self):
+        unresolvable = mock.Mock(**{"connect.side_effect": socket.gaierror(-2, "Name or service not known")})
+        with mock.patch("utils.emitters.socket.socket", return_value=unresolvable):
+            with self.assertRaisesRegex(ValueError, "Could not open the nmea emitter to nowhere:10110"):
+                parse_emitter("nmea@nowhere:10110")
+            with contextlib.redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+                parse_args(["test.stl", "-em", "nmea@nowhere:10110"])
+
+        self.assertIn("Name or service not known", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
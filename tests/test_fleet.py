@@ -0,0 +1,131 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.emitters import BinaryVectorEmitter, StdOutVectorEmitter
+from utils.error_pipeline import Noise, Dropout
+from utils.config_files import load_config
+from utils.fleet import Vessel, vessels_from_config, run_fleet
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.timing import registry
+
+
+class TestFleetConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_vessels_take_defaults_for_missing_settings(self):
+        config = {"vessels": [
+            {"name": "alpha", "velocity": 3, "errors": ["noise@0.05", "drop@0.01"],
+             "emitter": f"bin@{self.directory.name}/alpha.bin", "bounds": [0, 0, 10, 10]},
+            {"sample_rate": 4, "late_policy": "skip"},
+        ]}
+        alpha, second = vessels_from_config(config, sample_rate=2, velocity=1, time_scale=5)
+
+        self.assertEqual("alpha", alpha.name)
+        self.assertEqual(3, alpha.velocity)
+        self.assertEqual(2, alpha.sample_rate)
+        self.assertEqual(5, alpha.time_scale)
+        self.assertEqual((0, 0, 10, 10), alpha.bounds)
+        self.assertEqual([Noise, Dropout], [type(e) for e in alpha.errors])
+        self.assertIsInstance(alpha.emitter, BinaryVectorEmitter)
+
+        self.assertEqual("vessel-2", second.name)
+        self.assertEqual(4, second.sample_rate)
+        self.assertEqual("skip", second.late_policy)
+        self.assertIsNone(second.bounds)
+        self.assertIsInstance(second.emitter, StdOutVectorEmitter)
+
+    def test_invalid_configurations(self):
+        self.assertRaises(ValueError, vessels_from_config, {"vessels": []})
+        self.assertRaises(ValueError, vessels_from_config, {"vessels": [{"speed": 2}]})
+        self.assertRaises(ValueError, vessels_from_config, {"vessels": [{"path_type": "drawn"}]})
+        self.assertRaises(ValueError, vessels_from_config, {"vessels": [{"late_policy": "panic"}]})
+
+    def test_an_unknown_nmea_host_is_an_invalid_configuration(self):
+        unresolvable = mock.Mock(**{"connect.side_effect": socket.gaierror(-2, "Name or service not known")})
+        with mock.patch("utils.emitters.socket.socket", return_value=unresolvable):
+            self.assertRaises(ValueError, vessels_from_config, {"vessels": [{"emitter": "nmea@nowhere:10110"}]})
+
+    def test_json_toml_and_yaml_files(self):
+        json_path = os.path.join(self.directory.name, "fleet.json")
+        with open(json_path, "w") as f:
+            json.dump({"vessels": [{"name": "alpha"}]}, f)
+        toml_path = os.path.join(self.directory.name, "fleet.toml")
+        with open(toml_path, "w") as f:
+            f.write('[[vessels]]\nname = "alpha"\n')
+        yaml_path = os.path.join(self.directory.name, "fleet.yaml")
+        with open(yaml_path, "w") as f:
+            f.write('vessels:\n  - name: alpha\n')
+
+        self.assertEqual({"vessels": [{"name": "alpha"}]}, load_config(json_path))
+        self.assertRaises(ValueError, load_config, os.path.join(self.directory.name, "fleet.ini"))
+        try:
+            self.assertEqual({"vessels": [{"name": "alpha"}]}, load_config(toml_path))
+            self.assertEqual({"vessels": [{"name": "alpha"}]}, load_config(yaml_path))
+        except ImportError:
+            self.skipTest("toml needs tomli on this Python, and yaml needs pyyaml")
+
+
+class TestRunFleet(unittest.TestCase):
+    def test_vessels_share_the_mesh_and_report_together(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(generate_trimesh(200, terrain="flat", channels=0, trenches=0, seed=0), field_split=50)
+
+        with tempfile.TemporaryDirectory() as directory:
+            vessels = [
+                Vessel("west", emitter=BinaryVectorEmitter(os.path.join(directory, "west.bin")), velocity=50,
+                       sample_rate=1, bounds=(0, 0, 500, 1000), paced=False),
+                Vessel("east", emitter=BinaryVectorEmitter(os.path.join(directory, "east.bin")), velocity=100,
+                       sample_rate=1, bounds=(500, 0, 1000, 1000), paced=False),
+            ]
+            report = run_fleet(mesh, vessels)
+
+            west = np.fromfile(os.path.join(directory, "west.bin"), dtype="<f8").reshape(-1, 3)
+            east = np.fromfile(os.path.join(directory, "east.bin"), dtype="<f8").reshape(-1, 3)
+
+        self.assertTrue((west[:, 0] <= 500).all())
+        self.assertTrue((east[:, 0] >= 500).all())
+
+        summary = report.summary()
+        self.assertEqual(["west", "east"], [v["name"] for v in summary["vessels"]])
+        self.assertEqual(len(west), summary["vessels"][0]["emitted"])
+        self.assertEqual(len(east), summary["vessels"][1]["emitted"])
+        self.assertEqual(len(west) + len(east), summary["fleet"]["emitted"])
+        self.assertEqual(2, summary["fleet"]["requested_sample_rate"])
+
+    def test_vessel_metrics_are_named_after_the_vessel(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(generate_trimesh(200, terrain="flat", channels=0, trenches=0, seed=0), field_split=50)
+
+        registry.enabled = True
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                vessels = [Vessel(name, emitter=BinaryVectorEmitter(os.path.join(directory, f"{name}.bin")),
+                                  velocity=200, bounds=bounds, paced=False)
+                           for name, bounds in (("west", (0, 0, 500, 1000)), ("east", (500, 0, 1000, 1000)))]
+                report = run_fleet(mesh, vessels, record_stages=False)
+            metrics = registry.summary()
+        finally:
+            registry.enabled = False
+            registry.reset()
+
+        for i, name in enumerate(("west", "east")):
+            samples = report.summary()["vessels"][i]["samples"]
+            self.assertEqual(samples, metrics[f"{name}.sample_path.depth_lookup"]["count"])
+        self.assertNotIn("sample_path.depth_lookup", metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+import trimesh
+
+from utils.cli_parsing import parse_args
+from utils.emitters import VectorEmitter
+from utils.footprint import FootprintCache, FootprintSounder
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.report import RunReport
+from utils.sampling_procedures import sample_path
+from utils.scheduling import DeadlineScheduler
+
+
+def pillar_mesh():
+    # A flat floor at -20 with a pillar rising to -5 over the square (48, 48) to (52, 52)
+    floor = trimesh.Trimesh(vertices=[[0, 0, -20], [100, 0, -20], [100, 100, -20], [0, 100, -20]],
+                            faces=[[0, 1, 2], [0, 2, 3]])
+    top = trimesh.Trimesh(vertices=[[48, 48, -5], [52, 48, -5], [52, 52, -5], [48, 52, -5]],
+                          faces=[[0, 1, 2], [0, 2, 3]])
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CustomTriMesh(trimesh.util.concatenate([floor, top]), field_split=20)
+
+
+class TestFootprintSounder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                     field_split=50)
+
+    def test_narrow_beam_matches_the_vertical_lookup(self):
+        for sounder in (FootprintSounder(self.mesh, 0, sub_rays=16), FootprintSounder(self.mesh, 20, sub_rays=1)):
+            for x, y in ((312.5, 401.25), (700.0, 120.0), (55.5, 900.0)):
+                self.assertAlmostEqual(self.mesh.get_shallowest_depth(x, y), sounder.get_shallowest_depth(x, y))
+
+    def test_wide_beam_returns_the_shallowest_point_in_its_footprint(self):
+        mesh = pillar_mesh()
+        # Beams are cast from 1 m above the top of the pillar, where a 60 degree footprint is tan(30) = 0.58 m wide
+        sounder = FootprintSounder(mesh, 60, sub_rays=64)
+        self.assertEqual(-20.0, mesh.get_shallowest_depth(47.7, 50))
+        self.assertAlmostEqual(-5.0, sounder.get_shallowest_depth(47.7, 50))
+        self.assertAlmostEqual(-20.0, sounder.get_shallowest_depth(40, 50))
+
+    def test_wide_beam_is_never_deeper_than_the_vertical_lookup(self):
+        sounder = FootprintSounder(self.mesh, 10)
+        for x in np.linspace(100, 900, 40):
+            self.assertGreaterEqual(sounder.get_shallowest_depth(x, 500) + 1e-9, self.mesh.get_shallowest_depth(x, 500))
+
+    def test_off_the_mesh_returns_none(self):
+        self.assertIsNone(FootprintSounder(self.mesh, 10).get_shallowest_depth(-500, -500))
+
+    def test_sub_rays_spread_over_the_cone(self):
+        sounder = FootprintSounder(self.mesh, 20, sub_rays=32)
+        spread = np.hypot(sounder.directions[:, 0], sounder.directions[:, 1])
+        self.assertEqual((32, 3), sounder.directions.shape)
+        self.assertEqual(0, spread[0])
+        self.assertAlmostEqual(np.tan(np.radians(10)), spread.max())
+
+    def test_invalid_sounders_are_rejected(self):
+        self.assertRaises(ValueError, FootprintSounder, self.mesh, 180)
+        self.assertRaises(ValueError, FootprintSounder, self.mesh, 10, sub_rays=0)
+
+    def test_sounder_can_be_sampled_in_place_of_the_mesh(self):
+        report = RunReport()
+        emitter = mock.Mock(spec=VectorEmitter)
+        sample_path(FootprintSounder(self.mesh, 10), [(500, y) for y in range(100, 900, 50)], [], emitter,
+                    DeadlineScheduler(1, paced=False), report)
+        self.assertEqual(16, emitter.emit_vector.call_count)
+        self.assertEqual(16, report.emitted)
+
+    def test_cli_only_allows_beam_width_on_single_beam_runs(self):
+        self.assertEqual(5.0, parse_args(["test.stl", "--beam_width", "5"]).beam_width)
+        for args in (["--beam_width", "180"], ["--beam_width", "5", "--sub_rays", "0"],
+                     ["--beam_width", "5", "--beams", "8"], ["--beam_width", "5", "--record_truth", "t.bin"]):
+            with self.subTest(args), contextlib.redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, parse_args, ["test.stl"] + args)
+
+
+class TestFootprintCache(unittest.TestCase):
+    def test_consecutive_pings_reuse_the_cached_faces(self):
+        mesh = pillar_mesh()
+        cache = FootprintCache(mesh, margin=2)
+        first = cache.candidates(40, 40, 50, 50)
+        second = cache.candidates(41, 40, 51, 50)
+        cache.candidates(0, 0, 5, 5)
+
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertAlmostEqual(1 / 3, cache.hit_rate)
+        self.assertEqual({0, 1, 2, 3}, set(first.tolist()))
+        self.assertEqual({0, 1, 2, 3}, set(second.tolist()))
+
+    def test_candidates_are_the_faces_overlapping_the_box(self):
+        cache = FootprintCache(pillar_mesh())
+        self.assertEqual({0, 1}, set(cache.candidates(10, 10, 20, 20).tolist()))
+        self.assertEqual(0, len(cache.candidates(200, 200, 300, 300)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
+import os
+import subprocess
+import sys
 import unittest
+from unittest import mock
 
 import numpy as np
 
-from utils.geometry import line_sign, point_in_tri, triangular_plane_intercept, find_x_y_theta, get_x_y_rotated_vector
+from utils import geometry
+from utils.geometry import line_sign, point_in_tri, triangular_plane_intercept, find_x_y_theta, get_x_y_rotated_vector, \
+    line_signs, points_in_tris, triangular_plane_intercepts, get_x_y_rotated_vectors
 
 
 class TestLineSign(unittest.TestCase):
@@ -63,6 +69,10 @@ class TestTriangularPlaneIntercept(unittest.TestCase):
     def test_x_and_y_are_out_of_bounds(self):
         self.assertEqual(3, triangular_plane_intercept(7, -2, self.v1, self.v2, self.v3))
 
+    def test_vertical_and_degenerate_faces_are_nan(self):
+        self.assertTrue(np.isnan(triangular_plane_intercept(0, 0, (0, 0, 0), (1, 0, 0), (1, 0, 5))))
+        self.assertTrue(np.isnan(triangular_plane_intercept(0, 0, self.v1, self.v1, self.v1)))
+
 
 class TestFindTheta(unittest.TestCase):
     def test_ninety_degree_works(self):
@@ -153,5 +163,136 @@ class TestVectorRotation(unittest.TestCase):
         self.assertAlmostEqual(actual_theta, abs(expected_theta))
 
 
+def _random_triangles(rng, count):
+    # Random triangles, then some vertical, collinear, and collapsed ones sharing their grid of points
+    triangles = rng.integers(-3, 4, size=(count, 3, 3)).astype(float)
+    triangles[0] = [[0, 0, 0], [1, 0, 0], [1, 0, 5]]
+    triangles[1] = [[0, 0, 0], [1, 1, 1], [2, 2, 2]]
+    triangles[2] = [[1, 1, 2], [1, 1, 2], [1, 1, 2]]
+    triangles[3] = [[1, 1, 2], [1, 1, 2], [2, 0, 0]]
+    return triangles
+
+
+class TestBroadcasting(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.triangles = _random_triangles(rng, 60)
+        # Points on a grid, so many lie on edges and vertices
+        self.points = np.concatenate((rng.integers(-3, 4, size=(40, 2)), rng.uniform(-3, 3, size=(40, 2))))
+
+    def test_line_signs_match_line_sign(self):
+        signs = line_signs(self.points, self.triangles[:, 0, :2], self.triangles[:, 1, :2])
+        self.assertEqual((80, 60), signs.shape)
+        for i, point in enumerate(self.points):
+            for j, t in enumerate(self.triangles):
+                self.assertEqual(line_sign(point, t[0, :2], t[1, :2]), signs[i, j])
+
+    def test_points_in_tris_match_point_in_tri(self):
+        in_tri = points_in_tris(self.points, self.triangles)
+        self.assertEqual((80, 60), in_tri.shape)
+        for i, point in enumerate(self.points):
+            for j, t in enumerate(self.triangles):
+                self.assertEqual(point_in_tri(point, *t), in_tri[i, j])
+        self.assertTrue(points_in_tris([[1, 1]], self.triangles[2:3])[0, 0])
+        self.assertFalse(points_in_tris([[1, 2]], self.triangles[2:3])[0, 0])
+
+    def test_points_in_tris_accepts_flat_vertices(self):
+        np.testing.assert_array_equal(points_in_tris(self.points, self.triangles),
+                                      points_in_tris(self.points, self.triangles[:, :, :2]))
+
+    def test_plane_intercepts_match_triangular_plane_intercept(self):
+        z = triangular_plane_intercepts(self.points, self.triangles)
+        self.assertEqual((80, 60), z.shape)
+        for i, (x, y) in enumerate(self.points):
+            for j, t in enumerate(self.triangles):
+                expected = triangular_plane_intercept(x, y, *t)
+                if np.isnan(expected):
+                    self.assertTrue(np.isnan(z[i, j]))
+                else:
+                    self.assertAlmostEqual(expected, z[i, j])
+
+    def test_plane_intercepts_are_nan_on_vertical_and_degenerate_faces(self):
+        with np.errstate(all="raise"):
+            z = triangular_plane_intercepts(self.points, self.triangles)
+        self.assertTrue(np.isnan(z[:, :4]).all())
+        self.assertEqual(0, len(triangular_plane_intercepts(self.points, np.empty((0, 3, 3)))[0]))
+
+    def test_rotated_vectors_match_get_x_y_rotated_vector(self):
+        vectors = np.asarray([[1, 0], [0, 2], [-3, 4], [0.5, -0.5]])
+        thetas = np.asarray([np.pi / 2, -np.pi / 4, np.pi, 7.0])
+        rotated = get_x_y_rotated_vectors(vectors, thetas)
+        for vector, theta, actual in zip(vectors, thetas, rotated):
+            np.testing.assert_allclose(get_x_y_rotated_vector(vector, theta), actual, atol=1e-12)
+
+        one_angle = get_x_y_rotated_vectors(vectors, np.pi / 3)
+        for vector, actual in zip(vectors, one_angle):
+            np.testing.assert_allclose(get_x_y_rotated_vector(vector, np.pi / 3), actual, atol=1e-12)
+
+
+class _KernelMode:
+    # Runs a test case through the kernels, which are plain Python when numba is not installed
+    jit_enabled = True
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(geometry, "JIT_ENABLED", self.jit_enabled)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class _NumpyMode(_KernelMode):
+    jit_enabled = False
+
+
+class TestLineSignKernel(_KernelMode, TestLineSign):
+    pass
+
+
+class TestLineSignNumpy(_NumpyMode, TestLineSign):
+    pass
+
+
+class TestInTriangleKernel(_KernelMode, TestInTriangle):
+    pass
+
+
+class TestInTriangleNumpy(_NumpyMode, TestInTriangle):
+    pass
+
+
+class TestTriangularPlaneInterceptKernel(_KernelMode, TestTriangularPlaneIntercept):
+    pass
+
+
+class TestTriangularPlaneInterceptNumpy(_NumpyMode, TestTriangularPlaneIntercept):
+    pass
+
+
+class TestKernels(unittest.TestCase):
+    def test_triangle_loop_matches_point_in_tri(self):
+        rng = np.random.default_rng(0)
+        triangles = rng.uniform(-5, 5, size=(200, 3, 3))
+        triangles[0] = triangles[0, 0]
+        for x, y in rng.uniform(-5, 5, size=(20, 2)).tolist() + [triangles[0, 0, :2].tolist()]:
+            expected = [point_in_tri((x, y), *t) for t in triangles]
+            self.assertEqual(expected, geometry._triangles_hit_kernel_(x, y, triangles).tolist())
+
+    def test_kernels_match_numpy(self):
+        rng = np.random.default_rng(1)
+        for v1, v2, v3 in rng.uniform(-100, 100, size=(50, 3, 3)):
+            x, y = rng.uniform(-100, 100, size=2)
+            with mock.patch.object(geometry, "JIT_ENABLED", False):
+                expected = triangular_plane_intercept(x, y, v1, v2, v3)
+            with mock.patch.object(geometry, "JIT_ENABLED", True):
+                self.assertAlmostEqual(expected, triangular_plane_intercept(x, y, v1, v2, v3), places=6)
+
+    def test_environment_variable_disables_the_kernels(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, **{geometry.DISABLE_JIT_ENV: "1"})
+        out = subprocess.run([sys.executable, "-c", "from utils import geometry; print(geometry.JIT_ENABLED)"],
+                             cwd=root, env=env, capture_output=True, text=True, check=True)
+        self.assertEqual("False", out.stdout.strip())
+
+
 if __name__ == '__main__':
     unittest.main()
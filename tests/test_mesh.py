@@ -1,10 +1,16 @@
+import contextlib
+import io
 import os
 import unittest
+from unittest import mock
 
 import numpy as np
 import trimesh
 
-from utils.mesh import CustomTriMesh
+from utils import geometry
+from utils.coherence import CoherentLookup
+from utils.mesh import CustomTriMesh, prune_mesh
+from utils.mesh_generation import generate_trimesh
 
 
 class TestMesh(unittest.TestCase):
@@ -80,5 +86,110 @@ class TestMesh(unittest.TestCase):
             self.assertEqual(actual_y_image_idx, expected_y_image_idx)
 
 
+class TestVerticalFaces(unittest.TestCase):
+    def test_unpruned_vertical_faces_are_skipped(self):
+        # A flat floor at -20 with a vertical wall standing on it, whose corner is right over (50, 50). The wall is the
+        # first face, so it is checked first.
+        mesh = CustomTriMesh(trimesh.Trimesh(
+            vertices=[[0, 0, -20], [100, 0, -20], [100, 100, -20], [0, 100, -20], [50, 50, -20], [60, 50, -20],
+                      [60, 50, -5]],
+            faces=[[4, 5, 6], [0, 1, 2], [0, 2, 3]]), field_split=10, prune_faces=False)
+        for jit_enabled in (True, False):
+            with self.subTest(jit_enabled=jit_enabled), mock.patch.object(geometry, "JIT_ENABLED", jit_enabled):
+                self.assertEqual(3, len(mesh.find_simplices(50, 50)))
+                self.assertEqual(-20, mesh.get_shallowest_depth(50, 50))
+
+
+def _skirted_mesh():
+    # A seabed with vertical walls hanging from its edges down to -100, and a degenerate sliver face, as exported solids
+    # often have
+    seabed = generate_trimesh(800, terrain="fractal", channels=0, trenches=0, seed=0)
+    vertices = np.asarray(seabed.vertices)
+    edge = np.flatnonzero(vertices[:, 1] == vertices[:, 1].min())
+    edge = edge[np.argsort(vertices[edge, 0])]
+    bottom = vertices[edge] * [1, 1, 0] + [0, 0, -100]
+    walls = []
+    for a, b in zip(range(len(edge) - 1), range(1, len(edge))):
+        walls += [[edge[a], edge[b], len(vertices) + a], [edge[b], len(vertices) + b, len(vertices) + a]]
+    sliver = [[edge[0], edge[1], edge[1]]]
+    return trimesh.Trimesh(vertices=np.concatenate((vertices, bottom)),
+                           faces=np.concatenate((seabed.faces, walls, sliver)), process=False)
+
+
+class TestPruning(unittest.TestCase):
+    def setUp(self):
+        self.raw = _skirted_mesh()
+
+    def test_vertical_and_degenerate_faces_are_dropped(self):
+        pruned, stats = prune_mesh(self.raw, field_split=20)
+        self.assertEqual(len(self.raw.faces) - 1, stats["vertical_faces"] + len(pruned.faces))
+        self.assertEqual(1, stats["degenerate_faces"])
+        self.assertGreater(stats["vertical_faces"], 0)
+        self.assertGreater(stats["index_entries_saved"], 0)
+        self.assertEqual(8 * stats["index_entries_saved"], stats["index_bytes_saved"])
+        self.assertAlmostEqual(stats["index_entries_saved"] / (stats["index_entries"] + stats["index_entries_saved"]),
+                               stats["scan_saved"])
+
+    def test_index_entries_are_counted_as_indexed(self):
+        _, stats = prune_mesh(self.raw, field_split=20)
+        for prune_faces, expected in ((True, stats["index_entries"]),
+                                      (False, stats["index_entries"] + stats["index_entries_saved"])):
+            mesh = CustomTriMesh(self.raw, field_split=20, prune_faces=prune_faces)
+            self.assertEqual(expected, sum(len(faces) for faces in mesh.search_field.ravel() if faces is not None))
+
+    def test_pruning_keeps_the_depths(self):
+        pruned = CustomTriMesh(self.raw, field_split=20, merge_vertices=True)
+        unpruned = CustomTriMesh(self.raw, field_split=20, prune_faces=False)
+        self.assertLess(len(pruned.faces), len(unpruned.faces))
+        for x in np.linspace(-10, 1010, 35):
+            for y in np.linspace(-10, 1010, 35):
+                self.assertEqual(unpruned.get_shallowest_depth(x, y), pruned.get_shallowest_depth(x, y))
+
+    def test_nearly_vertical_faces_are_dropped(self):
+        _, exact = prune_mesh(self.raw, field_split=20)
+        for lean, expected in ((1e-5, exact["vertical_faces"]), (1.0, 0)):
+            # Walls 100 m tall whose bottom edge is shifted by the lean, as rounding to float32 leaves them
+            vertices = np.array(self.raw.vertices)
+            bottom = vertices[:, 2] == -100
+            vertices[bottom, 1] -= lean
+            leaning = trimesh.Trimesh(vertices=vertices, faces=self.raw.faces, process=False)
+            with self.subTest(lean=lean):
+                self.assertEqual(expected, prune_mesh(leaning, field_split=20)[1]["vertical_faces"])
+
+    def test_pruning_in_chunks_matches_pruning_at_once(self):
+        pruned, stats = prune_mesh(self.raw, field_split=20, merge_vertices=True)
+        with mock.patch("utils.mesh.PRUNE_CHUNK_FACES", 7):
+            chunked, chunked_stats = prune_mesh(self.raw, field_split=20, merge_vertices=True)
+        self.assertEqual(stats, chunked_stats)
+        np.testing.assert_array_equal(pruned.faces, chunked.faces)
+
+    def test_meshes_with_nothing_to_prune_are_kept(self):
+        seabed = generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0)
+        pruned, stats = prune_mesh(seabed)
+        self.assertIs(seabed, pruned)
+        self.assertEqual(0, stats["index_entries_saved"])
+
+    def test_vertices_can_be_merged_without_pruning(self):
+        soup = trimesh.Trimesh(vertices=self.raw.triangles.reshape(-1, 3),
+                               faces=np.arange(3 * len(self.raw.faces)).reshape(-1, 3), process=False)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            mesh = CustomTriMesh(soup, field_split=20, prune_faces=False, merge_vertices=True)
+
+        self.assertEqual(len(self.raw.faces), len(mesh.faces))
+        self.assertEqual(0, mesh.pruning["vertical_faces"] + mesh.pruning["degenerate_faces"])
+        self.assertGreater(mesh.pruning["merged_vertices"], 0)
+        self.assertIn("Pruned 0 vertical and 0 degenerate faces", out.getvalue())
+
+    def test_merged_vertices_join_the_faces(self):
+        # A triangle soup, as in an STL file, with every face having its own copy of its vertices
+        soup = trimesh.Trimesh(vertices=self.raw.triangles.reshape(-1, 3),
+                               faces=np.arange(3 * len(self.raw.faces)).reshape(-1, 3), process=False)
+        self.assertFalse(CoherentLookup(CustomTriMesh(soup, field_split=20)).single_layer)
+
+        mesh = CustomTriMesh(soup, field_split=20, merge_vertices=True)
+        self.assertEqual(len(soup.vertices) - len(np.unique(soup.vertices, axis=0)), mesh.pruning["merged_vertices"])
+        self.assertTrue(CoherentLookup(mesh).single_layer)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import trimesh
+
+from utils.mesh_generation import generate_bathymetry, heightfield_to_mesh, parse_face_count, write_stl, \
+    carve_channel, carve_trench, synthetic_from_spec
+
+
+class TestParseFaceCount(unittest.TestCase):
+    def test_suffixes_are_expanded(self):
+        self.assertEqual(10000, parse_face_count("10k"))
+        self.assertEqual(1500000, parse_face_count("1.5M"))
+        self.assertEqual(250, parse_face_count("250"))
+
+
+class TestHeightfieldToMesh(unittest.TestCase):
+    def test_grid_is_split_into_upward_facing_triangles(self):
+        xs, ys = np.meshgrid(np.arange(4.0), np.arange(4.0), indexing="ij")
+        vertices, faces = heightfield_to_mesh(xs, ys, np.zeros_like(xs))
+        mesh = trimesh.Trimesh(vertices, faces, process=False)
+
+        self.assertEqual(16, len(vertices))
+        self.assertEqual(18, len(faces))
+        self.assertTrue((mesh.face_normals[:, 2] > 0).all())
+        self.assertAlmostEqual(9, mesh.area)
+
+
+class TestCarving(unittest.TestCase):
+    def setUp(self):
+        self.xs, self.ys = np.meshgrid(np.linspace(0, 100, 101), np.linspace(0, 100, 101), indexing="ij")
+        self.zs = np.full_like(self.xs, -10.0)
+        self.start = np.asarray([0, 50])
+        self.end = np.asarray([100, 50])
+
+    def test_channel_is_deepest_at_its_centre(self):
+        zs = carve_channel(self.xs, self.ys, self.zs, self.start, self.end, width=5, depth=4)
+
+        self.assertAlmostEqual(-14, zs[50, 50])
+        self.assertAlmostEqual(-10, zs[50, 0])
+
+    def test_trench_is_flat_outside_its_half_width(self):
+        zs = carve_trench(self.xs, self.ys, self.zs, self.start, self.end, half_width=10, depth=20)
+
+        self.assertAlmostEqual(-30, zs[50, 50])
+        self.assertAlmostEqual(-20, zs[50, 45])
+        self.assertAlmostEqual(-10, zs[50, 40])
+
+
+class TestGenerateBathymetry(unittest.TestCase):
+    def test_face_count_is_close_to_requested(self):
+        for terrain in ["fractal", "perlin", "flat"]:
+            _, faces = generate_bathymetry(20000, terrain=terrain, seed=0)
+            self.assertAlmostEqual(20000, len(faces), delta=20000 * 0.02)
+
+    def test_seabed_stays_within_relief(self):
+        vertices, _ = generate_bathymetry(5000, mean_depth=30, relief=10, seed=1)
+
+        self.assertGreaterEqual(vertices[:, 2].min(), -40 - 1e-9)
+        self.assertLessEqual(vertices[:, 2].max(), -20 + 1e-9)
+
+    def test_same_seed_gives_same_mesh(self):
+        v1, f1 = generate_bathymetry(2000, terrain="perlin", channels=1, overhangs=2, seed=5)
+        v2, f2 = generate_bathymetry(2000, terrain="perlin", channels=1, overhangs=2, seed=5)
+
+        self.assertTrue(np.array_equal(v1, v2))
+        self.assertTrue(np.array_equal(f1, f2))
+
+    def test_overhangs_float_above_the_seabed(self):
+        _, plain_faces = generate_bathymetry(2000, seed=2)
+        vertices, faces = generate_bathymetry(2000, overhangs=3, seed=2)
+
+        self.assertEqual(len(plain_faces) + 6, len(faces))
+        ledge_z = vertices[faces[-6:]][:, :, 2]
+        self.assertGreater(ledge_z.min(), vertices[faces[:len(plain_faces)]][:, :, 2].min())
+
+    def test_unknown_terrain_raises_value_error(self):
+        self.assertRaises(ValueError, generate_bathymetry, 100, terrain="lunar")
+
+    def test_synthetic_spec_generates_a_mesh(self):
+        mesh = synthetic_from_spec("synthetic:2k:perlin:3")
+        self.assertAlmostEqual(2000, len(mesh.faces), delta=100)
+
+
+class TestWriteStl(unittest.TestCase):
+    def test_written_stl_loads_back(self):
+        vertices, faces = generate_bathymetry(2000, seed=3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "seabed.stl")
+            write_stl(filename, vertices, faces)
+            mesh = trimesh.load(filename)
+
+        self.assertEqual(len(faces), len(mesh.faces))
+        self.assertTrue(np.allclose(np.sort(vertices[:, 2])[[0, -1]], mesh.bounds[:, 2], atol=1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import contextlib
+import io
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import trimesh
+
+from utils.cli_parsing import parse_args
+from utils.emitters import BinaryVectorEmitter
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.multibeam import intersect_rays, MultibeamSounder, positions_with_headings, sample_swaths
+from utils.report import RunReport
+from utils.scheduling import DeadlineScheduler
+from utils.truth import load_truth
+
+
+def flat_mesh(depth, size=100.0):
+    vertices = [[0, 0, depth], [size, 0, depth], [size, size, depth], [0, size, depth]]
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CustomTriMesh(trimesh.Trimesh(vertices=vertices, faces=[[0, 1, 2], [0, 2, 3]]), field_split=10)
+
+
+class TestIntersectRays(unittest.TestCase):
+    def setUp(self):
+        self.triangles = np.asarray([[[0, 0, -10], [10, 0, -10], [0, 10, -10]],
+                                     [[0, 0, -5], [10, 0, -5], [0, 10, -5]]], dtype=float)
+
+    def test_nearest_hit_is_found(self):
+        distances, faces = intersect_rays([[1, 1, 0]], [[0, 0, -1]], self.triangles)
+        self.assertEqual([5.0], distances.tolist())
+        self.assertEqual([1], faces.tolist())
+
+    def test_slanted_ray_hits_where_expected(self):
+        distances, faces = intersect_rays([[0, 0, 0]], [[0.5, 0, -1]], self.triangles[:1])
+        np.testing.assert_allclose([0, 0, 0] + distances[0] * np.asarray([0.5, 0, -1]), [5, 0, -10])
+
+    def test_edges_count_and_misses_are_marked(self):
+        distances, faces = intersect_rays([[5, 5, 0], [6, 6, 0], [1, 1, 0]], [[0, 0, -1], [0, 0, -1], [1, 0, 0]],
+                                          self.triangles)
+        self.assertEqual([5.0, math.inf, math.inf], distances.tolist())
+        self.assertEqual([1, -1, -1], faces.tolist())
+
+    def test_no_triangles_misses_everything(self):
+        distances, faces = intersect_rays([[0, 0, 0]], [[0, 0, -1]], np.empty((0, 3, 3)))
+        self.assertEqual([-1], faces.tolist())
+
+
+class TestMultibeamSounder(unittest.TestCase):
+    def test_every_beam_finds_the_depth_of_a_flat_mesh(self):
+        sounder = MultibeamSounder(flat_mesh(-20.0), beams=31, swath_angle=90)
+        soundings = sounder.ping(50, 50, (0, 1))
+
+        self.assertEqual((31, 3), soundings.shape)
+        np.testing.assert_allclose(soundings[:, 2], -20.0)
+        np.testing.assert_allclose(soundings[:, 1], 50.0)
+        # A 90 degree swath reaches as far either side as the water is deep, measured from the casting height
+        reach = sounder.surface_z + 20.0
+        np.testing.assert_allclose(soundings[[0, -1], 0], [50 - reach, 50 + reach])
+
+    def test_swath_lies_across_the_heading(self):
+        sounder = MultibeamSounder(flat_mesh(-20.0), beams=5, swath_angle=60)
+        soundings = sounder.ping(50, 50, (1, 0))
+        np.testing.assert_allclose(soundings[:, 0], 50.0)
+        self.assertTrue(np.all(np.diff(soundings[:, 1]) > 0) or np.all(np.diff(soundings[:, 1]) < 0))
+
+    def test_beams_off_the_mesh_miss(self):
+        soundings = MultibeamSounder(flat_mesh(-20.0), beams=11, swath_angle=120).ping(1, 50, (0, 1))
+        self.assertTrue(np.isnan(soundings[0]).all())
+        self.assertFalse(np.isnan(soundings[5]).any())
+
+    def test_nadir_beam_matches_the_vertical_lookup(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                 field_split=50)
+        sounder = MultibeamSounder(mesh, beams=3, swath_angle=60)
+        for x, y in ((312.5, 401.25), (700.0, 120.0), (55.5, 900.0)):
+            self.assertAlmostEqual(mesh.get_shallowest_depth(x, y), sounder.ping(x, y)[1][2])
+
+    def test_diagonal_pings_match_casting_against_every_face(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mesh = CustomTriMesh(generate_trimesh(20000, terrain="fractal", channels=0, trenches=0, seed=0),
+                                 field_split=50)
+        # Swaths that clip a search bin at its corner must still gather that bin's faces
+        sounder = MultibeamSounder(mesh, beams=32, swath_angle=120)
+        rng = np.random.default_rng(0)
+        for x, y, angle in zip(rng.uniform(0, 1000, 20), rng.uniform(0, 1000, 20), rng.uniform(0, 2 * np.pi, 20)):
+            heading = (np.cos(angle), np.sin(angle))
+            soundings = sounder.ping(x, y, heading)
+
+            across = np.asarray([heading[1], -heading[0]])
+            directions = np.column_stack((np.sin(sounder.beam_angles) * across[0],
+                                          np.sin(sounder.beam_angles) * across[1], -np.cos(sounder.beam_angles)))
+            origins = np.broadcast_to(np.asarray([x, y, sounder.surface_z]), directions.shape)
+            distances, _ = intersect_rays(origins, directions, sounder.triangles)
+            expected = origins + directions * np.where(np.isfinite(distances), distances, np.nan)[:, None]
+            np.testing.assert_allclose(expected, soundings)
+
+    def test_invalid_sounders_are_rejected(self):
+        self.assertRaises(ValueError, MultibeamSounder, flat_mesh(-1.0), beams=0)
+        self.assertRaises(ValueError, MultibeamSounder, flat_mesh(-1.0), swath_angle=180)
+
+
+class TestSampleSwaths(unittest.TestCase):
+    def test_headings_follow_the_path(self):
+        headings = [h for _, _, h in positions_with_headings([(0, 0), (0, 1), (1, 1)])]
+        self.assertEqual([(0, 1), (0, 1), (1, 0)], headings)
+        self.assertEqual([(2, 3, (0.0, 1.0))], list(positions_with_headings([(2, 3)])))
+
+    def test_every_beam_that_hits_is_emitted(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, "swath.bin")
+        emitter = BinaryVectorEmitter(output)
+        report = RunReport()
+        path = [(50, y) for y in range(10, 90, 10)] + [(500, 500)]
+        sample_swaths(MultibeamSounder(flat_mesh(-20.0), beams=16, swath_angle=60), path, [], emitter,
+                      DeadlineScheduler(1, paced=False), report)
+        emitter.close()
+
+        soundings = load_truth(output)
+        self.assertEqual(8 * 16, len(soundings))
+        np.testing.assert_allclose(soundings[:, 2], -20.0)
+        self.assertEqual(9, report.samples)
+        self.assertEqual(1, report.off_mesh)
+
+    def test_cli_only_allows_beams_on_single_pass_runs(self):
+        self.assertEqual(256, parse_args(["test.stl", "--beams", "256"]).beams)
+        for args in (["--beams", "0"], ["--beams", "8", "--swath_angle", "180"], ["--beams", "8", "-p", "drawn"],
+                     ["--beams", "8", "--record_truth", "t.bin"], ["--beams", "8", "--checkpoint", "c.json"]):
+            with self.subTest(args), contextlib.redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, parse_args, ["test.stl"] + args)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from utils import profiling
+from utils.profiling import Profiler, phase
+
+
+def busy(secs):
+    end = time.perf_counter() + secs
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.directory.name, "run")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_phases_do_nothing_without_a_profiler(self):
+        self.assertIsNone(profiling._active)
+        with phase("sampling"):
+            pass
+
+    def test_nested_phases_split_total_and_self_time(self):
+        profiler = Profiler("sample", self.prefix, interval=0.001)
+        profiler.start()
+        with phase("sampling"):
+            busy(0.02)
+            for _ in range(2):
+                with phase("emission"):
+                    busy(0.02)
+        profiler.stop()
+
+        summary = profiler.phase_summary()
+        self.assertEqual(1, summary["sampling"]["calls"])
+        self.assertEqual(2, summary["emission"]["calls"])
+        self.assertGreaterEqual(summary["sampling"]["total_secs"], 0.06)
+        self.assertAlmostEqual(summary["sampling"]["self_secs"],
+                               summary["sampling"]["total_secs"] - summary["emission"]["total_secs"])
+        self.assertIsNone(profiling._active)
+
+    def test_sample_mode_writes_phase_rooted_collapsed_stacks(self):
+        profiler = Profiler("sample", self.prefix, interval=0.001)
+        profiler.start()
+        with phase("index_build"):
+            busy(0.1)
+        paths = profiler.stop()
+
+        self.assertEqual([f"{self.prefix}.collapsed", f"{self.prefix}.phases.json"], paths)
+        with open(f"{self.prefix}.collapsed") as f:
+            lines = f.read().splitlines()
+        busy_lines = [line for line in lines if "busy (" in line]
+        self.assertGreater(len(busy_lines), 0)
+        for line in busy_lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("phase:index_build;"))
+            self.assertGreater(int(count), 0)
+
+        with open(f"{self.prefix}.phases.json") as f:
+            self.assertGreater(json.load(f)["index_build"]["samples"], 0)
+
+    def test_cprofile_mode_writes_pstats(self):
+        profiler = Profiler("cprofile", self.prefix)
+        profiler.start()
+        with phase("mesh_load"):
+            busy(0.01)
+        paths = profiler.stop()
+
+        self.assertIn(f"{self.prefix}.pstats", paths)
+        stats = pstats.Stats(f"{self.prefix}.pstats")
+        self.assertTrue(any(func[2] == "busy" for func in stats.stats))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Profiler("perf")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+
+from utils.report import RunReport, StageTimer, peak_rss_bytes
+from utils.timing import registry
+
+
+class TestRunReport(unittest.TestCase):
+    def test_counts_and_deadlines(self):
+        report = RunReport(sample_rate=10)
+        report.record_sample(emitted=True)
+        report.record_sample(emitted=False, off_mesh=True)
+        report.record_deadline(-0.05)
+        report.record_deadline(0.02)
+        report.record_deadline(0.01)
+
+        summary = report.summary()
+        self.assertEqual(2, summary["samples"])
+        self.assertEqual(1, summary["emitted"])
+        self.assertEqual(1, summary["off_mesh"])
+        self.assertEqual({"checked": 3, "missed": 2, "worst_lateness_secs": 0.02}, summary["deadlines"])
+        self.assertEqual(10, summary["requested_sample_rate"])
+
+    def test_throughput_only_counts_sampling_time(self):
+        report = RunReport()
+        report.start()
+        for _ in range(100):
+            report.record_sample(emitted=True)
+        report.stop()
+
+        summary = report.summary()
+        self.assertGreater(summary["sampling_secs"], 0)
+        self.assertAlmostEqual(100 / summary["sampling_secs"], summary["samples_per_sec"])
+
+    def test_stage_percentiles(self):
+        report = RunReport()
+        for i in range(1, 101):
+            report.record_stage("depth_lookup", i * 1e-4)
+        stage = report.summary()["stages"]["depth_lookup"]
+        self.assertEqual(100, stage["count"])
+        self.assertAlmostEqual(0.005, stage["p50_secs"], delta=0.005 * 0.05)
+
+    def test_batches_of_samples_are_counted(self):
+        report = RunReport()
+        report.record_samples(10, emitted=7)
+        report.record_sample(emitted=True)
+
+        self.assertEqual(11, report.samples)
+        self.assertEqual(8, report.emitted)
+        self.assertEqual(0, report.off_mesh)
+
+    def test_merge(self):
+        first, second = RunReport(), RunReport()
+        first.record_stage("emission", 0.001)
+        second.record_stage("emission", 0.002)
+        second.record_sample(emitted=True)
+        second.record_deadline(0.5)
+        first.sampling_secs, second.sampling_secs = 2.0, 3.0
+        first.merge(second)
+
+        summary = first.summary()
+        self.assertEqual(2, summary["stages"]["emission"]["count"])
+        self.assertEqual(1, summary["samples"])
+        self.assertEqual(0.5, summary["deadlines"]["worst_lateness_secs"])
+        self.assertEqual(3.0, summary["sampling_secs"])
+
+    def test_merge_sums_lookups_and_recomputes_the_hit_rate(self):
+        fleet, first, second = RunReport(), RunReport(), RunReport()
+        for report, hits, misses in ((first, 30, 10), (second, 5, 55)):
+            for _ in range(hits + misses):
+                report.record_sample(emitted=True)
+            report.record_lookups({"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)})
+        fleet.merge(first)
+        fleet.merge(second)
+
+        self.assertEqual(35, fleet.lookups["hits"])
+        self.assertEqual(65, fleet.lookups["misses"])
+        self.assertAlmostEqual(0.35, fleet.lookups["hit_rate"])
+        self.assertIn("35.0% hit rate", fleet.format_text())
+
+    def test_dump_and_format(self):
+        report = RunReport(sample_rate=1, name="vessel-1")
+        report.record_stage("sample", 0.001)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            report.dump(path)
+            with open(path) as f:
+                self.assertEqual("vessel-1", json.load(f)["name"])
+        self.assertIn("vessel-1", report.format_text())
+        self.assertIn("sample", report.format_text())
+
+    def test_peak_rss(self):
+        rss = peak_rss_bytes()
+        if rss is not None:
+            self.assertGreater(rss, 1024 * 1024)
+
+
+class TestStageTimer(unittest.TestCase):
+    def setUp(self):
+        registry.enabled = False
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.addCleanup(setattr, registry, "enabled", False)
+
+    def time_sample(self, report):
+        timer = StageTimer(report, "loop")
+        timer.start()
+        timer.lap("lookup")
+        timer.lap("emission")
+        timer.total("sample")
+        return timer
+
+    def test_stages_are_recorded_in_the_report(self):
+        report = RunReport()
+        self.time_sample(report)
+        self.assertEqual({"lookup", "emission", "sample"}, set(report.summary()["stages"]))
+        self.assertEqual({}, registry.summary())
+
+    def test_stages_are_recorded_in_the_enabled_registry(self):
+        registry.enabled = True
+        report = RunReport(record_stages=False)
+        self.time_sample(report)
+        self.assertEqual({}, report.summary()["stages"])
+        self.assertEqual({"loop.lookup", "loop.emission", "loop.sample"}, set(registry.summary()))
+
+    def test_nothing_is_timed_when_nothing_asked_for_it(self):
+        report = RunReport(record_stages=False)
+        self.assertFalse(self.time_sample(report).enabled)
+        self.assertEqual({}, report.summary()["stages"])
+        self.assertEqual({}, registry.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import unittest
 import numpy as np
 
 from utils.sampling_procedures import calculate_movement_vectors, \
-    parallel_track_sampling_generator, drawn_path_sampling_generator
+    parallel_track_sampling_generator, drawn_path_sampling_generator, planned_path_sampling_generator
 from utils.cli_parsing import parse_args
 
 
@@ -249,5 +249,20 @@ class TestDrawnPathSamplingGenerator(unittest.TestCase):
         self.assertTrue(np.equal(expected_points, actual_points).all())
 
 
+class TestPlannedPathSamplingGenerator(unittest.TestCase):
+    def test_lines_are_sampled_in_order_without_transits(self):
+        # Setup
+        lines = [((0, 0), (0, 10)), ((5, 10), (5, 3)), ((8, 8), (8, 8))]
+        expected_points = np.asarray([(0, 0), (0, 4), (0, 8), (5, 10), (5, 6), (8, 8)])
+
+        # Execute
+        generator = planned_path_sampling_generator(lines, 1, 4)
+        actual_points = np.asarray(list(generator))
+
+        # Assert
+        self.assertTupleEqual(expected_points.shape, actual_points.shape)
+        self.assertTrue(np.allclose(expected_points, actual_points))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+import time
+import unittest
+
+from utils.scheduling import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+class SpinningClock(FakeClock):
+    # Advances a little on every read, so spin waits terminate
+    def __call__(self):
+        self.now += 1e-6
+        return self.now
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def test_samples_are_released_on_absolute_deadlines(self):
+        clock = SpinningClock()
+        scheduler = DeadlineScheduler(200, clock=clock, sleep=clock.sleep)
+        scheduler.start()
+        releases = []
+        for _ in range(1000):
+            self.assertTrue(scheduler.wait())
+            releases.append(clock.now)
+            clock.now += 0.001  # work
+            scheduler.complete()
+
+        # No drift: sample k starts within a microsecond or two of k / 200
+        for k, release in enumerate(releases):
+            self.assertAlmostEqual(k / 200, release, delta=2e-5)
+
+    def test_catch_up_runs_late_samples_back_to_back(self):
+        clock = SpinningClock()
+        scheduler = DeadlineScheduler(1, clock=clock, sleep=clock.sleep)
+        scheduler.start()
+        self.assertTrue(scheduler.wait())
+        clock.now += 3.5
+        self.assertAlmostEqual(2.5, scheduler.complete(), delta=1e-4)
+
+        lateness = []
+        for _ in range(4):
+            self.assertTrue(scheduler.wait())
+            lateness.append(scheduler.complete())
+        # Slots 1 and 2 finish late, slot 3 finishes on time, and slot 4 waits for its release
+        self.assertGreater(lateness[0], 0)
+        self.assertGreater(lateness[1], 0)
+        self.assertLess(lateness[2], 0)
+        self.assertAlmostEqual(4.0, clock.now, delta=1e-4)
+        self.assertEqual(0, scheduler.skipped)
+
+    def test_skip_drops_slots_that_are_a_period_late(self):
+        clock = SpinningClock()
+        scheduler = DeadlineScheduler(1, late_policy="skip", clock=clock, sleep=clock.sleep)
+        scheduler.start()
+        scheduler.wait()
+        clock.now += 3.5
+        scheduler.complete()
+
+        self.assertFalse(scheduler.wait())
+        self.assertFalse(scheduler.wait())
+        self.assertTrue(scheduler.wait())
+        self.assertEqual(2, scheduler.skipped)
+        self.assertLess(scheduler.complete(), 0)
+
+    def test_time_scale_shortens_the_period(self):
+        scheduler = DeadlineScheduler(2, time_scale=10)
+        self.assertAlmostEqual(0.05, scheduler.period)
+
+    def test_unpaced_never_waits(self):
+        clock = FakeClock()
+        scheduler = DeadlineScheduler(1, paced=False, clock=clock, sleep=clock.sleep)
+        scheduler.start()
+        for _ in range(10):
+            self.assertTrue(scheduler.wait())
+            self.assertEqual(0.0, scheduler.complete())
+        self.assertEqual(0.0, clock.now)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, DeadlineScheduler, 1, late_policy="panic")
+        self.assertRaises(ValueError, DeadlineScheduler, 0)
+        self.assertRaises(ValueError, DeadlineScheduler, 1, time_scale=-1)
+
+    def test_real_clock_keeps_rate(self):
+        scheduler = DeadlineScheduler(200)
+        scheduler.start()
+        start = time.perf_counter()
+        for _ in range(100):
+            scheduler.wait()
+            scheduler.complete()
+        self.assertAlmostEqual(0.495, time.perf_counter() - start, delta=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
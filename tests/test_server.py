@@ -0,0 +1,220 @@
+import contextlib
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from utils.mesh import load_mesh
+from utils.server import MeshCache, make_server
+
+MESH = "synthetic:200:flat:0"
+
+
+def small_mesh(key):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_mesh(key, field_split=50)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class HookedLock:
+    def __init__(self, lock, hook):
+        self.lock = lock
+        self.hook = hook
+
+    def __enter__(self):
+        return self.lock.__enter__()
+
+    def __exit__(self, *exc):
+        self.lock.__exit__(*exc)
+        self.hook()
+
+
+class BrokenMesh:
+    bounds = ((0, 0, 0), (100, 100, 0))
+    faces = ()
+
+    def get_shallowest_depth(self, x, y):
+        raise ValueError("the mesh broke")
+
+
+class TestMeshCache(unittest.TestCase):
+    def test_least_recently_used_mesh_is_evicted(self):
+        loads = []
+        cache = MeshCache(2, loader=lambda key: loads.append(key) or key.upper())
+
+        self.assertEqual("A", cache.get("a"))
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+        cache.get("a")
+        cache.get("b")
+
+        self.assertEqual(["a", "b", "c", "b"], loads)
+        self.assertEqual(["a", "b"], list(cache.meshes))
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(4, cache.misses)
+
+    def test_concurrent_requests_load_once(self):
+        started = threading.Event()
+        release = threading.Event()
+        loads = []
+
+        def slow_loader(key):
+            loads.append(key)
+            started.set()
+            release.wait(5)
+            return object()
+
+        cache = MeshCache(2, loader=slow_loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("a"))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        started.wait(5)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(["a"], loads)
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_request_arriving_as_a_load_finishes_uses_it(self):
+        loads = []
+        loaded = threading.Event()
+        late_requests = []
+        late_results = []
+
+        def loader(key):
+            loads.append(key)
+            loaded.set()
+            return object()
+
+        def request_after_load():
+            # Runs as the loading thread first lets go of the cache after the loader has returned
+            if loaded.is_set() and not late_requests:
+                late = threading.Thread(target=lambda: late_results.append(cache.get("a")))
+                late_requests.append(late)
+                late.start()
+                late.join(0.2)
+
+        cache = MeshCache(2, loader=loader)
+        cache._lock = HookedLock(cache._lock, request_after_load)
+        mesh = cache.get("a")
+        late_requests[0].join(5)
+
+        self.assertEqual(["a"], loads)
+        self.assertEqual([mesh], late_results)
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache = MeshCache(2, loader=small_mesh)
+        cls.server = make_server(cls.cache, port=0, quiet=True)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def request(self, method, path, body=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=30)
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response.status, data
+
+    def test_batched_depth_query(self):
+        status, data = self.request("POST", "/depth", {"mesh": MESH, "points": [[500, 500], [250, 750], [-10, -10]]})
+        self.assertEqual(200, status)
+        depths = json.loads(data)["depths"]
+        self.assertEqual(3, len(depths))
+        self.assertLess(depths[0], 0)
+        self.assertLess(depths[1], 0)
+        self.assertIsNone(depths[2])
+
+    def test_simulation_streams_vectors_then_a_report(self):
+        status, data = self.request("POST", "/simulate", {"mesh": MESH, "velocity": 100, "errors": ["noise@0.05"],
+                                                          "bounds": [0, 0, 500, 500]})
+        self.assertEqual(200, status)
+        lines = [json.loads(line) for line in data.decode().splitlines()]
+        vectors, report = lines[:-1], lines[-1]["report"]
+
+        self.assertGreater(len(vectors), 0)
+        self.assertTrue(all(0 <= v["x"] <= 500 and 0 <= v["y"] <= 500 for v in vectors))
+        self.assertEqual(len(vectors), report["emitted"])
+
+    def test_clients_share_the_cached_mesh(self):
+        self.request("POST", "/depth", {"mesh": MESH, "points": [[1, 1]]})
+        status, data = self.request("GET", "/meshes")
+        self.assertEqual(200, status)
+        self.assertEqual([MESH], [m["key"] for m in json.loads(data)["meshes"]])
+
+    def test_bad_requests(self):
+        self.assertEqual(400, self.request("POST", "/depth", {"points": [[1, 1]]})[0])
+        self.assertEqual(400, self.request("POST", "/simulate", {"mesh": MESH, "late_policy": "panic"})[0])
+        self.assertEqual(400, self.request("POST", "/simulate", {"mesh": MESH, "bounds": [0, 0, "far", 10]})[0])
+        self.assertEqual(400, self.request("POST", "/simulate", {"mesh": MESH, "velocity": 0})[0])
+        self.assertEqual(404, self.request("POST", "/nowhere", {})[0])
+        self.assertEqual(404, self.request("GET", "/nowhere")[0])
+
+
+class TestStreamErrors(unittest.TestCase):
+    def test_error_after_streaming_starts_ends_the_stream(self):
+        server = make_server(MeshCache(1, loader=lambda key: BrokenMesh()), port=0, quiet=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=30)
+            connection.request("POST", "/simulate", body=json.dumps({"mesh": "broken", "velocity": 10}))
+            response = connection.getresponse()
+            data = response.read()
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(200, response.status)
+        self.assertNotIn(b"HTTP/1.1 400", data)
+        self.assertEqual({"error": "the mesh broke"}, json.loads(data.decode().splitlines()[-1]))
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not available")
+class TestUnixSocketServer(unittest.TestCase):
+    def test_depth_query_over_a_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sim.sock")
+            server = make_server(MeshCache(1, loader=small_mesh), unix_socket=path, quiet=True)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                connection = UnixHTTPConnection(path)
+                connection.request("POST", "/depth", body=json.dumps({"mesh": MESH, "points": [[500, 500]]}))
+                response = connection.getresponse()
+                self.assertEqual(200, response.status)
+                self.assertLess(json.loads(response.read())["depths"][0], 0)
+                connection.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
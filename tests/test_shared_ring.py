@@ -0,0 +1,141 @@
+import os
+import unittest
+
+import numpy as np
+
+from utils.emitters import SharedMemoryVectorEmitter
+from utils.shared_ring import SharedMemoryRing, SharedMemoryRingReader
+
+
+class TearingRecords:
+    # Stands in for a reader's record view, running on_copy after a slice's sequence numbers are copied but before its
+    # values are
+    def __init__(self, records, on_copy):
+        self.records = records
+        self.on_copy = on_copy
+
+    def __getitem__(self, key):
+        view = self.records[key]
+        if isinstance(key, str):
+            return view
+        tearing = self
+
+        class Slice:
+            def copy(self):
+                out = np.empty(len(view), dtype=view.dtype)
+                out["seq"] = view["seq"]
+                tearing.on_copy()
+                for field in ("x", "y", "z"):
+                    out[field] = view[field]
+                return out
+
+        return Slice()
+
+
+class TestSharedMemoryRing(unittest.TestCase):
+    def setUp(self):
+        self.name = f"echo_sim_test_{os.getpid()}_{self._testMethodName}"[:30]
+        self.ring = SharedMemoryRing(self.name, capacity=8)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_reader_receives_records_in_order(self):
+        reader = SharedMemoryRingReader(self.name)
+        for i in range(5):
+            self.ring.write(i, i * 2, -i)
+
+        records, dropped = reader.read()
+        reader.close()
+
+        self.assertEqual(0, dropped)
+        self.assertListEqual([1, 2, 3, 4, 5], records["seq"].tolist())
+        self.assertListEqual([0, 2, 4, 6, 8], records["y"].tolist())
+
+    def test_successive_reads_only_return_new_records(self):
+        reader = SharedMemoryRingReader(self.name)
+        self.ring.write(1, 1, 1)
+        reader.read()
+        self.ring.write(2, 2, 2)
+
+        records, _ = reader.read()
+        empty, _ = reader.read()
+        reader.close()
+
+        self.assertListEqual([2], records["seq"].tolist())
+        self.assertEqual(0, len(empty))
+
+    def test_overrun_is_reported_as_dropped_records(self):
+        reader = SharedMemoryRingReader(self.name)
+        for i in range(20):
+            self.ring.write(i, 0, 0)
+
+        records, dropped = reader.read()
+        reader.close()
+
+        self.assertEqual(12, dropped)
+        self.assertListEqual(list(range(13, 21)), records["seq"].tolist())
+
+    def test_reads_across_the_end_of_the_ring(self):
+        reader = SharedMemoryRingReader(self.name)
+        for i in range(6):
+            self.ring.write(i, 0, 0)
+        reader.read()
+        for i in range(6):
+            self.ring.write(i, 0, 0)
+
+        records, dropped = reader.read(max_records=4)
+        reader.close()
+
+        self.assertEqual(0, dropped)
+        self.assertListEqual([7, 8, 9, 10], records["seq"].tolist())
+
+    def test_record_overwritten_while_copying_is_dropped(self):
+        for i in range(8):
+            self.ring.write(i, 0, 0)
+        reader = SharedMemoryRingReader(self.name)
+        records = reader.records
+
+        def writer_starts_next_record():
+            # The writer has cleared the oldest slot's sequence number and stored the first value of record 9
+            records[0]["seq"] = 0
+            records[0]["x"] = -1
+
+        reader.records = TearingRecords(records, writer_starts_next_record)
+        out, dropped = reader.read()
+        reader.records = records
+        reader.close()
+
+        self.assertEqual(1, dropped)
+        self.assertListEqual(list(range(2, 9)), out["seq"].tolist())
+        self.assertListEqual(list(range(1, 8)), out["x"].tolist())
+
+    def test_latest_start_skips_existing_records(self):
+        self.ring.write(1, 1, 1)
+        reader = SharedMemoryRingReader(self.name, start="latest")
+        self.ring.write(2, 2, 2)
+
+        records, _ = reader.read()
+        reader.close()
+
+        self.assertListEqual([2], records["seq"].tolist())
+
+
+class TestSharedMemoryVectorEmitter(unittest.TestCase):
+    def test_emitted_vectors_can_be_read_and_close_is_visible(self):
+        name = f"echo_sim_test_emit_{os.getpid()}"
+        emitter = SharedMemoryVectorEmitter(name, capacity=16)
+        reader = SharedMemoryRingReader(name)
+        emitter.emit_vector((1.5, 2.5, -3.5))
+        self.assertFalse(reader.closed)
+        emitter.close()
+
+        records, _ = reader.read()
+        self.assertTrue(reader.closed)
+        reader.close()
+
+        self.assertEqual((1.5, 2.5, -3.5), (records["x"][0], records["y"][0], records["z"][0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
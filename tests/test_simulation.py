@@ -0,0 +1,80 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+import trimesh
+
+from utils.error_pipeline import Noise, FalseBottom, Dropout
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.simulation import simulate, simulate_iter, parallel_path, SAMPLE_DTYPE, FLAG_OFF_MESH, FLAG_DROPOUT, \
+    FLAG_FALSE_BOTTOM
+
+
+class TestSimulate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                     field_split=50)
+
+    def test_samples_without_errors_are_true_depths(self):
+        path = [(100.0, 100.0), (500.0, 500.0), (2000.0, 2000.0)]
+        samples = simulate(self.mesh, path, sample_rate=2, start_time=10)
+
+        self.assertEqual(SAMPLE_DTYPE, samples.dtype)
+        self.assertEqual(3, len(samples))
+        self.assertEqual(self.mesh.get_shallowest_depth(500, 500), samples["true_z"][1])
+        np.testing.assert_array_equal(samples["true_z"][:2], samples["measured_z"][:2])
+        np.testing.assert_array_equal([10, 10.5, 11], samples["t"])
+        np.testing.assert_array_equal([0, 0, FLAG_OFF_MESH], samples["flags"])
+        self.assertTrue(np.isnan(samples["true_z"][2]))
+
+    def test_meshes_are_indexed_without_printing(self):
+        seabed = generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0)
+        # A vertical face hanging from the first vertex, so pruning has something to report
+        below = seabed.vertices[0] * [1, 1, 0] + [0, 0, -100]
+        walled = trimesh.Trimesh(vertices=np.concatenate((seabed.vertices, [below])),
+                                 faces=np.concatenate((seabed.faces, [[0, 1, len(seabed.vertices)]])), process=False)
+        for mesh in (walled, "synthetic:200:flat:0"):
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                simulate(mesh, [(100.0, 100.0)])
+            self.assertEqual("", out.getvalue())
+
+    def test_off_mesh_positions_can_be_left_out(self):
+        samples = simulate(self.mesh, np.array([[100, 100], [-50, -50], [200, 200]]), include_off_mesh=False)
+        self.assertEqual(2, len(samples))
+        np.testing.assert_array_equal([0, 2], samples["t"])
+
+    def test_errors_are_flagged(self):
+        false_bottom = FalseBottom(debris_size=1e6, seed=1)
+        false_bottom.init_debris(0, 0, 1000, 1000)
+        path = list(parallel_path(self.mesh, velocity=50))
+        samples = simulate(self.mesh, path, errors=[Noise(0.05), false_bottom, Dropout(0.2)])
+
+        dropped = samples["flags"] & FLAG_DROPOUT > 0
+        on_debris = samples["flags"] & FLAG_FALSE_BOTTOM > 0
+        self.assertTrue(dropped.any())
+        self.assertTrue(on_debris.any())
+        np.testing.assert_array_equal(0, samples["measured_z"][dropped])
+        self.assertTrue((samples["measured_z"][on_debris & ~dropped] == false_bottom.depth).all())
+
+    def test_iter_yields_chunks_of_the_same_samples(self):
+        path = list(parallel_path(self.mesh, velocity=50))
+        chunks = list(simulate_iter(self.mesh, path, chunk_size=100))
+
+        self.assertTrue(all(len(c) == 100 for c in chunks[:-1]))
+        np.testing.assert_array_equal(simulate(self.mesh, path), np.concatenate(chunks))
+
+    def test_parallel_path_bounds(self):
+        path = np.array(list(parallel_path(self.mesh, velocity=25, bounds=(0, 0, 100, 200))))
+        self.assertTrue((path[:, 0] <= 100).all())
+        self.assertTrue((path[:, 1] <= 200).all())
+
+    def test_empty_path(self):
+        self.assertEqual(0, len(simulate(self.mesh, [])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import math
+import unittest
+
+import numpy as np
+
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.sampling_procedures import planned_path_sampling_generator, parallel_track_sampling_generator
+from utils.survey_planning import plan_survey, footprint, order_lines
+
+
+class TestSurveyPlanning(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # An L shaped mesh: the 1 km square without its top right quarter
+        raw_mesh = generate_trimesh(2000, terrain="flat", channels=0, trenches=0, seed=0)
+        centres = raw_mesh.triangles_center
+        raw_mesh.update_faces(~((centres[:, 0] > 500) & (centres[:, 1] > 500)))
+        raw_mesh.remove_unreferenced_vertices()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(raw_mesh, field_split=40)
+
+    def test_footprint_leaves_out_the_missing_quarter(self):
+        covered = footprint(self.mesh)
+        self.assertTrue(covered[:18, :].all())
+        self.assertFalse(covered[22:, 22:].any())
+        self.assertAlmostEqual(0.75, covered.mean(), delta=0.05)
+
+    def test_planned_samples_stay_on_the_mesh(self):
+        plan = plan_survey(self.mesh, line_spacing=50)
+        (min_x, min_y, _), (max_x, max_y, _) = self.mesh.bounds
+        planned = list(planned_path_sampling_generator(plan.lines, 1, 25))
+        parallel = list(parallel_track_sampling_generator(min_x, max_x, min_y, max_y, 1, 50))
+
+        off_mesh = sum(self.mesh.get_shallowest_depth(x, y) is None for x, y in planned)
+        self.assertLess(off_mesh / len(planned), 0.05)
+        self.assertLess(plan.survey_length, 0.8 * plan.sweep_length)
+        self.assertGreater(sum(self.mesh.get_shallowest_depth(x, y) is None for x, y in parallel) / len(parallel), 0.2)
+
+    def test_lines_follow_the_heading_and_spacing(self):
+        plan = plan_survey(self.mesh, line_spacing=100, heading=90)
+        for start, end in plan.lines:
+            self.assertAlmostEqual(start[1], end[1])
+        offsets = sorted({round(start[1], 6) for start, _ in plan.lines})
+        np.testing.assert_allclose(np.diff(offsets), 100)
+
+    def test_ordering_alternates_direction_to_keep_transits_short(self):
+        plan = plan_survey(self.mesh, line_spacing=100)
+        for (_, end), (start, next_end) in zip(plan.lines, plan.lines[1:]):
+            self.assertLessEqual(math.dist(end, start), math.dist(end, next_end))
+        # Surveying every line in the same direction would need a transit as long as each line
+        self.assertLess(plan.transit_length, 0.2 * plan.survey_length)
+        self.assertEqual(len(plan.lines), plan.summary()["lines"])
+
+    def test_order_lines_picks_the_nearest_end(self):
+        segments = [((0, 0), (0, 10)), ((20, 0), (20, 10)), ((10, 0), (10, 10))]
+        lines = order_lines([(np.asarray(s), np.asarray(e)) for s, e in segments])
+
+        self.assertEqual([(0, 10), (10, 0), (20, 10)], [tuple(e) for _, e in lines])
+        self.assertEqual(20, sum(math.dist(lines[i][1], lines[i + 1][0]) for i in range(2)))
+
+    def test_spacing_must_be_positive(self):
+        self.assertRaises(ValueError, plan_survey, self.mesh, 0)
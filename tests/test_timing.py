@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from utils.timing import LatencyHistogram, MetricsRegistry, registry, timed
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_are_within_the_bucket_growth(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i * 1e-4)
+
+        self.assertEqual(1000, histogram.count)
+        self.assertAlmostEqual(0.050, histogram.percentile(50), delta=0.050 * 0.05)
+        self.assertAlmostEqual(0.095, histogram.percentile(95), delta=0.095 * 0.05)
+        self.assertAlmostEqual(0.099, histogram.percentile(99), delta=0.099 * 0.05)
+
+    def test_percentiles_are_clamped_to_observed_range(self):
+        histogram = LatencyHistogram()
+        histogram.record(0.25)
+
+        self.assertEqual(0.25, histogram.percentile(1))
+        self.assertEqual(0.25, histogram.percentile(99))
+
+    def test_empty_histogram_has_nan_percentiles(self):
+        histogram = LatencyHistogram()
+        p50 = histogram.percentile(50)
+        self.assertNotEqual(p50, p50)
+
+    def test_merge_adds_counts(self):
+        a = LatencyHistogram()
+        b = LatencyHistogram()
+        a.record(1e-3)
+        b.record(1e-1)
+        a.merge(b)
+
+        self.assertEqual(2, a.count)
+        self.assertEqual(1e-1, a.max)
+        self.assertEqual(1e-3, a.min)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def tearDown(self):
+        registry.enabled = False
+        registry.reset()
+
+    def test_timed_records_nothing_when_disabled(self):
+        @timed
+        def add(a, b):
+            return a + b
+
+        self.assertEqual(3, add(1, 2))
+        self.assertDictEqual({}, registry.summary())
+
+    def test_timed_records_call_counts_when_enabled(self):
+        @timed
+        def add(a, b):
+            return a + b
+
+        registry.enabled = True
+        for i in range(5):
+            add(i, i)
+
+        name = add.__wrapped__.__qualname__
+        self.assertEqual(5, registry.summary()[name]["count"])
+
+    def test_threads_recording_a_new_name_share_its_histogram(self):
+        metrics = MetricsRegistry()
+
+        def slow_histogram():
+            # Give the other threads time to look the name up while its histogram is being made
+            time.sleep(0.05)
+            return LatencyHistogram()
+
+        with mock.patch("utils.timing.LatencyHistogram", side_effect=slow_histogram):
+            threads = [threading.Thread(target=metrics.record, args=("sample", 0.001)) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(4, metrics.summary()["sample"]["count"])
+
+    def test_dump_writes_json_summary(self):
+        metrics = MetricsRegistry()
+        metrics.record("lookup", 0.001)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            metrics.dump(path)
+            with open(path) as f:
+                summary = json.load(f)
+
+        self.assertEqual(1, summary["lookup"]["count"])
+        self.assertIn("p99_secs", summary["lookup"])
+        self.assertIn("lookup", metrics.format_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.emitters import CsvVectorEmitter, BinaryVectorEmitter
+from utils.error_pipeline import Noise, FalseBottom, Dropout, run_pipeline_array
+from utils.mesh import CustomTriMesh
+from utils.mesh_generation import generate_trimesh
+from utils.report import RunReport
+from utils.simulation import simulate, parallel_path
+from utils.truth import record_truth, load_truth, init_replay_errors, replay
+
+
+class TestVectorisedErrors(unittest.TestCase):
+    def setUp(self):
+        self.vectors = np.column_stack((np.arange(5000.0), np.zeros(5000), np.full(5000, -20.0)))
+
+    def test_noise_follows_its_distribution_and_seed(self):
+        first = Noise(0.3, seed=1).eval_array(self.vectors)
+        second = Noise(0.3, seed=1).eval_array(self.vectors)
+
+        np.testing.assert_array_equal(first, second)
+        np.testing.assert_array_equal(self.vectors[:, :2], first[:, :2])
+        self.assertAlmostEqual(0.1, np.std(first[:, 2] / -20.0 - 1), delta=0.01)
+
+    def test_dropout_matches_running_one_vector_at_a_time(self):
+        err = Dropout(0.05, drop_off_rate=0.5, seed=3)
+        draws = np.random.default_rng(Dropout(0.05, seed=3).rng.getrandbits(64)).random(len(self.vectors))
+        new_vectors = err.eval_array(self.vectors)
+
+        drops_in_a_row = 0
+        expected = []
+        for draw in draws:
+            dropped = draw < 0.05 + (0.5 / drops_in_a_row if drops_in_a_row > 0 else 0)
+            drops_in_a_row = drops_in_a_row + 1 if dropped else 0
+            expected.append(dropped)
+
+        np.testing.assert_array_equal(expected, new_vectors[:, 2] == 0)
+        self.assertGreater(max(len(run) for run in "".join("1" if e else "0" for e in expected).split("0")), 1)
+        self.assertEqual(drops_in_a_row, err.drops_in_a_row)
+
+    def test_false_bottom_matches_eval(self):
+        err = FalseBottom(debris_size=1e6, seed=1)
+        err.init_debris(0, 0, 5000, 100)
+        vectors = np.column_stack((np.arange(5000.0), np.full(5000, 50.0), np.linspace(-10, -30, 5000)))
+        expected = [err.eval(tuple(v)) for v in vectors.tolist()]
+
+        err.depth = 0
+        np.testing.assert_array_equal(expected, err.eval_array(vectors))
+
+    def test_pipeline_of_nothing_leaves_vectors_alone(self):
+        np.testing.assert_array_equal(self.vectors, run_pipeline_array([], self.vectors))
+
+
+class TestTruthRecording(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.mesh = CustomTriMesh(generate_trimesh(200, terrain="fractal", channels=0, trenches=0, seed=0),
+                                     field_split=50)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.truth = os.path.join(self.directory.name, "truth.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_recording_holds_the_true_depths_on_the_mesh(self):
+        count = record_truth(self.mesh, parallel_path(self.mesh, velocity=50), self.truth, chunk_size=100)
+        samples = simulate(self.mesh, parallel_path(self.mesh, velocity=50), include_off_mesh=False)
+        soundings = load_truth(self.truth)
+
+        self.assertEqual(len(samples), count)
+        np.testing.assert_array_equal(np.column_stack((samples["x"], samples["y"], samples["true_z"])), soundings)
+
+    def test_replay_emits_the_processed_recording(self):
+        record_truth(self.mesh, parallel_path(self.mesh, velocity=50), self.truth)
+        soundings = load_truth(self.truth)
+        errors = [FalseBottom(debris_size=1e4, seed=2), Dropout(0.1, seed=1)]
+        init_replay_errors(soundings, errors)
+
+        output = os.path.join(self.directory.name, "out.bin")
+        emitter = BinaryVectorEmitter(output)
+        summary = replay(soundings, errors, emitter, chunk_size=1000)
+        emitter.close()
+
+        replayed = load_truth(output)
+        self.assertEqual(len(soundings), summary["soundings"])
+        np.testing.assert_array_equal(soundings[:, :2], replayed[:, :2])
+        self.assertTrue(np.any(replayed[:, 2] == 0))
+        self.assertTrue(np.any(replayed[:, 2] != soundings[:, 2]))
+
+    def test_replay_counts_soundings_and_times_chunks_in_a_report(self):
+        record_truth(self.mesh, parallel_path(self.mesh, velocity=50), self.truth)
+        soundings = load_truth(self.truth)
+        report = RunReport()
+
+        replay(soundings, [Noise(0.1, seed=1)], BinaryVectorEmitter(os.path.join(self.directory.name, "out.bin")),
+               chunk_size=1000, report=report)
+
+        self.assertEqual(len(soundings), report.samples)
+        self.assertEqual(len(soundings), report.emitted)
+        self.assertEqual(-(-len(soundings) // 1000), report.stages["chunk"].count)
+        self.assertGreater(report.sampling_secs, 0)
+
+    def test_replay_run_writes_its_report_and_metrics(self):
+        record_truth(self.mesh, parallel_path(self.mesh, velocity=50), self.truth)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output, report, metrics = (os.path.join(self.directory.name, name) for name in ("out.csv", "r.json", "m.json"))
+
+        subprocess.run([sys.executable, "echo_sound_sim.py", self.truth, "--replay", "-e", "noise@0.05",
+                        "-em", f"csv@{output}", "--report", report, "--metrics", metrics],
+                       cwd=root, capture_output=True, text=True, check=True)
+
+        with open(report) as f:
+            self.assertEqual(len(load_truth(self.truth)), json.load(f)["emitted"])
+        with open(metrics) as f:
+            self.assertIn("replay.chunk", f.read())
+        with open(output) as f:
+            self.assertEqual(len(load_truth(self.truth)), len(f.read().splitlines()))
+
+    def test_batched_emission_writes_the_same_file(self):
+        vectors = np.asarray([(0.5, 1.0, -2.25), (1.5, 2.0, -3.0)] * 10)
+        for extension, make_emitter in (("csv", CsvVectorEmitter), ("bin", BinaryVectorEmitter),
+                                        ("csv.gz", CsvVectorEmitter)):
+            with self.subTest(extension):
+                one_at_a_time = make_emitter(os.path.join(self.directory.name, f"a.{extension}"))
+                for v in vectors.tolist():
+                    one_at_a_time.emit_vector(v)
+                one_at_a_time.close()
+                batched = make_emitter(os.path.join(self.directory.name, f"b.{extension}"))
+                batched.emit_vectors(vectors[:7])
+                batched.emit_vectors(vectors[7:])
+                batched.close()
+
+                read = gzip.open if extension == "csv.gz" else open
+                with read(one_at_a_time.filename, "rb") as f1, read(batched.filename, "rb") as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+    def test_partial_records_are_rejected(self):
+        with open(self.truth, "wb") as f:
+            f.write(bytes(30))
+        self.assertRaises(ValueError, load_truth, self.truth)
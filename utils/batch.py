@@ -0,0 +1,283 @@
+"""
+Declares and maintains the batch runner, which runs many scenarios from one configuration file. Every scenario is a job
+of its own on a process pool, queued mesh by mesh. A worker keeps the last mesh it loaded and indexed, so it loads
+each mesh at most once, and the scenarios of one mesh run side by side in as many workers as are free. Each of those
+workers holds its own copy of the index, so memory grows with the workers sampling a mesh at the same time.
+
+Run from the project root with:
+    python -m utils.batch scenarios.toml --workers 4 --manifest manifest.json
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.cli_parsing import parse_error, parse_emitter, configure_emitter
+from utils.config_files import load_config
+from utils.depth_cache import DepthCache
+from utils.error_pipeline import init_pipeline
+from utils.mesh import load_mesh
+from utils.mesh_generation import SYNTHETIC_PREFIX
+from utils.report import RunReport
+from utils.sampling_procedures import parallel_track_sampling_generator, sample_path
+from utils.scheduling import DeadlineScheduler
+
+SCENARIO_KEYS = {"name", "mesh", "path_type", "velocity", "sample_rate", "errors", "emitter", "bounds", "compression",
+                 "origin", "depth_cache"}
+# Emitters whose location is a file, which is resolved against the configuration's directory
+FILE_EMITTERS = {"csv", "tsv", "bin", "las"}
+
+# The mesh this worker process last loaded, or failed to load, and the depth caches of its scenarios
+_worker_mesh_ = {}
+
+
+def _resolve_paths_(scenario: dict, base_dir: str) -> None:
+    """
+    Makes a scenario's relative mesh file and file emitter output relative to a directory instead of the working
+    directory
+
+    Args:
+        scenario: the scenario, which is updated
+        base_dir: the directory of the configuration file
+
+    Returns:
+        None
+    """
+    if not scenario["mesh"].startswith(SYNTHETIC_PREFIX):
+        scenario["mesh"] = os.path.join(base_dir, scenario["mesh"])
+    emitter, _, location = scenario["emitter"].partition("@")
+    if emitter in FILE_EMITTERS and location:
+        scenario["emitter"] = f"{emitter}@{os.path.join(base_dir, location)}"
+
+
+def scenarios_from_config(config: dict, base_dir: str = None) -> list[dict]:
+    """
+    Resolves the scenarios of a batch configuration. Each entry of its "scenarios" list may set a name, mesh,
+    velocity, sample_rate, errors (like ["noise@0.05", "drop@0.01"]), emitter (like "csv@out/s1.csv"), bounds
+    ([min_x, min_y, max_x, max_y]), compression, origin, and depth_cache (a tolerance in meters). Settings a scenario
+    leaves out come from the "defaults" table.
+
+    Args:
+        config: the parsed configuration
+        base_dir: [Optional] the directory of the configuration file, which relative mesh files and file emitter
+            outputs are resolved against. They are left relative to the working directory otherwise.
+
+    Returns:
+        scenarios: the scenarios with every default filled in
+
+    Raises:
+        ValueError if there are no scenarios, a name is repeated, a scenario has no mesh, a setting is unknown, or a
+            depth_cache tolerance is not positive
+    """
+    defaults = {"velocity": 1.0, "sample_rate": 1.0, "errors": [], "emitter": "stdout"}
+    defaults.update(config.get("defaults", {}))
+    entries = config.get("scenarios", [])
+    if len(entries) == 0:
+        raise ValueError("The batch configuration has no scenarios")
+
+    scenarios = []
+    names = set()
+    for i, entry in enumerate(entries):
+        scenario = dict(defaults)
+        scenario.update(entry)
+        scenario.setdefault("name", f"scenario-{i + 1}")
+
+        unknown = set(scenario) - SCENARIO_KEYS
+        if unknown:
+            raise ValueError(f"Unknown scenario settings {sorted(unknown)}, expected some of {sorted(SCENARIO_KEYS)}")
+        if "mesh" not in scenario:
+            raise ValueError(f"Scenario '{scenario['name']}' has no mesh")
+        if scenario.get("path_type", "parallel") != "parallel":
+            raise ValueError("Batch scenarios only support parallel track paths")
+        if scenario.get("depth_cache", 1) <= 0:
+            raise ValueError(f"Scenario '{scenario['name']}' has a depth_cache tolerance that is not positive")
+        if scenario["name"] in names:
+            raise ValueError(f"Scenario name '{scenario['name']}' is used more than once")
+        names.add(scenario["name"])
+        if base_dir is not None:
+            _resolve_paths_(scenario, base_dir)
+        scenarios.append(scenario)
+    return scenarios
+
+
+def group_by_mesh(scenarios: list[dict]) -> dict[str, list[dict]]:
+    """
+    Groups scenarios by the mesh they sample, largest group first so the longest jobs start soonest
+
+    Args:
+        scenarios: the resolved scenarios
+
+    Returns:
+        groups: a mapping of mesh to its scenarios, in configuration order
+    """
+    groups = {}
+    for scenario in scenarios:
+        groups.setdefault(scenario["mesh"], []).append(scenario)
+    return dict(sorted(groups.items(), key=lambda item: len(item[1]), reverse=True))
+
+
+def run_scenario(mesh, scenario: dict, depth_cache: DepthCache = None) -> dict:
+    """
+    Runs one scenario as fast as possible against an indexed mesh
+
+    Args:
+        mesh: the indexed CustomTriMesh
+        scenario: the resolved scenario
+        depth_cache: [Optional] a DepthCache of the mesh to look depths up through
+
+    Returns:
+        result: the scenario's name, output, status, duration, and run report
+    """
+    _, _, output = scenario["emitter"].partition("@")
+    result = {"name": scenario["name"], "mesh": scenario["mesh"], "output": output or None}
+    start = time.perf_counter()
+    try:
+        if output and os.path.dirname(output) and "://" not in output:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        emitter = parse_emitter(scenario["emitter"])
+        configure_emitter(emitter, scenario.get("compression"), scenario["sample_rate"], scenario.get("origin"))
+        errors = [err for err in (parse_error(spec) for spec in scenario["errors"]) if err is not None]
+
+        if "bounds" in scenario:
+            min_x, min_y, max_x, max_y = scenario["bounds"]
+        else:
+            (min_x, min_y, _), (max_x, max_y, _) = mesh.bounds
+        init_pipeline(errors, min_x, min_y, max_x, max_y)
+
+        path = parallel_track_sampling_generator(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+                                                 sample_rate=scenario["sample_rate"], velocity=scenario["velocity"])
+        report = RunReport(sample_rate=scenario["sample_rate"], name=scenario["name"])
+        try:
+            sample_path(depth_cache or mesh, path, errors, emitter, DeadlineScheduler(scenario["sample_rate"], paced=False),
+                        report)
+        finally:
+            emitter.close()
+        result.update(status="ok", report=report.summary())
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["secs"] = time.perf_counter() - start
+    return result
+
+
+def run_pooled_scenario(scenario: dict, field_split: int = 1000) -> dict:
+    """
+    Runs one scenario in a worker process. The mesh is only loaded and indexed when the worker's previous scenario
+    sampled a different one. Scenarios with the same depth_cache tolerance that run in the same worker share one
+    DepthCache, so positions sampled by an earlier scenario are not looked up again.
+
+    Args:
+        scenario: the resolved scenario
+        field_split: the number of search bins along each axis of the index
+
+    Returns:
+        result: the result of run_scenario(), with load_secs, the time spent loading the mesh for this scenario, or None
+            if the worker had already loaded it
+    """
+    if _worker_mesh_.get("key") != scenario["mesh"]:
+        _worker_mesh_.clear()
+        _worker_mesh_.update(key=scenario["mesh"], caches={})
+        start = time.perf_counter()
+        try:
+            _worker_mesh_["mesh"] = load_mesh(scenario["mesh"], field_split=field_split, verbose=False)
+        except Exception as e:
+            _worker_mesh_["error"] = f"Could not load the mesh: {type(e).__name__}: {e}"
+        load_secs = time.perf_counter() - start
+    else:
+        load_secs = None
+
+    if "error" in _worker_mesh_:
+        output = scenario["emitter"].partition("@")[2] or None
+        return {"name": scenario["name"], "mesh": scenario["mesh"], "output": output, "status": "failed",
+                "error": _worker_mesh_["error"], "secs": 0.0, "load_secs": load_secs}
+    mesh, caches = _worker_mesh_["mesh"], _worker_mesh_["caches"]
+    tolerance = scenario.get("depth_cache")
+    if tolerance is not None and tolerance not in caches:
+        caches[tolerance] = DepthCache(mesh, tolerance)
+    result = run_scenario(mesh, scenario, caches.get(tolerance))
+    result["load_secs"] = load_secs
+    return result
+
+
+def run_batch(config: dict, workers: int = None, field_split: int = None, base_dir: str = None) -> dict:
+    """
+    Runs every scenario of a batch configuration
+
+    Args:
+        config: the parsed configuration. Its optional "workers" and "field_split" settings are used when the
+            arguments are not given.
+        workers: [Optional] the number of worker processes. Defaults to the number of scenarios, up to the cpu count.
+        field_split: [Optional] the number of search bins along each axis of the mesh indexes. Defaults to 1000.
+        base_dir: [Optional] the directory of the configuration file, see scenarios_from_config()
+
+    Returns:
+        manifest: when the batch ran, how long it took, and the load time of each mesh and result of each scenario
+    """
+    scenarios = scenarios_from_config(config, base_dir)
+    groups = group_by_mesh(scenarios)
+    workers = workers or config.get("workers") or min(len(scenarios), os.cpu_count() or 1)
+    field_split = field_split or config.get("field_split", 1000)
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    start = time.perf_counter()
+    # Jobs are taken in order, so a worker never goes back to a mesh it has moved on from
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {s["name"]: pool.submit(run_pooled_scenario, s, field_split) for group in groups.values() for s in group}
+        by_name = {name: future.result() for name, future in futures.items()}
+
+    meshes = []
+    for mesh_key, group in groups.items():
+        loads = [secs for secs in (by_name[s["name"]].pop("load_secs") for s in group) if secs is not None]
+        # Workers load a mesh side by side, so the slowest load is the one the batch waited for
+        meshes.append({"mesh": mesh_key, "load_secs": max(loads), "loads": len(loads), "scenarios": len(group)})
+    # Report scenarios in configuration order
+    results = [by_name[s["name"]] for s in scenarios]
+    return {
+        "started": started.isoformat(),
+        "wall_secs": time.perf_counter() - start,
+        "workers": workers,
+        "meshes": meshes,
+        "scenarios": results,
+        "failed": sum(r["status"] != "ok" for r in results),
+    }
+
+
+def format_manifest(manifest: dict) -> str:
+    """
+    Formats a manifest as a table of scenarios
+
+    Args:
+        manifest: the result of run_batch()
+
+    Returns:
+        table: the formatted manifest
+    """
+    lines = [f"{'scenario':<24}{'status':>8}{'secs':>10}{'samples':>10}  output"]
+    for r in manifest["scenarios"]:
+        samples = r["report"]["samples"] if "report" in r else "-"
+        lines.append(f"{r['name']:<24}{r['status']:>8}{r['secs']:>10.2f}{samples:>10}  {r.get('error') or r['output']}")
+    lines.append(f"{len(manifest['scenarios'])} scenarios over {len(manifest['meshes'])} meshes in "
+                 f"{manifest['wall_secs']:.2f} s with {manifest['workers']} workers, {manifest['failed']} failed")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a batch of simulation scenarios from a configuration file")
+    parser.add_argument("config", help="A .toml, .yaml, or .json file of scenarios")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="The number of worker processes. Defaults to the number of scenarios, up to the cpu count.")
+    parser.add_argument("--field_split", type=int, default=None,
+                        help="The number of search bins along each axis of the mesh indexes. Defaults to 1000.")
+    parser.add_argument("--manifest", default="manifest.json",
+                        help="Where to write the summary manifest. Defaults to manifest.json")
+    cli_args = parser.parse_args(sys.argv[1:])
+
+    batch_manifest = run_batch(load_config(cli_args.config), cli_args.workers, cli_args.field_split,
+                               os.path.dirname(os.path.abspath(cli_args.config)))
+    batch_manifest["config"] = os.path.abspath(cli_args.config)
+    with open(cli_args.manifest, "w") as f:
+        json.dump(batch_manifest, f, indent=4)
+    print(format_manifest(batch_manifest))
+    sys.exit(1 if batch_manifest["failed"] else 0)
@@ -0,0 +1,130 @@
+"""
+Declares and maintains checkpoints of long simulation runs, so a run that stops part way can be resumed from its last
+checkpoint instead of starting over
+"""
+import datetime
+import json
+import os
+
+from utils.emitters import VectorEmitter
+from utils.error_pipeline import ErrorType
+from utils.profiling import phase
+
+CHECKPOINT_VERSION = 1
+
+
+def load_checkpoint(filename: str) -> dict:
+    """
+    Reads a checkpoint file
+
+    Args:
+        filename: the path to the checkpoint
+
+    Returns:
+        checkpoint: the position, settings, error states, and emitter state of the run
+
+    Raises:
+        ValueError if the file is not a checkpoint this version can resume
+    """
+    with open(filename) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{filename} is not a version {CHECKPOINT_VERSION} checkpoint")
+    return checkpoint
+
+
+class Checkpointer:
+    def __init__(self, filename: str, every: int = 1000, settings: dict = None):
+        """
+        Periodically saves everything a run needs to carry on from the same position of its path: how many positions
+        it has consumed, the state of each error in the pipeline, and how far the emitter has got. Resuming from a
+        checkpoint produces the same output from then on as a run that never stopped.
+
+        Args:
+            filename: the path of the checkpoint file, which is replaced at each save
+            every: the number of path positions between saves
+            settings: [Optional] the run's settings, which must match when resuming
+        """
+        if every < 1:
+            raise ValueError("Checkpoints must be at least one position apart")
+        self.filename = filename
+        self.every = every
+        self.settings = settings if settings is not None else {}
+        self.position = 0
+        self.saves = 0
+
+    def advance(self, errors: list[ErrorType], emitter: VectorEmitter) -> bool:
+        """
+        Counts a consumed path position, saving a checkpoint if one is due
+
+        Args:
+            errors: the run's error pipeline
+            emitter: the run's emitter
+
+        Returns:
+            saved: whether a checkpoint was saved
+        """
+        self.position += 1
+        if self.position % self.every != 0:
+            return False
+        self.save(errors, emitter)
+        return True
+
+    def save(self, errors: list[ErrorType], emitter: VectorEmitter) -> None:
+        """
+        Saves a checkpoint at the current position. The emitter's output is made durable first and the file is
+        replaced atomically, so a crash at any point leaves a checkpoint that matches the output.
+
+        Args:
+            errors: the run's error pipeline
+            emitter: the run's emitter
+
+        Returns:
+            None
+        """
+        with phase("checkpoint"):
+            checkpoint = {
+                "version": CHECKPOINT_VERSION,
+                "saved": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "position": self.position,
+                "settings": self.settings,
+                "errors": [{"type": type(err).__name__, "state": err.get_state()} for err in errors],
+                "emitter": {"type": type(emitter).__name__, "state": emitter.checkpoint()},
+            }
+            temp_filename = f"{self.filename}.tmp"
+            with open(temp_filename, "w") as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_filename, self.filename)
+        self.saves += 1
+
+    def resume(self, errors: list[ErrorType], emitter: VectorEmitter) -> int:
+        """
+        Loads the checkpoint file and restores the run's state from it. The caller's errors and emitter must be set up
+        the same way as the run that saved it.
+
+        Args:
+            errors: the run's error pipeline
+            emitter: the run's emitter
+
+        Returns:
+            position: the number of path positions to skip
+
+        Raises:
+            ValueError if the checkpoint was saved by a run with different settings, errors, or emitter
+        """
+        checkpoint = load_checkpoint(self.filename)
+        if checkpoint["settings"] != json.loads(json.dumps(self.settings)):
+            raise ValueError(f"{self.filename} was saved by a run with different settings: {checkpoint['settings']}")
+        error_types = [state["type"] for state in checkpoint["errors"]]
+        if error_types != [type(err).__name__ for err in errors]:
+            raise ValueError(f"{self.filename} was saved by a run with the error pipeline {error_types}")
+        if checkpoint["emitter"]["type"] != type(emitter).__name__:
+            raise ValueError(f"{self.filename} was saved by a run with a {checkpoint['emitter']['type']}")
+
+        for err, state in zip(errors, checkpoint["errors"]):
+            err.set_state(state["state"])
+        emitter.restore(checkpoint["emitter"]["state"])
+        self.position = checkpoint["position"]
+        return self.position
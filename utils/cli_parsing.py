@@ -4,11 +4,103 @@ Declares and maintains handlers for command line parsing
 import argparse
 from typing import Sequence
 
-from utils.emitters import StdOutVectorEmitter, CsvVectorEmitter, TsvVectorEmitter, EndpointVectorEmitter
-from utils.error_pipeline import Noise, FalseBottom, Dropout
+from utils.compression import CODEC_CHOICES
+from utils.emitters import StdOutVectorEmitter, CsvVectorEmitter, TsvVectorEmitter, EndpointVectorEmitter, \
+    BinaryVectorEmitter, FileVectorEmitter, LasVectorEmitter, NmeaUdpVectorEmitter, \
+    SharedMemoryVectorEmitter, VectorEmitter
+from utils.error_pipeline import ErrorType, Noise, FalseBottom, Dropout
+from utils.profiling import PROFILE_MODES
+from utils.scheduling import LATE_POLICIES
 from utils.sampling_procedures import PATH_GENERATORS
 
 
+def parse_error(spec: str) -> ErrorType | None:
+    """
+    Parses an error description like noise@0.05, fb@10, or drop@0.01
+
+    Args:
+        spec: the error description
+
+    Returns:
+        error: the error, or None if the type is unknown
+    """
+    err_type, err_val = spec.split("@")
+    match err_type:
+        case "noise":
+            return Noise(float(err_val))
+        case "fb":
+            return FalseBottom(float(err_val))
+        case "drop":
+            return Dropout(float(err_val))
+        case _:
+            return None
+
+
+def parse_emitter(spec: str) -> VectorEmitter:
+    """
+    Parses an emitter description like csv@out.csv or nmea@localhost:10110
+
+    Args:
+        spec: the emitter description
+
+    Returns:
+        emitter: the emitter, or a stdout emitter if the type is unknown
+
+    Raises:
+        ValueError if a file emitter's compression cannot be used or its directory is not writable, or the nmea
+            emitter's address cannot be resolved or connected to
+    """
+    emitter, _, location = spec.partition("@")
+    match emitter:
+        case "csv":
+            return CsvVectorEmitter(location)
+        case "tsv":
+            return TsvVectorEmitter(location)
+        case "bin":
+            return BinaryVectorEmitter(location)
+        case "las":
+            return LasVectorEmitter(location)
+        case "nmea":
+            # The socket is opened here, so an unknown host is found before the mesh is loaded
+            try:
+                return NmeaUdpVectorEmitter(location)
+            except OSError as e:
+                raise ValueError(f"Could not open the nmea emitter to {location}: {e}") from e
+        case "shm":
+            return SharedMemoryVectorEmitter(location)
+        case "endpoint":
+            return EndpointVectorEmitter(location)
+        case _:
+            return StdOutVectorEmitter()
+
+
+def configure_emitter(emitter: VectorEmitter, compression: str = None, sample_rate: float = None,
+                      origin: tuple[float, float] = None) -> None:
+    """
+    Applies options that only some emitters take
+
+    Args:
+        emitter: the emitter to configure
+        compression: [Optional] a codec for file emitters, or "none" to turn off compression
+        sample_rate: [Optional] the sample rate in Hertz, used by the nmea emitter's timestamps
+        origin: [Optional] the latitude and longitude of the mesh origin, used by the nmea emitter
+
+    Raises:
+        ValueError if the compression cannot be used
+
+    Returns:
+        None
+    """
+    if compression is not None and isinstance(emitter, FileVectorEmitter):
+        emitter.compression = None if compression == "none" else compression
+        emitter.check_output()
+    if isinstance(emitter, NmeaUdpVectorEmitter):
+        if sample_rate is not None:
+            emitter.sample_rate = sample_rate
+        if origin is not None:
+            emitter.set_origin(*origin)
+
+
 class ParseErrorPipeline(argparse.Action):
     """
     Action which parses arguments related to the error pipeline
@@ -22,16 +114,9 @@ class ParseErrorPipeline(argparse.Action):
         """
         items = getattr(namespace, self.dest, None)
         for val in values:
-            err_type, err_val = val.split("@")
-            match err_type:
-                case "noise":
-                    items.append(Noise(float(err_val)))
-                case "fb":
-                    items.append(FalseBottom(float(err_val)))
-                case "drop":
-                    items.append(Dropout(float(err_val)))
-                case _:
-                    pass
+            err = parse_error(val)
+            if err is not None:
+                items.append(err)
 
         setattr(namespace, self.dest, items)
 
@@ -47,18 +132,81 @@ class ParseVectorEmitter(argparse.Action):
         Returns:
             None
         """
-        emitter, location = values.split("@")
-        match emitter:
-            case "csv":
-                item = CsvVectorEmitter(location)
-            case "tsv":
-                item = TsvVectorEmitter(location)
-            case "endpoint":
-                item = EndpointVectorEmitter(location)
-            case _:
-                item = StdOutVectorEmitter()
+        try:
+            setattr(namespace, self.dest, parse_emitter(values))
+        except ValueError as e:
+            parser.error(str(e))
+
+
+def checkpoint_settings(namespace: argparse.Namespace) -> dict:
+    """
+    Collects the arguments that change a run's output, so a checkpoint is only resumed by a run with the same ones
 
-        setattr(namespace, self.dest, item)
+    Args:
+        namespace: the parsed arguments
+
+    Returns:
+        settings: the settings to save with the checkpoint, see Checkpointer
+    """
+    return {"data_file": namespace.data_file, "path_type": namespace.path_type, "sample_rate": namespace.sample_rate,
+            "velocity": namespace.velocity, "line_spacing": namespace.line_spacing, "heading": namespace.heading,
+            "beam_width": namespace.beam_width, "sub_rays": namespace.sub_rays, "depth_cache": namespace.depth_cache,
+            "depth_cache_entries": namespace.depth_cache_entries, "coherent_lookup": namespace.coherent_lookup,
+            "merge_vertices": namespace.merge_vertices,
+            "errors": [{"type": type(err).__name__, **err.get_settings()} for err in namespace.errors]}
+
+
+def check_sounder_args(parser: argparse.ArgumentParser, namespace: argparse.Namespace) -> None:
+    """
+    Checks the multibeam and beam footprint arguments, exiting with a usage error if they are invalid or are combined
+    with runs that do not support them
+
+    Args:
+        parser: the parser the arguments came from
+        namespace: the parsed arguments
+
+    Returns:
+        None
+    """
+    if namespace.beams is not None:
+        if namespace.beams < 1:
+            parser.error("--beams must be at least 1")
+        if not 0 <= namespace.swath_angle < 180:
+            parser.error("--swath_angle must be at least 0 and less than 180 degrees")
+        if namespace.path_type == "drawn" or namespace.fleet is not None or namespace.replay or \
+                namespace.checkpoint is not None or namespace.record_truth is not None:
+            parser.error("--beams only supports single vessel parallel track and planned runs, without --checkpoint "
+                         "or --record_truth")
+    if namespace.beam_width is not None:
+        if not 0 <= namespace.beam_width < 180 or namespace.sub_rays < 1:
+            parser.error("--beam_width must be at least 0 and less than 180 degrees, with at least 1 --sub_rays")
+        if namespace.beams is not None or namespace.fleet is not None or namespace.replay or \
+                namespace.record_truth is not None:
+            parser.error("--beam_width only supports single beam, single vessel runs, without --record_truth")
+
+
+def check_lookup_args(parser: argparse.ArgumentParser, namespace: argparse.Namespace) -> None:
+    """
+    Checks the coherent lookup and depth cache arguments, exiting with a usage error if they are invalid or are
+    combined with runs that do not support them
+
+    Args:
+        parser: the parser the arguments came from
+        namespace: the parsed arguments
+
+    Returns:
+        None
+    """
+    single_beam = namespace.beams is None and namespace.beam_width is None
+    single_run = namespace.fleet is None and not namespace.replay and namespace.record_truth is None
+    if namespace.coherent_lookup and not (single_beam and single_run):
+        parser.error("--coherent_lookup only supports vertical single beam, single vessel runs, without "
+                     "--record_truth")
+    if namespace.depth_cache is not None:
+        if namespace.depth_cache <= 0 or namespace.depth_cache_entries < 1:
+            parser.error("--depth_cache must be positive, with at least 1 --depth_cache_entries")
+        if namespace.beams is not None or not single_run:
+            parser.error("--depth_cache only supports single beam, single vessel runs, without --record_truth")
 
 
 def parse_args(args: Sequence[str]) -> argparse.Namespace:
@@ -72,17 +220,31 @@ def parse_args(args: Sequence[str]) -> argparse.Namespace:
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("data_file",
-                        help="An 3D data file to represent the surface to sample")
+                        help="An 3D data file to represent the surface to sample, or synthetic:<faces>[:<terrain>[:<seed>]] "
+                             "to generate one, e.g. synthetic:100k:perlin")
     parser.add_argument("-p",
                         "--path_type",
-                        help="The type of search pattern to use over the mesh",
+                        help="The type of search pattern to use over the mesh. planned lays survey lines at "
+                             "--line_spacing and --heading, clipped to the mesh's footprint.",
                         default="parallel",
                         choices=PATH_GENERATORS.keys())
+    parser.add_argument("--line_spacing",
+                        type=float,
+                        default=None,
+                        help="The distance in meters between the lines of a planned path. Defaults to the distance "
+                             "travelled between samples.")
+    parser.add_argument("--heading",
+                        type=float,
+                        default=0.0,
+                        help="The heading of the lines of a planned path, in degrees clockwise from the y axis. "
+                             "Defaults to 0.")
     parser.add_argument("-em",
                         "--emitter_type",
                         action=ParseVectorEmitter,
                         help="Where you want to emit the result vectors, if not to stdout.\n"
-                             "Your choices are: csv@<filename>, tsv@<filename>, endpoint@<url>",
+                             "Your choices are: csv@<filename>, tsv@<filename>, bin@<filename>, las@<filename>, "
+                             "nmea@<host:port>, shm@<name>, endpoint@<url>. "
+                             "File names ending in .gz, .zst, or .lz4 are compressed.",
                         default=StdOutVectorEmitter())
     parser.add_argument("-sr",
                         "--sample_rate",
@@ -109,4 +271,141 @@ def parse_args(args: Sequence[str]) -> argparse.Namespace:
                         action="store_true",
                         help="Flag to disable the waiting part off the simulation. If given, the sampling rate "
                              "will remain the same, but the wait time between samples will be disabled.")
-    return parser.parse_args(args)
+    parser.add_argument("--fleet",
+                        default=None,
+                        metavar="CONFIG",
+                        help="Simulate a fleet of vessels sharing the mesh, described by a .json or .toml file. Each "
+                             "vessel has its own path bounds, speed, sample rate, error pipeline, and emitter.")
+    parser.add_argument("--time_scale",
+                        type=float,
+                        default=1.0,
+                        help="How much faster than real time to run, e.g. 10 samples ten times faster than the sample "
+                             "rate. Defaults to 1.")
+    parser.add_argument("--late_policy",
+                        choices=LATE_POLICIES,
+                        default="catch_up",
+                        help="What to do with samples that are more than one period late. catch_up takes them back to "
+                             "back until the run is back on schedule, skip drops them. Defaults to catch_up.")
+    parser.add_argument("-c",
+                        "--compression",
+                        choices=CODEC_CHOICES,
+                        default=None,
+                        help="Compress the output of a csv, tsv, or bin emitter, overriding the codec implied by the "
+                             "file extension. zstd and lz4 need the zstandard and lz4 packages.")
+    parser.add_argument("--origin",
+                        nargs=2,
+                        type=float,
+                        metavar=("LAT", "LON"),
+                        default=None,
+                        help="The latitude and longitude, in degrees, of the mesh origin. Used by the nmea emitter "
+                             "to report positions. Defaults to 0 0.")
+    parser.add_argument("--metrics",
+                        nargs="?",
+                        const="",
+                        default=None,
+                        metavar="JSON_FILE",
+                        help="Record call counts and latency percentiles of the timed functions and print a summary "
+                             "at the end of the run. If a file is given the summary is also written to it as json.")
+    parser.add_argument("--report",
+                        nargs="?",
+                        const="",
+                        default=None,
+                        metavar="JSON_FILE",
+                        help="Print a performance report at the end of the run: samples, throughput, stage latency "
+                             "percentiles, missed real-time deadlines, and peak memory. If a file is given the report "
+                             "is also written to it as json.")
+    parser.add_argument("--profile",
+                        choices=PROFILE_MODES,
+                        default=None,
+                        help="Profile the run. cprofile traces every call and writes pstats, sample periodically "
+                             "captures stacks with little overhead. Both write collapsed stacks for flamegraph tools "
+                             "and a summary of the time spent in each phase of the simulation.")
+    parser.add_argument("--profile_output",
+                        default="profile",
+                        metavar="PREFIX",
+                        help="The path prefix of the profile output files. Defaults to 'profile'.")
+    parser.add_argument("--checkpoint",
+                        default=None,
+                        metavar="FILE",
+                        help="Periodically save the run's progress to this file, so it can be resumed with --resume. "
+                             "Drawn paths and fleets cannot be checkpointed.")
+    parser.add_argument("--checkpoint_every",
+                        type=int,
+                        default=1000,
+                        metavar="N",
+                        help="The number of path positions between checkpoints. Defaults to 1000.")
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="Carry on from the --checkpoint file instead of starting over. The output from the "
+                             "checkpoint onwards is the same as a run that never stopped.")
+    parser.add_argument("--record_truth",
+                        default=None,
+                        metavar="FILE",
+                        help="Sample the path as fast as possible and record the clean [x y z] "
+                             "soundings to this file, for --replay. Nothing is emitted.")
+    parser.add_argument("--replay",
+                        action="store_true",
+                        help="Treat data_file as a --record_truth recording and replay the error pipeline over it into "
+                             "the emitter, without loading a mesh or pacing the samples.")
+    parser.add_argument("--beams",
+                        type=int,
+                        default=None,
+                        metavar="N",
+                        help="Simulate a multibeam sounder that fires N beams per ping across --swath_angle and emits "
+                             "a sounding for every beam that hits the mesh. Defaults to a single vertical beam.")
+    parser.add_argument("--swath_angle",
+                        type=float,
+                        default=120.0,
+                        metavar="DEG",
+                        help="The angle in degrees between the outermost beams of a multibeam ping. Defaults to 120.")
+    parser.add_argument("--beam_width",
+                        type=float,
+                        default=None,
+                        metavar="DEG",
+                        help="Give the single beam a cone this many degrees wide and report the shallowest return "
+                             "inside its footprint. Defaults to a vertical line.")
+    parser.add_argument("--sub_rays",
+                        type=int,
+                        default=16,
+                        metavar="N",
+                        help="The number of rays spread over the footprint of a --beam_width beam. Defaults to 16.")
+    parser.add_argument("--coherent_lookup",
+                        action="store_true",
+                        help="Try the face of the last sample and its neighbours before searching for the face under "
+                             "each sample. Gives the same depths, up to rounding, faster on meshes that are a single "
+                             "sheet.")
+    parser.add_argument("--depth_cache",
+                        type=float,
+                        default=None,
+                        metavar="TOL",
+                        help="Cache depths on a grid TOL meters apart, looking each one up at the grid point nearest "
+                             "the sample, so repeated positions are only looked up once.")
+    parser.add_argument("--depth_cache_entries",
+                        type=int,
+                        default=1000000,
+                        metavar="N",
+                        help="The most depths the --depth_cache keeps, dropping the least recently used. Defaults to "
+                             "1000000.")
+    parser.add_argument("--merge_vertices",
+                        action="store_true",
+                        help="Merge vertices with identical positions before indexing the mesh, so the faces of a "
+                             "triangle soup, like an stl file, share their vertices.")
+    namespace = parser.parse_args(args)
+
+    if namespace.resume and namespace.checkpoint is None:
+        parser.error("--resume needs the --checkpoint file to resume from")
+    if namespace.checkpoint is not None and (namespace.path_type == "drawn" or namespace.fleet is not None):
+        parser.error("--checkpoint only supports single vessel parallel track and planned runs")
+    if namespace.record_truth is not None and \
+            (namespace.path_type == "drawn" or namespace.replay or namespace.checkpoint is not None):
+        parser.error("--record_truth only supports parallel track and planned runs, without --checkpoint")
+    check_sounder_args(parser, namespace)
+    check_lookup_args(parser, namespace)
+
+    # The emitter is built before every argument is parsed, so apply emitter options afterwards
+    try:
+        configure_emitter(namespace.emitter_type, namespace.compression, namespace.sample_rate, namespace.origin)
+    except ValueError as e:
+        parser.error(str(e))
+
+    return namespace
@@ -0,0 +1,219 @@
+"""
+Declares and maintains spatially coherent depth lookups. Consecutive samples along a path almost always fall in the same
+face as the last one, or one next to it, so those are tried before the search bins are scanned.
+"""
+import math
+
+import numpy as np
+
+from utils.geometry import point_in_tri
+from utils.mesh import CustomTriMesh
+
+
+def _plane_z_(x: float, y: float, v1: list[float], v2: list[float], v3: list[float]) -> float:
+    """
+    Calculates the z value of [x y] on the plane through three vertices, as triangular_plane_intercept() does, but with
+    plain floats, which is much faster for one face at a time
+
+    Args:
+        x: the x point to be projected onto the plane
+        y: the y point to be projected onto the plane
+        v1: [x y z] vertex
+        v2: [x y z] vertex
+        v3: [x y z] vertex
+
+    Returns:
+        z: the z position of the projected point, or nan if the face is vertical or degenerate
+    """
+    ax, ay, az = v1[0] - v2[0], v1[1] - v2[1], v1[2] - v2[2]
+    bx, by, bz = v1[0] - v3[0], v1[1] - v3[1], v1[2] - v3[2]
+    cx, cy, cz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+    if cz == 0:
+        return math.nan
+    intercept = cx * v1[0] + cy * v1[1] + cz * v1[2]
+    return (intercept - (cx * x + cy * y)) / cz
+
+
+def _connected_(count: int, pairs: np.ndarray) -> bool:
+    """
+    Checks whether a graph is connected, by hooking every node to its lowest labelled neighbour and following labels
+    until each node points at the root of its component
+
+    Args:
+        count: the number of nodes
+        pairs: an (E, 2) array of the nodes at either end of each edge
+
+    Returns:
+        connected: whether every node can be reached from every other
+    """
+    if count <= 1:
+        return True
+    labels = np.arange(count)
+    while True:
+        a, b = labels[pairs[:, 0]], labels[pairs[:, 1]]
+        differ = a != b
+        if not differ.any():
+            break
+        np.minimum.at(labels, np.maximum(a, b)[differ], np.minimum(a, b)[differ])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return bool(np.all(labels == 0))
+
+
+class CoherentLookup:
+    def __init__(self, mesh: CustomTriMesh):
+        """
+        Looks up depths like CustomTriMesh.get_shallowest_depth(), trying the face of the last lookup first, then the
+        faces that share a vertex with it, before scanning the search bin. The faces of the last bin scanned are kept,
+        so scanning the same bin again skips gathering them.
+
+        A face can only be trusted to be the shallowest at a point when no other face lies above or below it, so the
+        faces are only tried first on meshes that are a single connected sheet with every face facing the same way.
+        Other meshes always scan the bin, which gives the same depths as the mesh.
+
+        Args:
+            mesh: the indexed mesh
+        """
+        self.mesh = mesh
+        faces = np.asarray(mesh.faces)
+        self.triangles = np.asarray(mesh.vertices)[faces]
+
+        t = self.triangles
+        areas = (t[:, 1, 0] - t[:, 0, 0]) * (t[:, 2, 1] - t[:, 0, 1]) - \
+            (t[:, 2, 0] - t[:, 0, 0]) * (t[:, 1, 1] - t[:, 0, 1])
+        self.single_layer = len(faces) > 0 and (bool(np.all(areas > 0)) or bool(np.all(areas < 0))) and \
+            _connected_(len(faces), mesh.mesh.face_adjacency)
+
+        # The faces around each vertex, to find the neighbours of a face
+        order = np.argsort(faces.ravel(), kind="stable")
+        self._vertex_faces = order // 3
+        self._vertex_starts = np.concatenate(([0], np.cumsum(np.bincount(faces.ravel(), minlength=len(mesh.vertices)))))
+        self._neighbours = {}
+
+        self.last_face = None
+        self.last_bin = None
+        self._bin_faces = []
+
+        self.face_hits = 0
+        self.neighbour_hits = 0
+        self.bin_hits = 0
+        self.searches = 0
+
+    def neighbours(self, face: int) -> list[int]:
+        """
+        Finds the faces that share a vertex with a face
+
+        Args:
+            face: the index of the face
+
+        Returns:
+            faces: the indices of its neighbours
+        """
+        if face not in self._neighbours:
+            near = np.concatenate([self._vertex_faces[self._vertex_starts[v]:self._vertex_starts[v + 1]]
+                                   for v in self.mesh.faces[face]])
+            near = np.unique(near)
+            self._neighbours[face] = near[near != face].tolist()
+        return self._neighbours[face]
+
+    def _try_face_(self, face: int, x: float, y: float) -> float | None:
+        """
+        Finds the depth of a face at a point
+
+        Args:
+            face: the index of the face
+            x: a real x position
+            y: a real y position
+
+        Returns:
+            z: the z position of the face at [x y], or None if the point is outside it
+        """
+        v1, v2, v3 = self.triangles[face].tolist()
+        if point_in_tri((x, y), v1, v2, v3):
+            return _plane_z_(x, y, v1, v2, v3)
+        return None
+
+    def _search_bin_(self, x: float, y: float) -> float | None:
+        """
+        Finds the shallowest depth at a point by scanning every face of its search bin
+
+        Args:
+            x: a real x position
+            y: a real y position
+
+        Returns:
+            z: the shallowest z position, or None if the point is outside the mesh
+        """
+        bin_indices = self.mesh._get_bin_indices_(x, y)
+        if bin_indices == self.last_bin:
+            self.bin_hits += 1
+        else:
+            self.searches += 1
+            x_idx, y_idx = bin_indices
+            faces = None
+            if 0 <= x_idx < self.mesh.search_field.shape[0] and 0 <= y_idx < self.mesh.search_field.shape[1]:
+                faces = self.mesh.search_field[x_idx][y_idx]
+            self.last_bin = bin_indices
+            self._bin_faces = [(f, *self.triangles[f].tolist()) for f in faces] if faces is not None else []
+
+        max_z = None
+        for face, v1, v2, v3 in self._bin_faces:
+            if point_in_tri((x, y), v1, v2, v3):
+                z = _plane_z_(x, y, v1, v2, v3)
+                if math.isnan(z):
+                    continue
+                if max_z is None or z > max_z:
+                    max_z = z
+                    self.last_face = face
+        return max_z
+
+    def get_shallowest_depth(self, x: float, y: float) -> float | None:
+        """
+        Provide an x and y position and get the shallowest depth, as from CustomTriMesh.get_shallowest_depth()
+
+        Args:
+            x: a real x position
+            y: a real y position
+
+        Returns:
+            z: a real number that is the maximum (shallowest) z position, or None if the specified point is outside the mesh
+        """
+        if self.single_layer and self.last_face is not None:
+            z = self._try_face_(self.last_face, x, y)
+            if z is not None:
+                self.face_hits += 1
+                return z
+            for face in self.neighbours(self.last_face):
+                z = self._try_face_(face, x, y)
+                if z is not None:
+                    self.neighbour_hits += 1
+                    self.last_face = face
+                    return z
+        return self._search_bin_(x, y)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups answered by the last face or its neighbours, without scanning a bin
+        """
+        lookups = self.face_hits + self.neighbour_hits + self.bin_hits + self.searches
+        return (self.face_hits + self.neighbour_hits) / lookups if lookups > 0 else 0.0
+
+    def stats(self) -> dict:
+        """
+        Summarises how the lookups were answered
+
+        Returns:
+            stats: the number of lookups answered by the last face, by one of its neighbours, by scanning the last bin
+                again, and by scanning a new bin, and the hit rate
+        """
+        return {
+            "face_hits": self.face_hits,
+            "neighbour_hits": self.neighbour_hits,
+            "bin_hits": self.bin_hits,
+            "searches": self.searches,
+            "hit_rate": self.hit_rate,
+        }
@@ -0,0 +1,191 @@
+"""
+Declares and maintains streaming compression writers used by the file emitters
+"""
+import gzip
+import os
+import queue
+import threading
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - optional dependency
+    lz4_frame = None
+
+
+CODEC_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".lz4": "lz4",
+}
+
+CODEC_CHOICES = ["gzip", "zstd", "lz4", "none"]
+
+
+def available_codecs() -> list[str]:
+    """
+    Lists the compression codecs that can be used in the current environment. gzip is always available, zstd and lz4
+    depend on the optional zstandard and lz4 packages.
+
+    Returns:
+        codecs: the names of the usable codecs
+    """
+    codecs = ["gzip"]
+    if zstandard is not None:
+        codecs.append("zstd")
+    if lz4_frame is not None:
+        codecs.append("lz4")
+    return codecs
+
+
+def codec_from_filename(filename: str) -> str | None:
+    """
+    Infers a compression codec from the extension of a file name
+
+    Args:
+        filename: The path to the file
+
+    Returns:
+        codec: the name of the codec, or None if the extension does not imply compression
+    """
+    return CODEC_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def check_codec(codec: str) -> None:
+    """
+    Checks that a compression codec can be used in the current environment
+
+    Args:
+        codec: One of gzip, zstd, or lz4
+
+    Raises:
+        ValueError if the codec is unknown or its package is not installed
+
+    Returns:
+        None
+    """
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    if codec == "lz4" and lz4_frame is None:
+        raise ValueError("lz4 compression requires the lz4 package")
+    if codec not in ("gzip", "zstd", "lz4"):
+        raise ValueError(f"Unknown compression codec '{codec}'. Choose from {available_codecs()}")
+
+
+def open_compressed(filename: str, codec: str, level: int = None) -> BinaryIO:
+    """
+    Opens a binary, append mode, compressed stream. Appending to an existing file starts a new gzip member, zstd frame,
+    or lz4 frame, all of which the standard decompressors read back as one continuous stream.
+
+    Args:
+        filename: The path to the file to write to
+        codec: One of gzip, zstd, or lz4
+        level: [Optional] the compression level, defaults to the codec's own default
+
+    Raises:
+        ValueError if the codec is unknown or its package is not installed
+
+    Returns:
+        stream: a writable binary stream
+    """
+    check_codec(codec)
+    match codec:
+        case "gzip":
+            # A fixed header time keeps the output reproducible, so a resumed run writes the same bytes
+            return gzip.GzipFile(filename, "ab", compresslevel=6 if level is None else level, mtime=0)
+        case "zstd":
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            return compressor.stream_writer(open(filename, "ab"), closefd=True)
+        case _:
+            return lz4_frame.open(filename, "ab", compression_level=0 if level is None else level)
+
+
+class CompressedStreamWriter:
+    def __init__(self, filename: str, codec: str, level: int = None, max_queued_chunks: int = 64):
+        """
+        Writes chunks of bytes to a compressed file from a worker thread, so that the compression cost is kept out of
+        the sampling loop.
+
+        Args:
+            filename: The path to the file to write to
+            codec: One of gzip, zstd, or lz4
+            level: [Optional] the compression level, defaults to the codec's own default
+            max_queued_chunks: The number of chunks that can wait for the worker before write() blocks
+        """
+        self.filename = filename
+        self.codec = codec
+        self.bytes_in = 0
+
+        # Open in the calling thread so a bad codec or path fails immediately
+        self._stream = open_compressed(filename, codec, level)
+        self._queue = queue.Queue(maxsize=max_queued_chunks)
+        self._error = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run_, name=f"compress-{codec}", daemon=True)
+        self._thread.start()
+
+    def _run_(self) -> None:
+        """
+        Worker loop that compresses queued chunks until it receives the None sentinel
+
+        Returns:
+            None
+        """
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self._error is None:
+                    self._stream.write(chunk)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_worker_error_(self) -> None:
+        """
+        Re-raises, in the calling thread, an exception raised by the worker
+
+        Returns:
+            None
+        """
+        if self._error is not None:
+            raise IOError(f"Failed to write compressed data to {self.filename}") from self._error
+
+    def write(self, data: bytes) -> None:
+        """
+        Queues a chunk of bytes for compression
+
+        Args:
+            data: The bytes to write
+
+        Returns:
+            None
+        """
+        self._raise_worker_error_()
+        self.bytes_in += len(data)
+        self._queue.put(data)
+
+    def close(self) -> None:
+        """
+        Waits for all queued chunks to be compressed and closes the file
+
+        Returns:
+            None
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._stream.close()
+        self._raise_worker_error_()
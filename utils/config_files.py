@@ -0,0 +1,50 @@
+"""
+Declares and maintains reading of the json, toml, and yaml configuration files used by fleet and batch runs
+"""
+import json
+import os
+
+try:
+    import tomllib
+except ImportError:  # pragma: no cover - Python 3.10
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - optional dependency
+    yaml = None
+
+
+def load_config(path: str) -> dict:
+    """
+    Reads a configuration file, choosing the format by extension
+
+    Args:
+        path: a .json, .toml, .yaml, or .yml file
+
+    Returns:
+        config: the parsed configuration
+
+    Raises:
+        ValueError if the file type is not supported, ImportError if the format needs a package that is not installed
+    """
+    extension = os.path.splitext(path)[1].lower()
+    match extension:
+        case ".json":
+            with open(path) as f:
+                return json.load(f)
+        case ".toml":
+            if tomllib is None:
+                raise ImportError("Reading toml configurations on Python 3.10 needs the tomli package")
+            with open(path, "rb") as f:
+                return tomllib.load(f)
+        case ".yaml" | ".yml":
+            if yaml is None:
+                raise ImportError("Reading yaml configurations needs the pyyaml package")
+            with open(path) as f:
+                return yaml.safe_load(f)
+        case _:
+            raise ValueError(f"Configurations must be .json, .toml, or .yaml files, got '{path}'")
@@ -0,0 +1,107 @@
+"""
+Declares and maintains the depth cache, which remembers the depths of positions that have already been looked up.
+Ensemble runs, redrawn paths, and repeated parallel track runs look up the same positions over and over.
+"""
+import sys
+from collections import OrderedDict
+
+# The approximate memory of one cached entry: its key tuple, the two ints in it, and the depth
+ENTRY_BYTES = sys.getsizeof((0, 0)) + 2 * sys.getsizeof(2 ** 40) + sys.getsizeof(0.0)
+
+
+class DepthCache:
+    def __init__(self, source, tolerance: float, max_entries: int = 1_000_000):
+        """
+        A bounded least recently used cache of depths, keyed on positions rounded to a grid tolerance meters apart.
+        Every depth is looked up at the grid point its position rounds to, so a cached run gives the same depths
+        whichever positions filled the cache, and one cache can be shared by every run in a process that samples the
+        same mesh. It has the same get_shallowest_depth() as CustomTriMesh, so it can be sampled in place of the mesh.
+
+        Args:
+            source: the CustomTriMesh, or a sounder with its get_shallowest_depth(), to look up depths that are not
+                cached
+            tolerance: the spacing of the grid in meters, so positions are moved by at most tolerance / 2 along each
+                axis
+            max_entries: the most depths kept. The least recently used depth is dropped to make room for a new one.
+        """
+        if tolerance <= 0:
+            raise ValueError("The depth cache tolerance must be positive")
+        if max_entries < 1:
+            raise ValueError("The depth cache must hold at least one entry")
+        self.source = source
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_shallowest_depth(self, x: float, y: float) -> float | None:
+        """
+        Provide an x and y position and get the shallowest depth at the grid point nearest to it
+
+        Args:
+            x: a real x position
+            y: a real y position
+
+        Returns:
+            z: the maximum (shallowest) z position at the grid point, or None if the grid point is outside the mesh
+        """
+        key = (round(x / self.tolerance), round(y / self.tolerance))
+        try:
+            z = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            z = self.source.get_shallowest_depth(key[0] * self.tolerance, key[1] * self.tolerance)
+            self._entries[key] = z
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return z
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return z
+
+    def clear(self) -> None:
+        """
+        Drops every cached depth and resets the counters
+
+        Returns:
+            None
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        The approximate memory held by the cache
+        """
+        return sys.getsizeof(self._entries) + len(self._entries) * ENTRY_BYTES
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups answered from the cache
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def stats(self) -> dict:
+        """
+        Summarises the cache
+
+        Returns:
+            stats: the number of hits, misses, and evictions, the number of entries, their approximate memory, and the
+                hit rate
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "memory_bytes": self.memory_bytes,
+            "hit_rate": self.hit_rate,
+        }
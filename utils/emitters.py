@@ -3,12 +3,62 @@ Defines how data can be emitted from the program.
 """
 import abc
 import json
+import math
+import os
+import socket
+import struct
+import time
 
+import numpy as np
 import requests
 
+from utils.compression import CompressedStreamWriter, check_codec, codec_from_filename
+from utils.shared_ring import SharedMemoryRing
 from utils.timing import timed
 
 
+def _check_directory_(filename: str) -> None:
+    """
+    Checks that a file can be created where it is named, so a bad path fails before a run starts rather than at its
+    first write
+
+    Args:
+        filename: the file to check
+
+    Raises:
+        ValueError if the file's directory does not exist or is not writable
+
+    Returns:
+        None
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory) or not os.access(directory, os.W_OK):
+        raise ValueError(f"Cannot write {filename}, {directory} is not a writable directory")
+
+
+def _sync_file_(filename: str, created: bool) -> None:
+    """
+    Forces a written file to disk, along with the directory entry that names it when the file is new, so a checkpoint
+    saved afterwards never describes output that a crash could still lose
+
+    Args:
+        filename: the file to sync
+        created: whether the file was created since it was last synced
+
+    Returns:
+        None
+    """
+    with open(filename, "ab") as f:
+        os.fsync(f.fileno())
+    # Directories can only be opened to sync on posix systems
+    if created and os.name == "posix":
+        directory = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
 class VectorEmitter:
     """
     The abstract base class of an emitter. Each emitter directs the data output to a different source.
@@ -26,6 +76,63 @@ class VectorEmitter:
         """
         raise NotImplementedError("You must override emit_vector()")
 
+    def set_position(self, position: int) -> None:
+        """
+        Tells the emitter which position of the path the vectors emitted next were sampled at. Skipped and off mesh
+        positions still count, so emitters that timestamp their output can keep to the sample clock.
+
+        Args:
+            position: the index of the position along the path
+
+        Returns:
+            None
+        """
+        pass
+
+    def emit_vectors(self, vectors) -> None:
+        """
+        Emits many vectors at once. Emitters that can write a batch faster than one vector at a time override this.
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            None
+        """
+        for vector in vectors.tolist():
+            self.emit_vector(vector)
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the emitter. Called once, after the last vector has been emitted.
+
+        Returns:
+            None
+        """
+        pass
+
+    def checkpoint(self) -> dict:
+        """
+        Makes everything emitted so far durable and describes how to carry on from it. Emitters that keep no state
+        between vectors have nothing to describe.
+
+        Returns:
+            state: a json serialisable description of the emitter's position
+        """
+        return {}
+
+    def restore(self, state: dict) -> None:
+        """
+        Discards anything emitted after a checkpoint, so a resumed run carries on from it
+
+        Args:
+            state: the result of checkpoint()
+
+        Returns:
+            None
+        """
+        pass
+
 
 class StdOutVectorEmitter(VectorEmitter):
     """
@@ -43,60 +150,631 @@ class StdOutVectorEmitter(VectorEmitter):
         print(vector)
 
 
-class CsvVectorEmitter(VectorEmitter):
+class FileVectorEmitter(VectorEmitter):
     """
-    Emitter that writes to a csv file.
+    The base class of emitters that write records to a file. Records are appended to the file as they are emitted or,
+    when a compression codec is configured, buffered into chunks and handed to a background compression thread.
     """
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, compression: str = None, chunk_records: int = 1024):
         """
-        Prepares to write a csv file
+        Prepares to write to a file
 
         Args:
-            filename: The path to the csv file to write to.
+            filename: The path to the file to write to.
+            compression: [Optional] One of gzip, zstd, or lz4. If not given it is inferred from the file extension,
+                so out.csv.gz is written with gzip.
+            chunk_records: The number of records to hand to the compression thread at a time
+
+        Raises:
+            ValueError if the codec cannot be used or the file's directory is not writable
         """
         super().__init__()
         self.filename = filename
+        self.compression = compression if compression is not None else codec_from_filename(filename)
+        self.chunk_records = chunk_records
+        self.check_output()
+
+        self._writer = None
+        self._chunk = []
+        self._chunk_len = 0
+        self._synced = False
+
+    def check_output(self) -> None:
+        """
+        Checks that the file can be written with the emitter's compression. The compression thread only opens the file
+        when the first chunk is full, so without this a missing codec or bad path would fail part way through a run.
+
+        Raises:
+            ValueError if the codec cannot be used or the file's directory is not writable
+
+        Returns:
+            None
+        """
+        if self.compression is not None:
+            check_codec(self.compression)
+        _check_directory_(self.filename)
+
+    @abc.abstractmethod
+    def _format_vector_(self, vector: list[float]) -> bytes:
+        """
+        Method to override to define the record written for a vector
+
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            record: the bytes to write to the file
+        """
+        raise NotImplementedError("You must override _format_vector_()")
+
+    def _format_vectors_(self, vectors) -> bytes:
+        """
+        Formats many vectors at once. Emitters with a faster batch format override this.
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            records: the bytes to write to the file
+        """
+        return b"".join(self._format_vector_(vector) for vector in vectors.tolist())
 
     def emit_vector(self, vector: list[float]) -> None:
         """
-        Writes the vector to a csv file
+        Writes the vector to the file
         Args:
             vector: a list of floats in the form [x, y, z]
 
         Returns:
             None
         """
-        out_str = f"{vector[0]},{vector[1]},{vector[2]}\n"
-        with open(self.filename, "a+") as f:
-            f.write(out_str)
+        self._write_(self._format_vector_(vector), 1)
+
+    def emit_vectors(self, vectors) -> None:
+        """
+        Writes many vectors to the file with a single write
 
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
 
-class TsvVectorEmitter(VectorEmitter):
+        Returns:
+            None
+        """
+        if len(vectors) > 0:
+            self._write_(self._format_vectors_(vectors), len(vectors))
+
+    def _write_(self, records: bytes, count: int) -> None:
+        """
+        Appends records to the file, or to the chunk handed to the compression thread
+
+        Args:
+            records: the formatted records
+            count: the number of records
+
+        Returns:
+            None
+        """
+        if self.compression is None:
+            with open(self.filename, "ab") as f:
+                f.write(records)
+        else:
+            self._chunk.append(records)
+            self._chunk_len += count
+            if self._chunk_len >= self.chunk_records:
+                self._flush_chunk_()
+
+    def _flush_chunk_(self) -> None:
+        """
+        Hands the buffered records to the compression thread
+
+        Returns:
+            None
+        """
+        if len(self._chunk) == 0:
+            return
+        if self._writer is None:
+            self._writer = CompressedStreamWriter(self.filename, self.compression)
+        self._writer.write(b"".join(self._chunk))
+        self._chunk = []
+        self._chunk_len = 0
+
+    def close(self) -> None:
+        """
+        Flushes any buffered records and waits for the compression thread to finish
+
+        Returns:
+            None
+        """
+        self._flush_chunk_()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def checkpoint(self) -> dict:
+        """
+        Writes any buffered records and, when compressing, ends the current compressed member so the file is complete
+        up to this point, then syncs it to disk. The next record starts a new member.
+
+        Returns:
+            state: the size of the file
+        """
+        self.close()
+        if not os.path.exists(self.filename):
+            return {"offset": 0}
+        _sync_file_(self.filename, created=not self._synced)
+        self._synced = True
+        return {"offset": os.path.getsize(self.filename)}
+
+    def restore(self, state: dict) -> None:
+        """
+        Truncates the file to its size at the checkpoint
+
+        Args:
+            state: the result of checkpoint()
+
+        Returns:
+            None
+        """
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        if size < state["offset"]:
+            raise ValueError(f"{self.filename} is shorter than its checkpoint, {size} < {state['offset']} bytes")
+        if os.path.exists(self.filename):
+            os.truncate(self.filename, state["offset"])
+        self._chunk = []
+        self._chunk_len = 0
+
+
+class CsvVectorEmitter(FileVectorEmitter):
+    """
+    Emitter that writes to a csv file.
+    """
+    def _format_vector_(self, vector: list[float]) -> bytes:
+        """
+        Formats the vector as a csv row
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            record: the csv row as bytes
+        """
+        return f"{vector[0]},{vector[1]},{vector[2]}\n".encode()
+
+
+class TsvVectorEmitter(FileVectorEmitter):
     """
     Emitter that writes to a tsv file.
     """
-    def __init__(self, filename: str):
+    def _format_vector_(self, vector: list[float]) -> bytes:
+        """
+        Formats the vector as a tsv row
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            record: the tsv row as bytes
+        """
+        return f"{vector[0]}\t{vector[1]}\t{vector[2]}\n".encode()
+
+
+class BinaryVectorEmitter(FileVectorEmitter):
+    """
+    Emitter that writes to a binary file of packed little-endian float64 [x y z] records, 24 bytes each.
+    """
+    record = struct.Struct("<3d")
+
+    def _format_vector_(self, vector: list[float]) -> bytes:
+        """
+        Packs the vector into a fixed size binary record
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            record: the packed record
         """
-        Prepares to write a tsv file
+        return self.record.pack(vector[0], vector[1], vector[2])
 
+    def _format_vectors_(self, vectors) -> bytes:
+        """
+        Packs many vectors at once
         Args:
-            filename: The path to the tsv file to write to.
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            records: the packed records
+        """
+        return np.ascontiguousarray(vectors, dtype="<f8").tobytes()
+
+
+class LasVectorEmitter(VectorEmitter):
+    """
+    Emitter that writes an ASPRS LAS 1.2 point cloud with point data record format 0. Coordinates are stored as int32
+    values that are scaled and offset from the real coordinates. The point count and bounds in the header are unknown
+    until the run ends, so a placeholder header is written first and patched by close().
+    """
+    header = struct.Struct("<4sHHLHH8sBB32s32sHHHLLBHL5L3d3d6d")
+    point = struct.Struct("<lllHBBbBH")
+    # Return number 1 of 1
+    return_flags = 0b00001001
+
+    def __init__(self, filename: str, scale: float = 0.001, offset: tuple[float, float, float] = None,
+                 chunk_records: int = 4096):
+        """
+        Prepares to write a las file
+
+        Args:
+            filename: The path to the las file to write to.
+            scale: The resolution of the stored coordinates, in meters. Defaults to millimeters.
+            offset: [Optional] the [x y z] offset of the stored coordinates. Defaults to the first emitted vector
+                rounded to the nearest meter, which keeps the scaled values well within int32 range.
+            chunk_records: The number of points packed in memory before they are written to the file
+
+        Raises:
+            ValueError if the file's directory is not writable
         """
         super().__init__()
+        _check_directory_(filename)
         self.filename = filename
+        self.scale = scale
+        self.offset = offset
+        self.chunk_records = chunk_records
+
+        self.num_points = 0
+        self.mins = [float("inf")] * 3
+        self.maxs = [float("-inf")] * 3
+
+        self._file = None
+        self._chunk = bytearray(self.point.size * chunk_records)
+        self._chunk_len = 0
+        self._synced = False
+
+    def _pack_header_(self) -> bytes:
+        """
+        Packs the public header block with the current point count and bounds
+
+        Returns:
+            header: the 227 byte header
+        """
+        mins = self.mins if self.num_points > 0 else [0.0] * 3
+        maxs = self.maxs if self.num_points > 0 else [0.0] * 3
+        offset = self.offset if self.offset is not None else (0.0, 0.0, 0.0)
+        return self.header.pack(
+            b"LASF", 0, 0, 0, 0, 0, bytes(8),
+            1, 2,
+            b"echo_sounding_simulator", b"echo_sounding_simulator",
+            0, 0,
+            self.header.size, self.header.size, 0,
+            0, self.point.size,
+            self.num_points, self.num_points, 0, 0, 0, 0,
+            self.scale, self.scale, self.scale,
+            offset[0], offset[1], offset[2],
+            maxs[0], mins[0], maxs[1], mins[1], maxs[2], mins[2],
+        )
+
+    def _open_(self, vector: list[float]) -> None:
+        """
+        Creates the file and writes the placeholder header
+
+        Args:
+            vector: the first vector to be written, used to pick the offset if one was not given
+
+        Returns:
+            None
+        """
+        if self.offset is None:
+            self.offset = (float(round(vector[0])), float(round(vector[1])), float(round(vector[2])))
+        self._file = open(self.filename, "wb")
+        self._file.write(self._pack_header_())
+
+    def _flush_chunk_(self) -> None:
+        """
+        Writes the packed points to the file
+
+        Returns:
+            None
+        """
+        if self._chunk_len > 0:
+            self._file.write(memoryview(self._chunk)[:self._chunk_len * self.point.size])
+            self._chunk_len = 0
+
+    def emit_vector(self, vector: list[float]) -> None:
+        """
+        Packs the vector as a las point
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            None
+        """
+        if self._file is None:
+            self._open_(vector)
+
+        x, y, z = float(vector[0]), float(vector[1]), float(vector[2])
+        self.point.pack_into(
+            self._chunk, self._chunk_len * self.point.size,
+            round((x - self.offset[0]) / self.scale),
+            round((y - self.offset[1]) / self.scale),
+            round((z - self.offset[2]) / self.scale),
+            0, self.return_flags, 0, 0, 0, 0
+        )
+        self._chunk_len += 1
+        self.num_points += 1
+
+        for i, c in enumerate((x, y, z)):
+            if c < self.mins[i]:
+                self.mins[i] = c
+            if c > self.maxs[i]:
+                self.maxs[i] = c
+
+        if self._chunk_len == self.chunk_records:
+            self._flush_chunk_()
+
+    def close(self) -> None:
+        """
+        Writes any packed points and patches the header with the final point count and bounds
+
+        Returns:
+            None
+        """
+        if self._file is None:
+            self._file = open(self.filename, "wb")
+        self._flush_chunk_()
+        self._file.seek(0)
+        self._file.write(self._pack_header_())
+        self._file.close()
+        self._file = None
+
+    def checkpoint(self) -> dict:
+        """
+        Writes any packed points and syncs them to disk. The header is only patched by close(), so the point count,
+        bounds, and offset it needs are saved instead.
+
+        Returns:
+            state: the point count, bounds, and coordinate offset
+        """
+        if self._file is None:
+            return {"num_points": 0}
+        self._flush_chunk_()
+        self._file.flush()
+        _sync_file_(self.filename, created=not self._synced)
+        self._synced = True
+        return {"num_points": self.num_points, "mins": self.mins, "maxs": self.maxs, "offset": list(self.offset)}
+
+    def restore(self, state: dict) -> None:
+        """
+        Truncates the file after the checkpoint's last point and reopens it to carry on appending
+
+        Args:
+            state: the result of checkpoint()
+
+        Returns:
+            None
+        """
+        if state["num_points"] == 0:
+            return
+        self.num_points = state["num_points"]
+        self.mins = list(state["mins"])
+        self.maxs = list(state["maxs"])
+        self.offset = tuple(state["offset"])
+
+        size = self.header.size + self.num_points * self.point.size
+        if os.path.getsize(self.filename) < size:
+            raise ValueError(f"{self.filename} is missing points written before its checkpoint")
+        self._file = open(self.filename, "r+b")
+        self._file.truncate(size)
+        self._file.seek(size)
+        self._chunk_len = 0
+
+
+class NmeaUdpVectorEmitter(VectorEmitter):
+    """
+    Emitter that sends each vector to a UDP host:port as NMEA 0183 sentences, the way an echo sounder and GNSS receiver
+    would feed hydrographic acquisition software. Each datagram holds a GGA position sentence and a DBT depth sentence.
+    The [x y] position is converted to latitude and longitude around an origin with an equirectangular approximation,
+    which is accurate to well under a meter over survey sized areas.
+    """
+    earth_radius = 6371008.8
+    feet_per_meter = 3.28084
+    fathoms_per_meter = 0.546807
+
+    def __init__(self, address: str, sample_rate: float = 1.0, origin: tuple[float, float] = (0.0, 0.0),
+                 talker: str = "SD", start_time: float = None):
+        """
+        Opens a UDP socket to the provided address in preparation for sending data.
+
+        Args:
+            address: the host:port to send datagrams to
+            sample_rate: The rate in hertz of the samples. Sentence timestamps are start_time + k / sample_rate for
+                a sample at the k-th position of the path, so they are free of scheduling jitter and skipped or off
+                mesh positions leave a gap. Without set_position(), k counts the vectors sent.
+            origin: The (latitude, longitude), in degrees, of the mesh origin
+            talker: the talker id of the depth sentence. Positions always use GP.
+            start_time: [Optional] the unix time of the first sample. Defaults to the time of the first emit.
+        """
+        super().__init__()
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.sample_rate = sample_rate
+        self.start_time = start_time
+        self.num_sent = 0
+        self.position = None
+
+        # Precompute everything that does not change between samples
+        self._dbt_format = f"{talker}DBT,{{:.1f}},f,{{:.2f}},M,{{:.1f}},F"
+        self._gga_format = "GPGGA,{:02d}{:02d}{:05.2f},{:02d}{:07.4f},{},{:03d}{:07.4f},{},1,08,1.0,0.0,M,0.0,M,,"
+        self.set_origin(*origin)
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.connect(self.address)
+
+    def set_origin(self, latitude: float, longitude: float) -> None:
+        """
+        Sets the geographic position of the mesh origin
+
+        Args:
+            latitude: the latitude of the origin in degrees
+            longitude: the longitude of the origin in degrees
+
+        Returns:
+            None
+        """
+        self.origin = (latitude, longitude)
+        self._deg_per_meter_lat = 180 / (math.pi * self.earth_radius)
+        self._deg_per_meter_lon = self._deg_per_meter_lat / math.cos(math.radians(latitude))
+
+    @staticmethod
+    def _checksum_(body: str) -> str:
+        """
+        Calculates the NMEA checksum, the XOR of every character between the $ and the *
+
+        Args:
+            body: the sentence without the leading $ and trailing checksum
+
+        Returns:
+            checksum: the two-digit hexadecimal checksum
+        """
+        checksum = 0
+        for b in body.encode("ascii"):
+            checksum ^= b
+        return f"{checksum:02X}"
+
+    @classmethod
+    def _sentence_(cls, body: str) -> str:
+        """
+        Wraps a sentence body with its delimiters and checksum
+
+        Args:
+            body: the sentence without the leading $ and trailing checksum
+
+        Returns:
+            sentence: the complete sentence, ending in CRLF
+        """
+        return f"${body}*{cls._checksum_(body)}\r\n"
+
+    def format_sentences(self, vector: list[float], timestamp: float) -> str:
+        """
+        Formats a vector as GGA and DBT sentences
+
+        Args:
+            vector: a list of floats in the form [x, y, z]
+            timestamp: the unix time of the sample
+
+        Returns:
+            sentences: the GGA and DBT sentences
+        """
+        lat = self.origin[0] + vector[1] * self._deg_per_meter_lat
+        lon = self.origin[1] + vector[0] * self._deg_per_meter_lon
+        # Work in ten thousandths of a minute so rounding never produces 60 minutes
+        lat_deg, lat_min = divmod(round(abs(lat) * 600000), 600000)
+        lon_deg, lon_min = divmod(round(abs(lon) * 600000), 600000)
+        # Work in hundredths of a second so rounding never produces 60 seconds
+        hours, rem = divmod(round(timestamp * 100) % 8640000, 360000)
+        minutes, hundredths = divmod(rem, 6000)
+
+        gga = self._gga_format.format(
+            hours, minutes, hundredths / 100,
+            lat_deg, lat_min / 10000, "N" if lat >= 0 else "S",
+            lon_deg, lon_min / 10000, "E" if lon >= 0 else "W"
+        )
+        depth = abs(vector[2])
+        dbt = self._dbt_format.format(depth * self.feet_per_meter, depth, depth * self.fathoms_per_meter)
+        return self._sentence_(gga) + self._sentence_(dbt)
+
+    def emit_vector(self, vector: list[float]) -> None:
+        """
+        Sends the vector as a datagram of NMEA sentences
+        Args:
+            vector: a list of floats in the form [x, y, z]
+
+        Returns:
+            None
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        position = self.position if self.position is not None else self.num_sent
+        timestamp = self.start_time + position / self.sample_rate
+        self.socket.send(self.format_sentences(vector, timestamp).encode("ascii"))
+        self.num_sent += 1
+
+    def set_position(self, position: int) -> None:
+        """
+        Sets the path position that timestamps the sentences sent next
+
+        Args:
+            position: the index of the position along the path
+
+        Returns:
+            None
+        """
+        self.position = position
+
+    def close(self) -> None:
+        """
+        Closes the socket
+
+        Returns:
+            None
+        """
+        self.socket.close()
+
+    def checkpoint(self) -> dict:
+        """
+        Describes the sentence clock, so the timestamps of a resumed run follow on from the checkpoint
+
+        Returns:
+            state: the start time, number of samples sent, and path position
+        """
+        return {"start_time": self.start_time, "num_sent": self.num_sent, "position": self.position}
+
+    def restore(self, state: dict) -> None:
+        """
+        Restores the sentence clock
+
+        Args:
+            state: the result of checkpoint()
+
+        Returns:
+            None
+        """
+        self.start_time = state["start_time"]
+        self.num_sent = state["num_sent"]
+        self.position = state.get("position")
+
+
+class SharedMemoryVectorEmitter(VectorEmitter):
+    """
+    Emitter that writes to a shared memory ring buffer, for visualisation and QA processes on the same machine. Readers
+    attach with utils.shared_ring.SharedMemoryRingReader using the same name.
+    """
+    def __init__(self, name: str, capacity: int = 65536):
+        """
+        Creates the shared memory ring
+
+        Args:
+            name: The name of the shared memory block that readers attach to
+            capacity: The number of vectors the ring holds before the oldest is overwritten
+        """
+        super().__init__()
+        self.ring = SharedMemoryRing(name, capacity)
 
     def emit_vector(self, vector: list[float]) -> None:
         """
-        Writes the vector to a tsv file
+        Writes the vector into the ring
         Args:
             vector: a list of floats in the form [x, y, z]
 
         Returns:
             None
         """
-        out_str = f"{vector[0]}\t{vector[1]}\t{vector[2]}\n"
-        with open(self.filename, "a+") as f:
-            f.write(out_str)
+        self.ring.write(vector[0], vector[1], vector[2])
+
+    def close(self) -> None:
+        """
+        Marks the ring as finished and removes it
+
+        Returns:
+            None
+        """
+        self.ring.close()
 
 
 class EndpointVectorEmitter(VectorEmitter):
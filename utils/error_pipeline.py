@@ -6,7 +6,7 @@ from abc import ABC, abstractmethod
 
 import numpy as np
 
-from utils.geometry import get_x_y_rotated_vector, point_in_tri
+from utils.geometry import get_x_y_rotated_vector, point_in_tri, points_in_tris
 
 
 class ErrorType(ABC):
@@ -22,14 +22,101 @@ class ErrorType(ABC):
         """
         raise NotImplementedError
 
+    def eval_array(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Applies the error processing to many vectors at once, in order. Error types that can be vectorised override
+        this, the default runs eval() on each vector.
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            new_vectors: an (N, 3) array of the vectors with some error applied to them
+        """
+        return np.asarray([self.eval(tuple(v)) for v in vectors.tolist()], dtype=float).reshape(-1, 3)
+
+    def get_settings(self) -> dict:
+        """
+        Describes how the error was set up, so a checkpoint is only resumed by a run with the same pipeline
+
+        Returns:
+            settings: a json serialisable description of the error's parameters
+        """
+        return {}
+
+    def get_state(self) -> dict:
+        """
+        Captures everything that changes as vectors are processed, so a checkpointed run can carry on where it stopped
+
+        Returns:
+            state: a json serialisable description of the error's state
+        """
+        return {}
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restores a state captured by get_state()
+
+        Args:
+            state: the captured state
+
+        Returns:
+            None
+        """
+        pass
+
+
+def _rng_state_(rng: random.Random) -> list:
+    """
+    Converts the state of a random number generator to json serialisable lists
+
+    Args:
+        rng: the random number generator
+
+    Returns:
+        state: the [version, internal state, gauss_next] state
+    """
+    version, internal, gauss_next = rng.getstate()
+    return [version, list(internal), gauss_next]
+
+
+def _numpy_rng_(rng: random.Random) -> np.random.Generator:
+    """
+    Makes a numpy generator for vectorised draws, seeded from an error's own generator so seeded errors stay
+    reproducible and checkpointed errors carry on where they stopped
+
+    Args:
+        rng: the error's random number generator
+
+    Returns:
+        generator: a numpy random generator
+    """
+    return np.random.default_rng(rng.getrandbits(64))
+
+
+def _set_rng_state_(rng: random.Random, state: list) -> None:
+    """
+    Restores the state of a random number generator from _rng_state_()
+
+    Args:
+        rng: the random number generator
+        state: the [version, internal state, gauss_next] state
+
+    Returns:
+        None
+    """
+    version, internal, gauss_next = state
+    rng.setstate((version, tuple(internal), gauss_next))
+
 
 class Noise(ErrorType):
-    def __init__(self, error_rate: float, *args, **kwargs):
+    def __init__(self, error_rate: float, seed: float = None, *args, **kwargs):
         """
         Adds random noise according to the error rate to the z component of a vector
 
         Args:
             error_rate: the error range to apply. Must be between 0 and 1.
+            seed: [Optional] a seed for the error's own random number generator
         """
         super(Noise, self).__init__(*args, **kwargs)
 
@@ -39,6 +126,7 @@ class Noise(ErrorType):
         self.mean = 0
         # We want our error rate to be the 3-sigma bounds, or about 99.9973% of readings within it
         self.stddev = error_rate / 3
+        self.rng = random.Random(seed)
 
     def eval(self, vector: tuple[float, float, float], seed: float = None, *args, **kwargs) \
             -> tuple[float, float, float]:
@@ -46,15 +134,41 @@ class Noise(ErrorType):
         Applies random vertical (z) noise error processing to an [x y z] vector
         Args:
             vector: [x y z] vector of a depth reading
-            seed: [Optional] a seed to give to the random number generator
+            seed: [Optional] a seed to reseed the random number generator with
 
         Returns:
             new_vector: an [x y z] vector with some error applied to it.
         """
-        random.seed(seed)
-        new_vector = (vector[0], vector[1], vector[2] + random.gauss(self.mean, self.stddev) * vector[2])
+        if seed is not None:
+            self.rng.seed(seed)
+        new_vector = (vector[0], vector[1], vector[2] + self.rng.gauss(self.mean, self.stddev) * vector[2])
         return new_vector
 
+    def eval_array(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Applies random vertical (z) noise to many vectors at once. The noise is drawn from a numpy generator, so it
+        follows the same distribution as eval() but not the same sequence.
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            new_vectors: an (N, 3) array of the vectors with some error applied to them
+        """
+        new_vectors = np.array(vectors, dtype=float)
+        noise = _numpy_rng_(self.rng).normal(self.mean, self.stddev, len(new_vectors))
+        new_vectors[:, 2] += noise * new_vectors[:, 2]
+        return new_vectors
+
+    def get_settings(self) -> dict:
+        return {"error_rate": self.err_rate}
+
+    def get_state(self) -> dict:
+        return {"rng": _rng_state_(self.rng)}
+
+    def set_state(self, state: dict) -> None:
+        _set_rng_state_(self.rng, state["rng"])
+
     def __eq__(self, other):
         if isinstance(other, Noise):
             return other.err_rate == self.err_rate
@@ -75,9 +189,10 @@ class FalseBottom(ErrorType):
         super(FalseBottom, self).__init__(*args, **kwargs)
 
         self.seed = seed
-        random.seed(self.seed)
+        self.debris_size = debris_size
+        rng = random.Random(self.seed)
 
-        self.length = random.random() * (debris_size - 1)
+        self.length = rng.random() * (debris_size - 1)
         self.width = debris_size / self.length
 
         self.debris_tris = []
@@ -95,17 +210,17 @@ class FalseBottom(ErrorType):
         Returns:
             None
         """
-        random.seed(self.seed)
+        rng = random.Random(self.seed)
 
         # get a random point in the mesh
-        p1 = np.asarray([random.random() * (max_x - min_x) + min_x, random.random() * (max_y - min_y) + min_y])
+        p1 = np.asarray([rng.random() * (max_x - min_x) + min_x, rng.random() * (max_y - min_y) + min_y])
 
         #  P2 --- P4
         #  |      |
         #  |      |
         #  P1 --- P3
         # Get the point rotations about p1
-        theta = random.random() * 2 * np.pi
+        theta = rng.random() * 2 * np.pi
 
         p2_pre = np.asarray([self.length, 0])
         p3_pre = np.asarray([0, self.width])
@@ -138,14 +253,48 @@ class FalseBottom(ErrorType):
         else:
             return vector
 
+    def eval_array(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Replaces the depth of every vector over the debris with the false bottom's depth
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            new_vectors: an (N, 3) array of the vectors with some error applied to them
+        """
+        new_vectors = np.array(vectors, dtype=float)
+        over_debris = np.zeros(len(new_vectors), dtype=bool)
+        if len(self.debris_tris) > 0:
+            over_debris = points_in_tris(new_vectors[:, :2], np.asarray(self.debris_tris)).any(axis=1)
+
+        hits = np.flatnonzero(over_debris)
+        if len(hits) > 0:
+            if self.depth == 0:
+                self.depth = new_vectors[hits[0], 2] / 2
+            new_vectors[hits, 2] = self.depth
+        return new_vectors
+
+    def get_settings(self) -> dict:
+        return {"debris_size": self.debris_size}
+
+    def get_state(self) -> dict:
+        # Unseeded debris is placed at random, so it is saved rather than regenerated
+        return {"depth": float(self.depth), "debris_tris": [[list(map(float, p)) for p in tri] for tri in self.debris_tris]}
+
+    def set_state(self, state: dict) -> None:
+        self.depth = state["depth"]
+        self.debris_tris = [tuple(np.asarray(p) for p in tri) for tri in state["debris_tris"]]
+
 
 class Dropout(ErrorType):
-    def __init__(self, error_rate: float, drop_off_rate=0.02, *args, **kwargs):
+    def __init__(self, error_rate: float, drop_off_rate=0.02, seed: float = None, *args, **kwargs):
         """
         Adds a random chance of a sensor failing, with a stochastic falloff
 
         Args:
             error_rate: the error rate to apply. Must be between 0 and 1.
+            seed: [Optional] a seed for the error's own random number generator
         """
         super(Dropout, self).__init__(*args, **kwargs)
 
@@ -156,6 +305,7 @@ class Dropout(ErrorType):
         # Stochastic falloff hyperparameters
         self.drops_in_a_row = 0
         self.drop_off = drop_off_rate
+        self.rng = random.Random(seed)
 
     def _dropout_chance_(self) -> float:
         """
@@ -173,13 +323,14 @@ class Dropout(ErrorType):
         Randomly, according to its error rate instantiation, causes a sensor dropout
         Args:
             vector: [x y z] vector of a depth reading
-            seed: [Optional] a seed to give to the random number generator
+            seed: [Optional] a seed to reseed the random number generator with
 
         Returns:
             new_vector: an [x y z] vector with some error applied to it.
         """
-        random.seed(seed)
-        dropped_now = random.random() < self._dropout_chance_()
+        if seed is not None:
+            self.rng.seed(seed)
+        dropped_now = self.rng.random() < self._dropout_chance_()
 
         if dropped_now:
             self.drops_in_a_row += 1
@@ -189,6 +340,64 @@ class Dropout(ErrorType):
         new_vector = (vector[0], vector[1], 0 if dropped_now else vector[2])
         return new_vector
 
+    def eval_array(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Causes sensor dropouts in many vectors at once. Only the draws that could be a dropout with the largest
+        falloff are checked one at a time, which are few at realistic error rates.
+
+        Args:
+            vectors: an (N, 3) array of [x y z] vectors
+
+        Returns:
+            new_vectors: an (N, 3) array of the vectors with some error applied to them
+        """
+        new_vectors = np.array(vectors, dtype=float)
+        draws = _numpy_rng_(self.rng).random(len(new_vectors))
+        dropped = np.zeros(len(new_vectors), dtype=bool)
+
+        last = -1
+        for i in np.flatnonzero(draws < self.err_rate + self.drop_off):
+            # Every draw that was skipped over was not a dropout, which ends the run of drops
+            if i != last + 1:
+                self.drops_in_a_row = 0
+            dropped[i] = draws[i] < self._dropout_chance_()
+            self.drops_in_a_row = self.drops_in_a_row + 1 if dropped[i] else 0
+            last = i
+        if last != len(new_vectors) - 1:
+            self.drops_in_a_row = 0
+
+        new_vectors[dropped, 2] = 0
+        return new_vectors
+
+    def get_settings(self) -> dict:
+        return {"error_rate": self.err_rate, "drop_off_rate": self.drop_off}
+
+    def get_state(self) -> dict:
+        return {"rng": _rng_state_(self.rng), "drops_in_a_row": self.drops_in_a_row}
+
+    def set_state(self, state: dict) -> None:
+        _set_rng_state_(self.rng, state["rng"])
+        self.drops_in_a_row = state["drops_in_a_row"]
+
+
+def init_pipeline(errs: list[ErrorType], min_x: float, min_y: float, max_x: float, max_y: float) -> None:
+    """
+    Performs any setup the error types of a pipeline need before the first vector, like placing FalseBottom debris
+
+    Args:
+        errs: a list of ErrorType objects
+        min_x: The min horizontal value of the surveyed area
+        min_y: The min vertical value of the surveyed area
+        max_x: The max horizontal value of the surveyed area
+        max_y: The max vertical value of the surveyed area
+
+    Returns:
+        None
+    """
+    for e in errs:
+        if isinstance(e, FalseBottom):
+            e.init_debris(min_x, min_y, max_x, max_y)
+
 
 def run_pipeline(errs: list[ErrorType], vector: tuple[float, float, float], *args, **kwargs) \
         -> tuple[float, float, float]:
@@ -207,3 +416,20 @@ def run_pipeline(errs: list[ErrorType], vector: tuple[float, float, float], *arg
     for e in errs:
         new_vector = e.eval(new_vector, *args, **kwargs)
     return new_vector
+
+
+def run_pipeline_array(errs: list[ErrorType], vectors: np.ndarray) -> np.ndarray:
+    """
+    Runs many vectors through a pipeline at once, sequentially according to the order of errs
+
+    Args:
+        errs: a list of ErrorType objects
+        vectors: an (N, 3) array of [x y z] vectors to be processed
+
+    Returns:
+        new_vectors: The processed (N, 3) array of vectors after being run through the pipeline
+    """
+    new_vectors = np.asarray(vectors, dtype=float)
+    for e in errs:
+        new_vectors = e.eval_array(new_vectors)
+    return new_vectors
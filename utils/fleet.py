@@ -0,0 +1,152 @@
+"""
+Declares and maintains multi-vessel fleet simulation, where several vessels sample one shared mesh at the same time
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cli_parsing import parse_error, parse_emitter, configure_emitter
+from utils.emitters import VectorEmitter, StdOutVectorEmitter
+from utils.error_pipeline import ErrorType, init_pipeline
+from utils.report import RunReport, FleetReport
+from utils.sampling_procedures import parallel_track_sampling_generator, sample_path
+from utils.scheduling import DeadlineScheduler, LATE_POLICIES
+
+VESSEL_KEYS = {"name", "path_type", "velocity", "sample_rate", "errors", "emitter", "bounds", "time_scale",
+               "late_policy"}
+
+
+class Vessel:
+    def __init__(self, name: str, errors: list[ErrorType] = None, emitter: VectorEmitter = None,
+                 velocity: float = 1.0, sample_rate: float = 1.0, bounds: tuple[float, float, float, float] = None,
+                 time_scale: float = 1.0, late_policy: str = "catch_up", paced: bool = True):
+        """
+        A vessel in a fleet, with its own path, speed, sample rate, error pipeline, and emitter. Vessels run parallel
+        track paths, as drawn paths need a window per vessel.
+
+        Args:
+            name: the name of the vessel, used in its report and to prefix the names of its metrics
+            errors: [Optional] the vessel's error pipeline
+            emitter: [Optional] where the vessel emits its vectors. Defaults to stdout.
+            velocity: the velocity of the vessel in m/s
+            sample_rate: the rate in Hertz the vessel samples at
+            bounds: [Optional] the (min_x, min_y, max_x, max_y) area the vessel surveys. Defaults to the whole mesh.
+            time_scale: how much faster than real time the vessel runs
+            late_policy: "catch_up" or "skip", see DeadlineScheduler
+            paced: whether the vessel waits between samples
+        """
+        self.name = name
+        self.errors = errors if errors is not None else []
+        self.emitter = emitter if emitter is not None else StdOutVectorEmitter()
+        self.velocity = velocity
+        self.sample_rate = sample_rate
+        self.bounds = bounds
+        self.time_scale = time_scale
+        self.late_policy = late_policy
+        self.paced = paced
+
+    def run(self, mesh, record_stages: bool = True) -> RunReport:
+        """
+        Surveys the vessel's area of the mesh, closing the vessel's emitter when done
+
+        Args:
+            mesh: the shared CustomTriMesh
+            record_stages: whether the report times the stages of each sample
+
+        Returns:
+            report: the performance report of the vessel's run
+        """
+        if self.bounds is not None:
+            min_x, min_y, max_x, max_y = self.bounds
+        else:
+            (min_x, min_y, _), (max_x, max_y, _) = mesh.bounds
+
+        init_pipeline(self.errors, min_x, min_y, max_x, max_y)
+
+        path = parallel_track_sampling_generator(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+                                                 sample_rate=self.sample_rate, velocity=self.velocity)
+        scheduler = DeadlineScheduler(self.sample_rate, time_scale=self.time_scale, late_policy=self.late_policy,
+                                      paced=self.paced)
+        report = RunReport(sample_rate=self.sample_rate * self.time_scale, name=self.name, record_stages=record_stages)
+        try:
+            sample_path(mesh, path, self.errors, self.emitter, scheduler, report,
+                        metrics_prefix=f"{self.name}.sample_path")
+        finally:
+            self.emitter.close()
+        return report
+
+
+def vessels_from_config(config: dict, sample_rate: float = 1.0, velocity: float = 1.0, time_scale: float = 1.0,
+                        late_policy: str = "catch_up", paced: bool = True, compression: str = None,
+                        origin: tuple[float, float] = None) -> list[Vessel]:
+    """
+    Builds the vessels of a fleet configuration. Each entry of its "vessels" list may set a name, velocity,
+    sample_rate, errors (like ["noise@0.05", "drop@0.01"]), emitter (like "csv@alpha.csv"), bounds
+    ([min_x, min_y, max_x, max_y]), time_scale, and late_policy. Settings a vessel leaves out come from the arguments.
+
+    Args:
+        config: the parsed configuration
+        sample_rate: the default sample rate in Hertz
+        velocity: the default velocity in m/s
+        time_scale: the default time scale
+        late_policy: the default late policy
+        paced: whether vessels wait between samples
+        compression: [Optional] a codec applied to every file emitter
+        origin: [Optional] the latitude and longitude of the mesh origin, for nmea emitters
+
+    Returns:
+        vessels: the configured vessels
+
+    Raises:
+        ValueError if the configuration has no vessels, a vessel has an unknown setting, or its emitter cannot be
+            opened
+    """
+    entries = config.get("vessels", [])
+    if len(entries) == 0:
+        raise ValueError("The fleet configuration has no vessels")
+
+    vessels = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - VESSEL_KEYS
+        if unknown:
+            raise ValueError(f"Unknown vessel settings {sorted(unknown)}, expected some of {sorted(VESSEL_KEYS)}")
+        if entry.get("path_type", "parallel") != "parallel":
+            raise ValueError("Fleet vessels only support parallel track paths")
+        if entry.get("late_policy", late_policy) not in LATE_POLICIES:
+            raise ValueError(f"Unknown late policy '{entry['late_policy']}', expected one of {LATE_POLICIES}")
+
+        vessel_rate = float(entry.get("sample_rate", sample_rate))
+        errors = [err for err in (parse_error(spec) for spec in entry.get("errors", [])) if err is not None]
+        emitter = parse_emitter(entry.get("emitter", "stdout"))
+        configure_emitter(emitter, compression, vessel_rate, origin)
+        bounds = entry.get("bounds")
+
+        vessels.append(Vessel(
+            name=entry.get("name", f"vessel-{i + 1}"),
+            errors=errors,
+            emitter=emitter,
+            velocity=float(entry.get("velocity", velocity)),
+            sample_rate=vessel_rate,
+            bounds=tuple(bounds) if bounds is not None else None,
+            time_scale=float(entry.get("time_scale", time_scale)),
+            late_policy=entry.get("late_policy", late_policy),
+            paced=paced,
+        ))
+    return vessels
+
+
+def run_fleet(mesh, vessels: list[Vessel], record_stages: bool = True) -> FleetReport:
+    """
+    Runs every vessel at the same time on its own thread. The mesh is only read while sampling, so all vessels share
+    one copy of it, and each vessel keeps its own real-time schedule.
+
+    Args:
+        mesh: the shared CustomTriMesh
+        vessels: the vessels to run
+        record_stages: whether the reports time the stages of each sample
+
+    Returns:
+        report: the combined report and each vessel's report
+    """
+    with ThreadPoolExecutor(max_workers=len(vessels), thread_name_prefix="vessel") as pool:
+        futures = [pool.submit(vessel.run, mesh, record_stages) for vessel in vessels]
+        reports = [future.result() for future in futures]
+    return FleetReport(reports)
@@ -0,0 +1,157 @@
+"""
+Declares and maintains beam footprint sampling for single beam sounders. A real transducer has a beam width, so its echo
+comes from the shallowest return inside a cone rather than from the one vertical line under the vessel.
+"""
+import itertools
+import math
+
+import numpy as np
+
+from utils.mesh import CustomTriMesh
+from utils.multibeam import intersect_rays
+
+# Successive sub-rays turn by the golden angle so any number of them spread evenly over the footprint
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+class FootprintCache:
+    def __init__(self, mesh: CustomTriMesh, margin: int = 8):
+        """
+        Caches the candidate faces of a block of search bins, so consecutive pings, whose footprints overlap heavily,
+        reuse them instead of gathering them from the search field again
+
+        Args:
+            mesh: the indexed mesh
+            margin: the number of extra bins gathered on every side of a footprint when the cache is refilled, so the
+                following pings fall within the cached block
+        """
+        self.mesh = mesh
+        self.margin = margin
+        self.triangles = np.asarray(mesh.vertices)[np.asarray(mesh.faces)]
+        self.block = None
+        self.faces = np.empty(0, dtype=np.int64)
+        self.face_mins = np.empty((0, 2))
+        self.face_maxs = np.empty((0, 2))
+        self.hits = 0
+        self.misses = 0
+
+    def candidates(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """
+        Finds the faces indexed in the bins that a box overlaps, whose own bounding boxes overlap it too
+
+        Args:
+            min_x: the low x edge of the box
+            min_y: the low y edge of the box
+            max_x: the high x edge of the box
+            max_y: the high y edge of the box
+
+        Returns:
+            faces: the indices of the candidate faces
+        """
+        nx, ny = self.mesh.search_field.shape
+        low_i, low_j = self.mesh._get_bin_indices_(min_x, min_y)
+        high_i, high_j = self.mesh._get_bin_indices_(max_x, max_y)
+        block = (max(low_i, 0), max(low_j, 0), min(high_i, nx - 1), min(high_j, ny - 1))
+        if block[0] > block[2] or block[1] > block[3]:
+            return np.empty(0, dtype=np.int64)
+
+        if self.block is not None and self.block[0] <= block[0] and self.block[1] <= block[1] and \
+                block[2] <= self.block[2] and block[3] <= self.block[3]:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._fill_(max(block[0] - self.margin, 0), max(block[1] - self.margin, 0),
+                        min(block[2] + self.margin, nx - 1), min(block[3] + self.margin, ny - 1))
+
+        overlaps = np.all(self.face_mins <= (max_x, max_y), axis=1) & np.all(self.face_maxs >= (min_x, min_y), axis=1)
+        return self.faces[overlaps]
+
+    def _fill_(self, low_i: int, low_j: int, high_i: int, high_j: int) -> None:
+        """
+        Gathers the faces of a block of bins into the cache
+
+        Args:
+            low_i: the first x bin of the block
+            low_j: the first y bin of the block
+            high_i: the last x bin of the block
+            high_j: the last y bin of the block
+
+        Returns:
+            None
+        """
+        lists = self.mesh.search_field[low_i:high_i + 1, low_j:high_j + 1].ravel()
+        faces = np.fromiter(itertools.chain.from_iterable(f for f in lists if f is not None), dtype=np.int64)
+        self.block = (low_i, low_j, high_i, high_j)
+        self.faces = np.unique(faces)
+        self.face_mins = self.triangles[self.faces, :, :2].min(axis=1)
+        self.face_maxs = self.triangles[self.faces, :, :2].max(axis=1)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups answered from the cached block
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+class FootprintSounder:
+    def __init__(self, mesh: CustomTriMesh, beam_width: float, sub_rays: int = 16, cache_margin: int = 8):
+        """
+        A single beam sounder with a beam width. Each ping casts sub-rays spread evenly over the cone of the beam, one
+        straight down and the rest in a spiral out to its edge, and reports the shallowest point any of them hits. It
+        has the same get_shallowest_depth() as CustomTriMesh, so it can be sampled in place of the mesh.
+
+        Args:
+            mesh: the indexed mesh
+            beam_width: the angle in degrees across the cone of the beam. Must be at least 0 and less than 180.
+            sub_rays: the number of rays cast per ping
+            cache_margin: the margin in bins of the FootprintCache
+        """
+        if sub_rays < 1:
+            raise ValueError("A beam footprint needs at least one sub-ray")
+        if not 0 <= beam_width < 180:
+            raise ValueError("The beam width must be at least 0 and less than 180 degrees")
+        self.mesh = mesh
+        self.beam_width = beam_width
+        self.sub_rays = sub_rays
+        self.cache = FootprintCache(mesh, cache_margin)
+
+        # Cast from above the mesh, like the multibeam sounder
+        self.surface_z = float(mesh.bounds[1][2]) + 1.0
+        spread = math.tan(math.radians(beam_width / 2))
+        self.radius = (self.surface_z - float(mesh.bounds[0][2])) * spread
+
+        k = np.arange(sub_rays)
+        offsets = spread * np.sqrt(k / max(sub_rays - 1, 1))
+        angles = k * GOLDEN_ANGLE
+        self.directions = np.column_stack((offsets * np.cos(angles), offsets * np.sin(angles), -np.ones(sub_rays)))
+
+    def get_shallowest_depth(self, x: float, y: float) -> float | None:
+        """
+        Pings at a position and finds the shallowest return inside the beam's footprint
+
+        Args:
+            x: a real x position
+            y: a real y position
+
+        Returns:
+            z: the shallowest z position any sub-ray hit, or None if none of them hit the mesh
+        """
+        faces = self.cache.candidates(x - self.radius, y - self.radius, x + self.radius, y + self.radius)
+        origins = np.broadcast_to(np.asarray([x, y, self.surface_z]), self.directions.shape)
+        distances, _ = intersect_rays(origins, self.directions, self.cache.triangles[faces])
+
+        hit = np.isfinite(distances)
+        if not hit.any():
+            return None
+        return float(np.max(self.surface_z - distances[hit]))
+
+    def stats(self) -> dict:
+        """
+        Summarises how often the candidate faces of a ping came from the FootprintCache
+
+        Returns:
+            stats: the number of cache hits and misses, and the hit rate
+        """
+        return {"cache_hits": self.cache.hits, "cache_misses": self.cache.misses, "hit_rate": self.cache.hit_rate}
@@ -1,8 +1,142 @@
 """
 Declares and maintains utility function for geometric abstractions
 """
+import os
+
 import numpy as np
 
+try:
+    import numba
+except ImportError:  # pragma: no cover - optional dependency
+    numba = None
+
+# Setting this environment variable to anything but an empty string keeps the kernels from being compiled
+DISABLE_JIT_ENV = "ECHO_SOUND_SIM_DISABLE_JIT"
+
+# Whether the geometry functions run the compiled kernels, which needs the optional numba package
+JIT_ENABLED = numba is not None and not os.environ.get(DISABLE_JIT_ENV)
+
+
+def _jit_(function):
+    """
+    Compiles a kernel with numba when the kernels are enabled, otherwise leaves it as plain Python
+
+    Args:
+        function: the kernel, which must only take and return numbers and numpy arrays
+
+    Returns:
+        kernel: the compiled kernel, or the function itself
+    """
+    if not JIT_ENABLED:
+        return function
+    return numba.njit(cache=True, error_model="numpy")(function)
+
+
+@_jit_
+def _line_sign_kernel_(px: float, py: float, sx: float, sy: float, ex: float, ey: float) -> int:
+    """
+    The kernel of line_sign(), on plain floats
+
+    Args:
+        px: the x of the point of interest
+        py: the y of the point of interest
+        sx: the x of one side of the line
+        sy: the y of one side of the line
+        ex: the x of the other side of the line
+        ey: the y of the other side of the line
+
+    Returns:
+        sign: 1 if above the line, -1 if below, 0 if on the line
+    """
+    res = (px - ex) * (sy - ey) - (sx - ex) * (py - ey)
+    if res > 0:
+        return 1
+    if res < 0:
+        return -1
+    return 0
+
+
+@_jit_
+def _point_in_tri_kernel_(px: float, py: float, x1: float, y1: float, x2: float, y2: float, x3: float, y3: float) \
+        -> bool:
+    """
+    The kernel of point_in_tri(), on plain floats
+
+    Args:
+        px: the x of the point of interest
+        py: the y of the point of interest
+        x1: the x of the first vertex
+        y1: the y of the first vertex
+        x2: the x of the second vertex
+        y2: the y of the second vertex
+        x3: the x of the third vertex
+        y3: the y of the third vertex
+
+    Returns:
+        in_tri: a boolean of whether the point is withing the [x y] bound of the face
+    """
+    d1 = _line_sign_kernel_(px, py, x1, y1, x2, y2)
+    d2 = _line_sign_kernel_(px, py, x2, y2, x3, y3)
+    d3 = _line_sign_kernel_(px, py, x3, y3, x1, y1)
+
+    # if the face has 3 identical points
+    if d1 == 0 and d2 == 0 and d3 == 0:
+        return px == x1 and py == y1
+    has_neg = d1 < 0 or d2 < 0 or d3 < 0
+    has_pos = d1 > 0 or d2 > 0 or d3 > 0
+    return not (has_pos and has_neg)
+
+
+@_jit_
+def _plane_intercept_kernel_(x: float, y: float, x1: float, y1: float, z1: float, x2: float, y2: float, z2: float,
+                             x3: float, y3: float, z3: float) -> float:
+    """
+    The kernel of triangular_plane_intercept(), on plain floats
+
+    Args:
+        x: the x point to be projected onto the plane
+        y: the y point to be projected onto the plane
+        x1: the x of the first vertex
+        y1: the y of the first vertex
+        z1: the z of the first vertex
+        x2: the x of the second vertex
+        y2: the y of the second vertex
+        z2: the z of the second vertex
+        x3: the x of the third vertex
+        y3: the y of the third vertex
+        z3: the z of the third vertex
+
+    Returns:
+        z: the z position of the projected points x and y, or nan if the face is vertical or degenerate
+    """
+    ax, ay, az = x1 - x2, y1 - y2, z1 - z2
+    bx, by, bz = x1 - x3, y1 - y3, z1 - z3
+    cx, cy, cz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+    if cz == 0:
+        return np.nan
+    intercept = cx * x1 + cy * y1 + cz * z1
+    return (intercept - (cx * x + cy * y)) / cz
+
+
+@_jit_
+def _triangles_hit_kernel_(px: float, py: float, triangles: np.ndarray) -> np.ndarray:
+    """
+    Checks which of a batch of triangles a vertical line passes through, as point_in_tri() does for each one
+
+    Args:
+        px: the x of the vertical line
+        py: the y of the vertical line
+        triangles: a (K, 3, 3) array of the [x y z] vertices of each triangle
+
+    Returns:
+        hits: a (K,) boolean array of whether the line passes through each triangle
+    """
+    hits = np.zeros(triangles.shape[0], dtype=np.bool_)
+    for k in range(triangles.shape[0]):
+        t = triangles[k]
+        hits[k] = _point_in_tri_kernel_(px, py, t[0, 0], t[0, 1], t[1, 0], t[1, 1], t[2, 0], t[2, 1])
+    return hits
+
 
 def line_sign(point: tuple[float, float], line_start: tuple[float, float], line_end: tuple[float, float]) -> float:
     """
@@ -16,6 +150,9 @@ def line_sign(point: tuple[float, float], line_start: tuple[float, float], line_
     Returns:
         sign: 1 if above the line, -1 if below, 0 if on the line
     """
+    if JIT_ENABLED:
+        return _line_sign_kernel_(float(point[0]), float(point[1]), float(line_start[0]), float(line_start[1]),
+                                  float(line_end[0]), float(line_end[1]))
     res = (point[0] - line_end[0]) * (line_start[1] - line_end[1]) - (line_start[0] - line_end[0]) * (point[1] - line_end[1])
     if res == 0:
         return 0
@@ -23,6 +160,26 @@ def line_sign(point: tuple[float, float], line_start: tuple[float, float], line_
         return int(res // abs(res))
 
 
+def line_signs(points: np.ndarray, line_starts: np.ndarray, line_ends: np.ndarray) -> np.ndarray:
+    """
+    Broadcasting line_sign(), for every point against every line
+
+    Args:
+        points: an (N, 2) array of the points of interest [x y]
+        line_starts: an (M, 2) array of one side of each line [x y]
+        line_ends: an (M, 2) array of the other side of each line [x y]
+
+    Returns:
+        signs: an (N, M) integer array, 1 where a point is above a line, -1 where below, 0 where on it
+    """
+    points = np.asarray(points, dtype=float)
+    starts = np.asarray(line_starts, dtype=float)
+    ends = np.asarray(line_ends, dtype=float)
+    px, py = points[:, 0, None], points[:, 1, None]
+    res = (px - ends[:, 0]) * (starts[:, 1] - ends[:, 1]) - (starts[:, 0] - ends[:, 0]) * (py - ends[:, 1])
+    return np.sign(res).astype(int)
+
+
 def point_in_tri(point: tuple[float, float], v1: tuple[float, float, float],
                  v2: tuple[float, float, float], v3: tuple[float, float, float]) -> bool:
     """
@@ -38,6 +195,9 @@ def point_in_tri(point: tuple[float, float], v1: tuple[float, float, float],
     Returns:
         in_tri: a boolean of whether the point is withing the [x y] bound of the face
     """
+    if JIT_ENABLED:
+        return bool(_point_in_tri_kernel_(float(point[0]), float(point[1]), float(v1[0]), float(v1[1]),
+                                          float(v2[0]), float(v2[1]), float(v3[0]), float(v3[1])))
     d1 = line_sign(point, v1[0:2], v2[0:2])
     d2 = line_sign(point, v2[0:2], v3[0:2])
     d3 = line_sign(point, v3[0:2], v1[0:2])
@@ -52,6 +212,34 @@ def point_in_tri(point: tuple[float, float], v1: tuple[float, float, float],
         return not (has_pos and has_neg)
 
 
+def points_in_tris(points: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Broadcasting point_in_tri(), for every point against every triangle. Triangles whose vertices all lie on one line,
+    including vertical faces, are treated as point_in_tri() treats them.
+
+    Args:
+        points: an (N, 2) array of the points of interest [x y]
+        triangles: an (M, 3, 3) array of the [x y z] vertices of each triangle, or an (M, 3, 2) array of their [x y]
+
+    Returns:
+        in_tri: an (N, M) boolean array of whether each point is within the [x y] bound of each face
+    """
+    points = np.asarray(points, dtype=float)
+    triangles = np.asarray(triangles, dtype=float)
+    v1, v2, v3 = triangles[:, 0, :2], triangles[:, 1, :2], triangles[:, 2, :2]
+    d1 = line_signs(points, v1, v2)
+    d2 = line_signs(points, v2, v3)
+    d3 = line_signs(points, v3, v1)
+
+    has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
+    has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
+
+    # if the point is in line with all three sides, it has to be the first vertex
+    on_all = (d1 == 0) & (d2 == 0) & (d3 == 0)
+    at_v1 = (points[:, 0, None] == v1[:, 0]) & (points[:, 1, None] == v1[:, 1])
+    return np.where(on_all, at_v1, ~(has_pos & has_neg))
+
+
 def triangular_plane_intercept(
         x: float,
         y: float,
@@ -70,20 +258,56 @@ def triangular_plane_intercept(
         v3: [x y z] vertex
 
     Returns:
-        z: the z position of the projected points x and y
+        z: the z position of the projected points x and y, or nan if the face is vertical or degenerate, as no single z
+            of its plane lies over [x y]
     """
+    if JIT_ENABLED:
+        return _plane_intercept_kernel_(float(x), float(y), float(v1[0]), float(v1[1]), float(v1[2]),
+                                        float(v2[0]), float(v2[1]), float(v2[2]), float(v3[0]), float(v3[1]),
+                                        float(v3[2]))
     vector1 = np.subtract(v1, v2)
     vector2 = np.subtract(v1, v3)
 
     # Find the coefficients and the intercept of the equation of the plane
     coef = np.cross(vector1, vector2)
     intercept = np.dot(coef, v1)
+    if coef[2] == 0:
+        return np.nan
 
     # Calculate z
     z = (intercept - (coef[0] * x + coef[1] * y)) / coef[2]
     return z
 
 
+def triangular_plane_intercepts(points: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Broadcasting triangular_plane_intercept(), for every point against the plane of every triangle
+
+    Args:
+        points: an (N, 2) array of the [x y] points to be projected onto the planes
+        triangles: an (M, 3, 3) array of the [x y z] vertices of each triangle
+
+    Returns:
+        z: an (N, M) array of the z position of each point on each plane, nan on the planes of vertical or degenerate
+            faces
+    """
+    points = np.asarray(points, dtype=float)
+    triangles = np.asarray(triangles, dtype=float)
+    v1 = triangles[:, 0]
+    vector1 = v1 - triangles[:, 1]
+    vector2 = v1 - triangles[:, 2]
+
+    # Find the coefficients and the intercept of the equation of each plane
+    coef = np.cross(vector1, vector2)
+    intercept = coef[:, 0] * v1[:, 0] + coef[:, 1] * v1[:, 1] + coef[:, 2] * v1[:, 2]
+    flat = coef[:, 2] != 0
+    denominator = np.where(flat, coef[:, 2], 1.0)
+
+    # Calculate z
+    z = (intercept - (coef[:, 0] * points[:, 0, None] + coef[:, 1] * points[:, 1, None])) / denominator
+    return np.where(flat, z, np.nan)
+
+
 def get_x_y_rotated_vector(vector: np.ndarray, theta: float) -> np.ndarray:
     """
     Rotates a vector by theta about the origin
@@ -102,6 +326,23 @@ def get_x_y_rotated_vector(vector: np.ndarray, theta: float) -> np.ndarray:
     return np.atleast_1d(rotated_vector).T[0]
 
 
+def get_x_y_rotated_vectors(vectors: np.ndarray, thetas: np.ndarray | float) -> np.ndarray:
+    """
+    Broadcasting get_x_y_rotated_vector(), rotating each vector about the origin by its own angle, or all of them by one
+
+    Args:
+        vectors: an (N, 2) array of [x y] vectors
+        thetas: an (N,) array of the angles, in radians, to rotate each vector by, or a single angle for all of them
+
+    Returns:
+        rotated_vectors: an (N, 2) array of the vectors rotated about the [x y] origin
+    """
+    vectors = np.asarray(vectors, dtype=float)
+    cos, sin = np.cos(thetas), np.sin(thetas)
+    x, y = vectors[:, 0], vectors[:, 1]
+    return np.column_stack((cos * x - sin * y, sin * x + cos * y))
+
+
 def find_x_y_theta(
         p1: tuple[float, float, float],
         p2: tuple[float, float, float],
@@ -1,25 +1,158 @@
 """
 Declares and maintains operations for maintaining and interacting with the mesh to sample from
 """
+import trimesh
 from trimesh import Trimesh
 import matplotlib.pyplot as plt
 import cv2
 import numpy as np
 
+from utils import geometry
 from utils.geometry import point_in_tri, triangular_plane_intercept
+from utils.mesh_generation import SYNTHETIC_PREFIX, synthetic_from_spec
+from utils.profiling import phase
 from utils.timing import timed
 
 
+# The approximate memory of one face index entry in a search bin's list, which is a pointer to the face's int
+INDEX_ENTRY_BYTES = 8
+# Faces are pruned this many at a time, to bound the memory of the temporary per face arrays
+PRUNE_CHUNK_FACES = 1 << 17
+# A face counts as vertical when the z of its normal is this small relative to the product of two of its edge lengths,
+# as the rounding of float32 vertices, like those in stl files, leaves walls a hair off vertical
+VERTICAL_TOLERANCE = 1e-6
+
+
+def _index_entries_(triangles: np.ndarray, bounds: np.ndarray, field_split: int) -> np.ndarray:
+    """
+    Counts the search bins each face is indexed in, as CustomTriMesh indexes them
+
+    Args:
+        triangles: an (F, 3, 3) array of the [x y z] vertices of each face
+        bounds: the [[min x, min y, min z], [max x, max y, max z]] bounds of the search field
+        field_split: the number of search bins along each axis
+
+    Returns:
+        entries: an (F,) array of the number of bins each face is indexed in
+    """
+    if len(triangles) == 0:
+        return np.zeros(0, dtype=np.int64)
+    sizes = (bounds[1][:2] - bounds[0][:2]) / field_split
+    v1, v2, v3 = triangles[:, 0, :2], triangles[:, 1, :2], triangles[:, 2, :2]
+    low = np.minimum((np.minimum(np.minimum(v1, v2), v3) - bounds[0][:2]) // sizes, field_split - 1)
+    high = np.minimum((np.maximum(np.maximum(v1, v2), v3) - bounds[0][:2]) // sizes, field_split - 1)
+    spans = (high - low + 1).astype(np.int64)
+    return spans[:, 0] * spans[:, 1]
+
+
+def _flat_faces_(triangles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the faces with no single z over any [x y]
+
+    Args:
+        triangles: an (F, 3, 3) array of the [x y z] vertices of each face
+
+    Returns:
+        (flat, degenerate): (F,) masks of the faces that are vertical or degenerate, and of those that are degenerate,
+            with their vertices on one line or one point
+    """
+    edges_1 = triangles[:, 0] - triangles[:, 1]
+    edges_2 = triangles[:, 0] - triangles[:, 2]
+    tolerance = VERTICAL_TOLERANCE * np.linalg.norm(edges_1, axis=1) * np.linalg.norm(edges_2, axis=1)
+    normal_z = edges_1[:, 0] * edges_2[:, 1] - edges_1[:, 1] * edges_2[:, 0]
+    flat = np.abs(normal_z) <= tolerance
+
+    # Only flat faces can be degenerate, and there are usually few of them
+    degenerate = np.zeros(len(triangles), dtype=bool)
+    normals = np.cross(edges_1[flat], edges_2[flat])
+    degenerate[flat] = np.linalg.norm(normals, axis=1) <= tolerance[flat]
+    return flat, degenerate
+
+
+def prune_mesh(mesh: Trimesh, field_split: int = 1000, prune_faces: bool = True,
+               merge_vertices: bool = False) -> tuple[Trimesh, dict]:
+    """
+    Drops the faces that can never hold a depth before the mesh is indexed. Vertical faces, and degenerate faces whose
+    vertices lie on one line or one point, have no single z over any [x y], so triangular_plane_intercept() gives nan
+    for them and they are skipped, but they still take up index entries and get checked by every lookup in their bins.
+    Faces within VERTICAL_TOLERANCE of vertical are dropped too, as their intercepts blow up. The faces are checked
+    PRUNE_CHUNK_FACES at a time.
+
+    Args:
+        mesh: the mesh to prune
+        field_split: the number of search bins along each axis, to count the index entries saved
+        prune_faces: whether to drop the vertical and degenerate faces, so merge_vertices can be used on its own
+        merge_vertices: whether to merge vertices with identical positions first, so faces that share them are
+            adjacent
+
+    Returns:
+        pruned_mesh: the mesh without those faces, or the mesh itself if there was nothing to prune
+        stats: the number of vertical and degenerate faces dropped, the number of vertices merged, the number of index
+            entries left and saved, the approximate index memory saved, and the fraction of candidate checks saved for
+            lookups spread evenly over the mesh
+    """
+    vertices = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.faces)
+    merged = 0
+    if merge_vertices and len(vertices) > 0:
+        vertices, inverse = np.unique(vertices, axis=0, return_inverse=True)
+        merged = len(mesh.vertices) - len(vertices)
+        faces = inverse.reshape(-1)[faces]
+
+    flat = np.zeros(len(faces), dtype=bool)
+    degenerate = np.zeros(len(faces), dtype=bool)
+    before = 0
+    for start in range(0, len(faces), PRUNE_CHUNK_FACES):
+        chunk = slice(start, start + PRUNE_CHUNK_FACES)
+        triangles = vertices[faces[chunk]]
+        if prune_faces:
+            flat[chunk], degenerate[chunk] = _flat_faces_(triangles)
+        before += _index_entries_(triangles, np.asarray(mesh.bounds), field_split).sum()
+    keep = ~flat
+
+    pruned_mesh = mesh
+    if merged > 0 or not keep.all():
+        pruned_mesh = Trimesh(vertices=vertices, faces=faces[keep], process=False)
+
+    after = before
+    if not keep.all():
+        kept_faces = faces[keep]
+        after = sum(_index_entries_(vertices[kept_faces[start:start + PRUNE_CHUNK_FACES]],
+                                    np.asarray(pruned_mesh.bounds), field_split).sum()
+                    for start in range(0, len(kept_faces), PRUNE_CHUNK_FACES))
+    stats = {
+        "vertical_faces": int(np.sum(flat & ~degenerate)),
+        "degenerate_faces": int(np.sum(degenerate)),
+        "merged_vertices": int(merged),
+        "index_entries": int(after),
+        "index_entries_saved": int(before - after),
+        "index_bytes_saved": int(before - after) * INDEX_ENTRY_BYTES,
+        "scan_saved": float((before - after) / before) if before > 0 else 0.0,
+    }
+    return pruned_mesh, stats
+
+
 class CustomTriMesh:
     @timed
-    def __init__(self, mesh: Trimesh, field_split=1000):
+    def __init__(self, mesh: Trimesh, field_split=1000, prune_faces: bool = True, merge_vertices: bool = False,
+                 verbose: bool = True):
         """
         A utility wrapper for a Trimesh Object
         Args:
             mesh: A Trimesh object that this utilit class wraps
             field_split: an integer value of how many boxes to split the search field into when looking for points
+            prune_faces: whether to drop the vertical and degenerate faces before indexing, see prune_mesh()
+            merge_vertices: whether to merge vertices with identical positions before indexing
+            verbose: whether to print progress and what pruning dropped
         """
-        print("Instantiating the mesh")
+        if verbose:
+            print("Instantiating the mesh")
+        self.pruning = None
+        if prune_faces or merge_vertices:
+            mesh, self.pruning = prune_mesh(mesh, field_split, prune_faces=prune_faces, merge_vertices=merge_vertices)
+            pruned = self.pruning["vertical_faces"] or self.pruning["degenerate_faces"] or self.pruning["merged_vertices"]
+            if verbose and pruned:
+                print(_format_pruning_(self.pruning))
         self.mesh = mesh
 
         self.search_field = np.empty(shape=(field_split, field_split), dtype=list)
@@ -76,6 +209,12 @@ class CustomTriMesh:
         x_idx = int((x - self.min_x) // self.x_bin_size)
         y_idx = int((y - self.min_y) // self.y_bin_size)
 
+        # Points on the max edge of the bounding box belong in the last bin
+        if x_idx == self.search_field.shape[0] and x <= self.max_x:
+            x_idx -= 1
+        if y_idx == self.search_field.shape[1] and y <= self.max_y:
+            y_idx -= 1
+
         return x_idx, y_idx
 
     def _image_indices_to_mesh_coordinates(self, x_idx: np.ndarray[int] | int, y_idx: np.ndarray[int] | int) \
@@ -195,7 +334,8 @@ class CustomTriMesh:
             otherwise
         """
         if self.original_image is None:
-            self._build_image_representation()
+            with phase("image_build"):
+                self._build_image_representation()
 
         self.current_image = self.original_image.copy()
         self.image_coords = []
@@ -291,9 +431,14 @@ class CustomTriMesh:
         out_simplices = []
         x_idx, y_idx = self._get_bin_indices_(x, y)
 
-        if x_idx < self.search_field.shape[0] and y_idx < self.search_field.shape[1]:
+        if 0 <= x_idx < self.search_field.shape[0] and 0 <= y_idx < self.search_field.shape[1]:
             faces = self.search_field[x_idx][y_idx]
-            if faces is not None:
+            if faces is not None and geometry.JIT_ENABLED:
+                # Check every candidate in one compiled loop
+                triangles = self.mesh.triangles[faces]
+                hits = geometry._triangles_hit_kernel_(float(x), float(y), triangles)
+                out_simplices = [(t[0], t[1], t[2]) for t in triangles[hits]]
+            elif faces is not None:
                 for face_idx in self.search_field[x_idx][y_idx]:
                     face = self.mesh.faces[face_idx]
                     v1 = self.mesh.vertices[face[0]]
@@ -324,7 +469,10 @@ class CustomTriMesh:
             v2 = face[1]
             v3 = face[2]
 
+            # Vertical faces have no single depth under the point
             z = triangular_plane_intercept(x, y, v1, v2, v3)
+            if np.isnan(z):
+                continue
             if max_z is None or z > max_z:
                 max_z = z
 
@@ -341,3 +489,41 @@ class CustomTriMesh:
     @property
     def vertices(self):
         return self.mesh.vertices
+
+
+def _format_pruning_(stats: dict) -> str:
+    """
+    Describes what prune_mesh() dropped and saved
+
+    Args:
+        stats: the stats from prune_mesh()
+
+    Returns:
+        text: a one line summary
+    """
+    return f"Pruned {stats['vertical_faces']} vertical and {stats['degenerate_faces']} degenerate faces and merged " \
+        f"{stats['merged_vertices']} vertices: {stats['index_entries_saved']} fewer index entries " \
+        f"({stats['index_bytes_saved'] / 1024:.1f} KiB) and {stats['scan_saved']:.1%} fewer candidate checks"
+
+
+def load_mesh(data_file: str, field_split: int = 1000, merge_vertices: bool = False,
+              verbose: bool = True) -> CustomTriMesh:
+    """
+    Imports the data file, or generates a synthetic mesh, and builds its search index
+
+    Args:
+        data_file: a 3D data file, or a synthetic:<faces>[:<terrain>[:<seed>]] spec
+        field_split: the number of search bins along each axis
+        merge_vertices: whether to merge vertices with identical positions before indexing
+        verbose: whether to print progress while indexing
+
+    Returns:
+        mesh: the indexed mesh
+    """
+    with phase("mesh_load"):
+        if data_file.startswith(SYNTHETIC_PREFIX):
+            raw_mesh = synthetic_from_spec(data_file)
+        else:
+            raw_mesh = trimesh.load(data_file)
+    with phase("index_build"):
+        return CustomTriMesh(raw_mesh, field_split=field_split, merge_vertices=merge_vertices, verbose=verbose)
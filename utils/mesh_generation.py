@@ -0,0 +1,414 @@
+"""
+Declares and maintains generators of synthetic bathymetry meshes, used for load testing and benchmarking at any scale
+without external data.
+
+A mesh can be written to an STL file from the command line:
+    python -m utils.mesh_generation seabed.stl --faces 1M --terrain perlin --channels 2 --trenches 1 --overhangs 5
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+from trimesh import Trimesh
+
+FACE_COUNT_SUFFIXES = {"k": 1e3, "m": 1e6}
+TERRAINS = ["fractal", "perlin", "flat"]
+SYNTHETIC_PREFIX = "synthetic:"
+
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (9,)),
+    ("attributes", "<u2"),
+])
+
+
+def parse_face_count(face_count: str) -> int:
+    """
+    Parses a face count such as 10k or 1M
+
+    Args:
+        face_count: the face count, optionally with a k or M suffix
+
+    Returns:
+        num_faces: the face count as an integer
+    """
+    suffix = face_count[-1].lower()
+    if suffix in FACE_COUNT_SUFFIXES:
+        return int(float(face_count[:-1]) * FACE_COUNT_SUFFIXES[suffix])
+    return int(face_count)
+
+
+def fractal_terrain(n: int, rng: np.random.Generator, beta: float = 3.0) -> np.ndarray:
+    """
+    Builds a fractal (fractional Brownian) surface by spectral synthesis: random phases with an amplitude that falls off
+    as a power of the spatial frequency
+
+    Args:
+        n: the number of grid points along each side
+        rng: the random number generator
+        beta: the spectral exponent. Higher values give smoother terrain.
+
+    Returns:
+        heights: an n by n array scaled to [-1, 1]
+    """
+    kx = np.fft.fftfreq(n)[:, None]
+    ky = np.fft.fftfreq(n)[None, :]
+    k = np.sqrt(kx ** 2 + ky ** 2)
+    k[0, 0] = 1
+    amplitude = k ** (-beta / 2)
+    amplitude[0, 0] = 0
+
+    spectrum = amplitude * np.exp(2j * np.pi * rng.random((n, n)))
+    heights = np.real(np.fft.ifft2(spectrum))
+    return _normalise_(heights)
+
+
+def perlin_terrain(n: int, rng: np.random.Generator, cells: int = 4, octaves: int = 5,
+                   persistence: float = 0.5) -> np.ndarray:
+    """
+    Builds a surface from octaves of Perlin gradient noise
+
+    Args:
+        n: the number of grid points along each side
+        rng: the random number generator
+        cells: the number of lattice cells along each side in the first octave
+        octaves: the number of octaves. Each doubles the lattice resolution.
+        persistence: the amplitude ratio between successive octaves
+
+    Returns:
+        heights: an n by n array scaled to [-1, 1]
+    """
+    coords = np.linspace(0, 1, n, endpoint=False)
+    heights = np.zeros((n, n))
+    amplitude = 1.0
+    for octave in range(octaves):
+        octave_cells = cells * 2 ** octave
+        heights += amplitude * _perlin_octave_(coords, octave_cells, rng)
+        amplitude *= persistence
+    return _normalise_(heights)
+
+
+def _perlin_octave_(coords: np.ndarray, cells: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Evaluates one octave of Perlin noise on a square grid
+
+    Args:
+        coords: the normalised [0, 1) grid coordinates along one side
+        cells: the number of lattice cells along each side
+        rng: the random number generator
+
+    Returns:
+        noise: a square array of noise values
+    """
+    angles = rng.uniform(0, 2 * np.pi, (cells + 1, cells + 1))
+    grad_x = np.cos(angles)
+    grad_y = np.sin(angles)
+
+    pos = coords * cells
+    idx = np.minimum(pos.astype(int), cells - 1)
+    frac = pos - idx
+
+    x0 = idx[:, None]
+    y0 = idx[None, :]
+    fx = frac[:, None]
+    fy = frac[None, :]
+
+    def corner(dx, dy):
+        return grad_x[x0 + dx, y0 + dy] * (fx - dx) + grad_y[x0 + dx, y0 + dy] * (fy - dy)
+
+    # Quintic fade curve
+    u = fx ** 3 * (fx * (fx * 6 - 15) + 10)
+    v = fy ** 3 * (fy * (fy * 6 - 15) + 10)
+
+    bottom = corner(0, 0) + u * (corner(1, 0) - corner(0, 0))
+    top = corner(0, 1) + u * (corner(1, 1) - corner(0, 1))
+    return bottom + v * (top - bottom)
+
+
+def _normalise_(heights: np.ndarray) -> np.ndarray:
+    """
+    Scales an array to [-1, 1]
+
+    Args:
+        heights: the array to scale
+
+    Returns:
+        heights: the scaled array
+    """
+    span = heights.max() - heights.min()
+    if span == 0:
+        return np.zeros_like(heights)
+    return 2 * (heights - heights.min()) / span - 1
+
+
+def _distance_to_segment_(xs: np.ndarray, ys: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Calculates the distance of every grid point to a line segment
+
+    Args:
+        xs: the x coordinates of the grid
+        ys: the y coordinates of the grid
+        start: the [x y] start of the segment
+        end: the [x y] end of the segment
+
+    Returns:
+        distances: an array shaped like xs
+    """
+    direction = end - start
+    t = ((xs - start[0]) * direction[0] + (ys - start[1]) * direction[1]) / np.dot(direction, direction)
+    t = np.clip(t, 0, 1)
+    return np.hypot(xs - (start[0] + t * direction[0]), ys - (start[1] + t * direction[1]))
+
+
+def _random_segment_(rng: np.random.Generator, size: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Picks a segment that crosses most of the mesh, from one side to the opposite side
+
+    Args:
+        rng: the random number generator
+        size: the side length of the mesh
+
+    Returns:
+        (start, end): the [x y] end points of the segment
+    """
+    if rng.random() < 0.5:
+        start = np.asarray([0, rng.uniform(0, size)])
+        end = np.asarray([size, rng.uniform(0, size)])
+    else:
+        start = np.asarray([rng.uniform(0, size), 0])
+        end = np.asarray([rng.uniform(0, size), size])
+    return start, end
+
+
+def carve_channel(xs: np.ndarray, ys: np.ndarray, zs: np.ndarray, start: np.ndarray, end: np.ndarray,
+                  width: float, depth: float) -> np.ndarray:
+    """
+    Carves a smooth, U shaped channel into a heightfield
+
+    Args:
+        xs: the x coordinates of the grid
+        ys: the y coordinates of the grid
+        zs: the heights of the grid
+        start: the [x y] start of the channel
+        end: the [x y] end of the channel
+        width: the distance from the channel centre at which it is 1/e of its full depth
+        depth: the depth of the channel centre below the surrounding seabed
+
+    Returns:
+        zs: the carved heights
+    """
+    distance = _distance_to_segment_(xs, ys, start, end)
+    return zs - depth * np.exp(-(distance / width) ** 2)
+
+
+def carve_trench(xs: np.ndarray, ys: np.ndarray, zs: np.ndarray, start: np.ndarray, end: np.ndarray,
+                 half_width: float, depth: float) -> np.ndarray:
+    """
+    Carves a steep, V shaped trench into a heightfield
+
+    Args:
+        xs: the x coordinates of the grid
+        ys: the y coordinates of the grid
+        zs: the heights of the grid
+        start: the [x y] start of the trench
+        end: the [x y] end of the trench
+        half_width: the distance from the trench centre to its edge
+        depth: the depth of the trench centre below the surrounding seabed
+
+    Returns:
+        zs: the carved heights
+    """
+    distance = _distance_to_segment_(xs, ys, start, end)
+    return zs - depth * np.clip(1 - distance / half_width, 0, None)
+
+
+def heightfield_to_mesh(xs: np.ndarray, ys: np.ndarray, zs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Triangulates a regular grid heightfield, two upward facing triangles per grid cell
+
+    Args:
+        xs: an n by n array of x coordinates, indexed [x index, y index]
+        ys: an n by n array of y coordinates
+        zs: an n by n array of heights
+
+    Returns:
+        (vertices, faces): a (n * n, 3) float array and a (2 * (n - 1) ** 2, 3) int array
+    """
+    n = xs.shape[0]
+    vertices = np.column_stack((xs.ravel(), ys.ravel(), zs.ravel()))
+    idx = np.arange(n * n).reshape(n, n)[:-1, :-1].ravel()
+    faces = np.concatenate((
+        np.column_stack((idx, idx + n, idx + n + 1)),
+        np.column_stack((idx, idx + n + 1, idx + 1)),
+    ))
+    return vertices, faces
+
+
+def overhang_ledges(xs: np.ndarray, ys: np.ndarray, zs: np.ndarray, count: int, rng: np.random.Generator,
+                    size: float, clearance: tuple[float, float] = (1.0, 5.0)) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds flat, square ledges floating above the seabed. A vertical line through a ledge crosses both the ledge and
+    the seabed beneath it, the way it would crossing an overhang, so the shallowest-intercept logic is exercised.
+
+    Args:
+        xs: the x coordinates of the grid
+        ys: the y coordinates of the grid
+        zs: the heights of the grid
+        count: the number of ledges
+        rng: the random number generator
+        size: the side length of each ledge
+        clearance: the (min, max) height of a ledge above the highest seabed point beneath it
+
+    Returns:
+        (vertices, faces): the ledge vertices and faces, with face indices starting at 0
+    """
+    vertices = []
+    faces = []
+    n = xs.shape[0]
+    step = xs[1, 0] - xs[0, 0] if n > 1 else size
+    cells = max(1, int(math.ceil(size / step)))
+    for k in range(count):
+        i = rng.integers(0, max(1, n - cells))
+        j = rng.integers(0, max(1, n - cells))
+        x0, y0 = xs[i, j], ys[i, j]
+        z = zs[i:i + cells + 1, j:j + cells + 1].max() + rng.uniform(*clearance)
+        vertices.extend([(x0, y0, z), (x0 + size, y0, z), (x0 + size, y0 + size, z), (x0, y0 + size, z)])
+        base = 4 * k
+        faces.extend([(base, base + 1, base + 2), (base, base + 2, base + 3)])
+    return np.asarray(vertices, dtype=float).reshape(-1, 3), np.asarray(faces, dtype=int).reshape(-1, 3)
+
+
+def generate_bathymetry(num_faces: int, size: float = 1000.0, terrain: str = "fractal", mean_depth: float = 30.0,
+                        relief: float = 15.0, channels: int = 0, trenches: int = 0, overhangs: int = 0,
+                        seed: int = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a square seabed mesh. The seabed is a heightfield, so only ledges add faces that overlap others.
+
+    Args:
+        num_faces: the approximate number of seabed faces
+        size: the side length of the mesh in meters
+        terrain: one of fractal, perlin, or flat
+        mean_depth: the mean depth of the seabed in meters, before channels and trenches are carved
+        relief: the largest height difference from the mean depth, in meters
+        channels: the number of U shaped channels to carve
+        trenches: the number of V shaped trenches to carve
+        overhangs: the number of floating ledges to add
+        seed: [Optional] a seed for the random number generator
+
+    Returns:
+        (vertices, faces): the vertex and face arrays of the mesh. The seabed is below z = 0.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(2, int(round(math.sqrt(num_faces / 2))) + 1)
+    coords = np.linspace(0, size, n)
+    xs, ys = np.meshgrid(coords, coords, indexing="ij")
+
+    match terrain:
+        case "fractal":
+            heights = fractal_terrain(n, rng)
+        case "perlin":
+            heights = perlin_terrain(n, rng)
+        case "flat":
+            heights = np.zeros((n, n))
+        case _:
+            raise ValueError(f"Unknown terrain '{terrain}'. Choose from {TERRAINS}")
+    zs = -mean_depth + relief * heights
+
+    for _ in range(channels):
+        start, end = _random_segment_(rng, size)
+        zs = carve_channel(xs, ys, zs, start, end, width=size * rng.uniform(0.01, 0.04), depth=relief)
+    for _ in range(trenches):
+        start, end = _random_segment_(rng, size)
+        zs = carve_trench(xs, ys, zs, start, end, half_width=size * rng.uniform(0.005, 0.015), depth=2 * relief)
+
+    vertices, faces = heightfield_to_mesh(xs, ys, zs)
+    if overhangs > 0:
+        ledge_vertices, ledge_faces = overhang_ledges(xs, ys, zs, overhangs, rng, size=size * 0.02)
+        faces = np.concatenate((faces, ledge_faces + len(vertices)))
+        vertices = np.concatenate((vertices, ledge_vertices))
+
+    return vertices, faces
+
+
+def generate_trimesh(num_faces: int, **kwargs) -> Trimesh:
+    """
+    Generates a seabed mesh as a Trimesh, ready to be wrapped by CustomTriMesh
+
+    Args:
+        num_faces: the approximate number of seabed faces
+        **kwargs: the keyword arguments of generate_bathymetry
+
+    Returns:
+        mesh: the generated mesh
+    """
+    vertices, faces = generate_bathymetry(num_faces, **kwargs)
+    return Trimesh(vertices, faces, process=False)
+
+
+def synthetic_from_spec(spec: str) -> Trimesh:
+    """
+    Generates a mesh from a data file argument of the form synthetic:<faces>[:<terrain>[:<seed>]], for example
+    synthetic:1M:perlin:7
+
+    Args:
+        spec: the data file argument
+
+    Returns:
+        mesh: the generated mesh
+    """
+    parts = spec[len(SYNTHETIC_PREFIX):].split(":")
+    num_faces = parse_face_count(parts[0])
+    terrain = parts[1] if len(parts) > 1 and parts[1] else "fractal"
+    seed = int(parts[2]) if len(parts) > 2 else 0
+    return generate_trimesh(num_faces, terrain=terrain, channels=1, trenches=1, seed=seed)
+
+
+def write_stl(filename: str, vertices: np.ndarray, faces: np.ndarray) -> None:
+    """
+    Writes a mesh as a binary STL file. Records are built as one structured array, so this scales to millions of faces.
+
+    Args:
+        filename: the file to write to
+        vertices: the (V, 3) vertex array
+        faces: the (F, 3) face index array
+
+    Returns:
+        None
+    """
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    records = np.zeros(len(faces), dtype=STL_DTYPE)
+    records["normal"] = normals
+    records["vertices"] = triangles.reshape(-1, 9)
+
+    with open(filename, "wb") as f:
+        f.write(b"echo_sounding_simulator synthetic bathymetry".ljust(80, b"\0"))
+        f.write(np.uint32(len(faces)).tobytes())
+        records.tofile(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic bathymetry mesh")
+    parser.add_argument("output", help="The STL file to write")
+    parser.add_argument("--faces", default="100k", help="The approximate number of seabed faces, e.g. 10k, 1M")
+    parser.add_argument("--size", type=float, default=1000.0, help="The side length of the mesh in meters")
+    parser.add_argument("--terrain", choices=TERRAINS, default="fractal", help="The style of the seabed")
+    parser.add_argument("--mean_depth", type=float, default=30.0, help="The mean depth of the seabed in meters")
+    parser.add_argument("--relief", type=float, default=15.0, help="The largest height difference from the mean")
+    parser.add_argument("--channels", type=int, default=0, help="The number of channels to carve")
+    parser.add_argument("--trenches", type=int, default=0, help="The number of trenches to carve")
+    parser.add_argument("--overhangs", type=int, default=0, help="The number of floating ledges to add")
+    parser.add_argument("--seed", type=int, default=None, help="A seed for the random number generator")
+    cli_args = parser.parse_args(sys.argv[1:])
+
+    mesh_vertices, mesh_faces = generate_bathymetry(
+        parse_face_count(cli_args.faces), size=cli_args.size, terrain=cli_args.terrain,
+        mean_depth=cli_args.mean_depth, relief=cli_args.relief, channels=cli_args.channels,
+        trenches=cli_args.trenches, overhangs=cli_args.overhangs, seed=cli_args.seed
+    )
+    write_stl(cli_args.output, mesh_vertices, mesh_faces)
+    print(f"Wrote {len(mesh_faces)} faces to {cli_args.output}")
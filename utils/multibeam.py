@@ -0,0 +1,265 @@
+"""
+Declares and maintains multibeam swath simulation, where each ping fires a fan of slanted beams across the vessel's
+track and every beam is a ray cast against the mesh
+"""
+import itertools
+import math
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from utils.emitters import VectorEmitter
+from utils.error_pipeline import ErrorType, run_pipeline_array
+from utils.mesh import CustomTriMesh
+from utils.profiling import phase
+from utils.report import RunReport, StageTimer
+from utils.scheduling import DeadlineScheduler
+
+# Rays this close to parallel with a face never hit it
+PARALLEL_EPSILON = 1e-12
+
+
+def intersect_rays(origins: np.ndarray, directions: np.ndarray, triangles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Casts every ray against every triangle at once with the Möller–Trumbore algorithm, and finds the nearest hit of
+    each ray. Hits on the edges and vertices of a triangle count, as in point_in_tri.
+
+    Args:
+        origins: an (N, 3) array of ray origins
+        directions: an (N, 3) array of ray directions
+        triangles: an (M, 3, 3) array of the [x y z] vertices of each triangle
+
+    Returns:
+        (distances, faces): (N,) arrays of the distance along each ray to its nearest hit, in multiples of its
+            direction, and the index of the triangle it hit. Rays that hit nothing have an infinite distance and a
+            face of -1.
+    """
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float)
+    if len(triangles) == 0:
+        return np.full(len(origins), np.inf), np.full(len(origins), -1)
+
+    # Components are worked out one at a time, as (N, M) arrays, which is much faster than np.cross on small arrays
+    dx, dy, dz = (directions[:, k, None] for k in range(3))
+    e1x, e1y, e1z = (triangles[:, 1, k] - triangles[:, 0, k] for k in range(3))
+    e2x, e2y, e2z = (triangles[:, 2, k] - triangles[:, 0, k] for k in range(3))
+    sx, sy, sz = (origins[:, k, None] - triangles[:, 0, k] for k in range(3))
+
+    px, py, pz = dy * e2z - dz * e2y, dz * e2x - dx * e2z, dx * e2y - dy * e2x
+    det = e1x * px + e1y * py + e1z * pz
+    parallel = np.abs(det) < PARALLEL_EPSILON
+    inv_det = 1.0 / np.where(parallel, 1.0, det)
+
+    u = (sx * px + sy * py + sz * pz) * inv_det
+    qx, qy, qz = sy * e1z - sz * e1y, sz * e1x - sx * e1z, sx * e1y - sy * e1x
+    v = (dx * qx + dy * qy + dz * qz) * inv_det
+    t = (e2x * qx + e2y * qy + e2z * qz) * inv_det
+
+    hit = ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+    t = np.where(hit, t, np.inf)
+    faces = np.argmin(t, axis=1)
+    distances = t[np.arange(len(origins)), faces]
+    return distances, np.where(np.isfinite(distances), faces, -1)
+
+
+def _bins_on_segment_(mesh: CustomTriMesh, x0: float, y0: float, x1: float, y1: float) -> list[tuple[int, int]]:
+    """
+    Walks the search bins that a line segment passes through, one bin boundary at a time (Amanatides and Woo). Where
+    the segment passes exactly through a bin corner, both bins beside the corner are included too, so every bin that
+    the segment touches is found.
+
+    Args:
+        mesh: the indexed mesh
+        x0: the x of the start of the segment
+        y0: the y of the start of the segment
+        x1: the x of the end of the segment
+        y1: the y of the end of the segment
+
+    Returns:
+        bins: the [x y] indices of the bins, in order along the segment. Bins outside the search field are included.
+    """
+    i, j = mesh._get_bin_indices_(x0, y0)
+    end = mesh._get_bin_indices_(x1, y1)
+    u0, v0 = (x0 - mesh.min_x) / mesh.x_bin_size, (y0 - mesh.min_y) / mesh.y_bin_size
+    du, dv = (x1 - x0) / mesh.x_bin_size, (y1 - y0) / mesh.y_bin_size
+    step_i, step_j = (1 if du > 0 else -1), (1 if dv > 0 else -1)
+
+    # The fraction of the segment to the next bin boundary along each axis, and between boundaries
+    delta_u = abs(1 / du) if du != 0 else math.inf
+    delta_v = abs(1 / dv) if dv != 0 else math.inf
+    next_u = ((i + 1 - u0) if du > 0 else (u0 - i)) * delta_u if du != 0 else math.inf
+    next_v = ((j + 1 - v0) if dv > 0 else (v0 - j)) * delta_v if dv != 0 else math.inf
+
+    bins = [(i, j)]
+    for _ in range(abs(end[0] - i) + abs(end[1] - j)):
+        if (i, j) == end:
+            break
+        if next_u < next_v:
+            i += step_i
+            next_u += delta_u
+        elif next_v < next_u:
+            j += step_j
+            next_v += delta_v
+        else:
+            bins += [(i + step_i, j), (i, j + step_j)]
+            i, j = i + step_i, j + step_j
+            next_u += delta_u
+            next_v += delta_v
+        bins.append((i, j))
+    if bins[-1] != end:
+        bins.append(end)
+    return bins
+
+
+class MultibeamSounder:
+    def __init__(self, mesh: CustomTriMesh, beams: int = 256, swath_angle: float = 120.0):
+        """
+        A multibeam echo sounder: each ping fires a fan of equally spaced beams in the vertical plane across the
+        vessel's track, from straight down to swath_angle / 2 either side
+
+        Args:
+            mesh: the indexed mesh
+            beams: the number of beams per ping
+            swath_angle: the angle in degrees between the outermost beams. Must be between 0 and 180.
+        """
+        if beams < 1:
+            raise ValueError("A multibeam sounder needs at least one beam")
+        if not 0 <= swath_angle < 180:
+            raise ValueError("The swath angle must be at least 0 and less than 180 degrees")
+        self.mesh = mesh
+        self.beams = beams
+        self.swath_angle = swath_angle
+
+        self.beam_angles = np.radians(np.linspace(-swath_angle / 2, swath_angle / 2, beams))
+        # Cast from above the mesh so the nadir beam of a flat mesh still starts off its surface
+        self.surface_z = float(mesh.bounds[1][2]) + 1.0
+        self.reach = (self.surface_z - float(mesh.bounds[0][2])) * math.tan(math.radians(swath_angle / 2))
+        self.triangles = np.asarray(mesh.vertices)[np.asarray(mesh.faces)]
+
+    def _candidate_faces_(self, x: float, y: float, across: np.ndarray) -> np.ndarray:
+        """
+        Finds the faces that a ping's beams could hit: those indexed in the bins under the swath that cross its plane
+
+        Args:
+            x: the x position of the vessel
+            y: the y position of the vessel
+            across: the unit [x y] vector across the track
+
+        Returns:
+            faces: the indices of the candidate faces
+        """
+        nx, ny = self.mesh.search_field.shape
+        start_x, start_y = x - self.reach * across[0], y - self.reach * across[1]
+        end_x, end_y = x + self.reach * across[0], y + self.reach * across[1]
+        bins = [(i, j) for i, j in _bins_on_segment_(self.mesh, start_x, start_y, end_x, end_y)
+                if 0 <= i < nx and 0 <= j < ny]
+        lists = [self.mesh.search_field[i][j] for i, j in bins]
+        faces = np.fromiter(itertools.chain.from_iterable(f for f in lists if f is not None), dtype=np.int64)
+        if len(faces) == 0:
+            return faces
+        faces = np.unique(faces)
+
+        # Keep the faces with vertices on both sides of, or on, the swath plane
+        along = np.asarray([across[1], -across[0]])
+        side = (self.triangles[faces, :, :2] - (x, y)) @ along
+        return faces[(side.min(axis=1) <= 0) & (side.max(axis=1) >= 0)]
+
+    def ping(self, x: float, y: float, heading: tuple[float, float] = (0.0, 1.0)) -> np.ndarray:
+        """
+        Fires every beam of a ping and finds where each one meets the mesh
+
+        Args:
+            x: the x position of the vessel
+            y: the y position of the vessel
+            heading: the [x y] direction the vessel is travelling in
+
+        Returns:
+            soundings: a (beams, 3) array of the [x y z] point each beam hit, nan for beams that missed the mesh
+        """
+        heading = np.asarray(heading, dtype=float)
+        norm = np.hypot(*heading)
+        heading = heading / norm if norm > 0 else np.asarray([0.0, 1.0])
+        across = np.asarray([heading[1], -heading[0]])
+
+        triangles = self.triangles[self._candidate_faces_(x, y, across)]
+        directions = np.column_stack((np.sin(self.beam_angles) * across[0], np.sin(self.beam_angles) * across[1],
+                                      -np.cos(self.beam_angles)))
+        origins = np.broadcast_to(np.asarray([x, y, self.surface_z]), directions.shape)
+
+        distances, _ = intersect_rays(origins, directions, triangles)
+        return origins + directions * np.where(np.isfinite(distances), distances, np.nan)[:, None]
+
+
+def positions_with_headings(path: Iterable[tuple[float, float]]) -> Iterator[tuple[float, float, tuple[float, float]]]:
+    """
+    Pairs each position of a path with the direction the vessel arrived from, or for the first position, the direction
+    it leaves in
+
+    Args:
+        path: an iterator of [x y] positions
+
+    Yields:
+        (x, y, heading): each position and the [x y] direction of travel
+    """
+    path = iter(path)
+    previous = next(path, None)
+    if previous is None:
+        return
+    current = next(path, None)
+    if current is None:
+        yield previous[0], previous[1], (0.0, 1.0)
+        return
+    yield previous[0], previous[1], (current[0] - previous[0], current[1] - previous[1])
+    while current is not None:
+        yield current[0], current[1], (current[0] - previous[0], current[1] - previous[1])
+        previous, current = current, next(path, None)
+
+
+def sample_swaths(sounder: MultibeamSounder, path: Iterable[tuple[float, float]], error_pipeline: list[ErrorType],
+                  emitter: VectorEmitter, scheduler: DeadlineScheduler, report: RunReport) -> None:
+    """
+    Runs a multibeam sampling path: pings at each position, runs the soundings of every beam that hit the mesh through
+    the error pipeline together, and emits them, on the scheduler's cadence
+
+    Args:
+        sounder: the MultibeamSounder to ping with
+        path: an iterator that yields x and y coordinates
+        error_pipeline: a list of ErrorType objects
+        emitter: the VectorEmitter to emit to, which is told the path position of each ping it emits
+        scheduler: a DeadlineScheduler that paces every ping
+        report: a RunReport to record the run's performance in, with one sample per ping
+
+    Returns:
+        None
+    """
+    timer = StageTimer(report, "sample_swaths")
+    report.start()
+    scheduler.start()
+    with phase("sampling"):
+        for position, (x, y, heading) in enumerate(positions_with_headings(path)):
+            if not scheduler.wait():
+                report.record_skip()
+                continue
+
+            timer.start()
+            soundings = sounder.ping(x, y, heading)
+            soundings = soundings[~np.isnan(soundings[:, 2])]
+            timer.lap("ray_query")
+            if len(soundings) == 0:
+                report.record_sample(emitted=False, off_mesh=True)
+            else:
+                new_vectors = run_pipeline_array(error_pipeline, soundings)
+                timer.lap("error_pipeline")
+
+                with phase("emission"):
+                    emitter.set_position(position)
+                    emitter.emit_vectors(new_vectors)
+
+                timer.lap("emission")
+                timer.total("ping")
+                report.record_sample(emitted=True)
+
+            lateness = scheduler.complete()
+            if scheduler.paced:
+                report.record_deadline(lateness)
+    report.stop()
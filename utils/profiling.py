@@ -0,0 +1,247 @@
+"""
+Declares and maintains the built-in profiler, and the phase markers that attribute profiled time to the simulator's
+subsystems (mesh load, index build, image build, sampling, emission)
+"""
+import cProfile
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_MODES = ["cprofile", "sample"]
+
+# The running profiler, if any. Phase markers do nothing without one.
+_active = None
+
+
+class _PhaseContext:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        """
+        Times one entry into a phase on the current thread
+
+        Args:
+            profiler: the running profiler
+            name: the name of the phase
+        """
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.profiler.enter_phase_(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.profiler.exit_phase_(self.name, time.perf_counter() - self.start)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name: str):
+    """
+    Marks a block of code as belonging to a phase of the simulation, for example:
+
+        with phase("index_build"):
+            mesh = CustomTriMesh(raw_mesh)
+
+    Phases nest, so time spent in an inner phase is also counted in the total, but not the self time, of the outer one.
+
+    Args:
+        name: the name of the phase
+
+    Returns:
+        context: a context manager that attributes its block to the phase while a profiler is running
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _PhaseContext(_active, name)
+
+
+class Profiler:
+    def __init__(self, mode: str, output_prefix: str = "profile", interval: float = 0.005):
+        """
+        Profiles a whole run. Both modes run a sampling thread that periodically captures the stack of every other
+        thread and writes them as collapsed stacks (one "frame;frame;frame count" line per distinct stack) for
+        flamegraph tools. Each stack is rooted at the phases that were active when it was captured. The cprofile mode
+        additionally traces every call with cProfile and writes the statistics in pstats format.
+
+        Output files:
+            <prefix>.pstats - cProfile statistics (cprofile mode only)
+            <prefix>.collapsed - collapsed stacks
+            <prefix>.phases.json - call counts, total, and self time of each phase
+
+        Args:
+            mode: "cprofile" or "sample"
+            output_prefix: the path prefix of the output files
+            interval: the number of seconds between stack samples
+
+        Raises:
+            ValueError if the mode is unknown
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.output_prefix = output_prefix
+        self.interval = interval
+
+        self.stacks = collections.Counter()
+        self.phase_stacks = {}
+        self.phase_child_secs = {}
+        self.phase_calls = collections.Counter()
+        self.phase_total_secs = collections.Counter()
+        self.phase_self_secs = collections.Counter()
+
+        self._profile = None
+        self._sampler = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """
+        Starts profiling, and makes this the profiler that phase markers report to
+
+        Returns:
+            None
+        """
+        global _active
+        _active = self
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop_, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> list[str]:
+        """
+        Stops profiling and writes the output files
+
+        Returns:
+            paths: the files that were written
+        """
+        global _active
+        if self._profile is not None:
+            self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        if _active is self:
+            _active = None
+
+        paths = []
+        if self._profile is not None:
+            paths.append(f"{self.output_prefix}.pstats")
+            self._profile.dump_stats(paths[-1])
+
+        paths.append(f"{self.output_prefix}.collapsed")
+        with open(paths[-1], "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        paths.append(f"{self.output_prefix}.phases.json")
+        with open(paths[-1], "w") as f:
+            json.dump(self.phase_summary(), f, indent=4)
+        return paths
+
+    def enter_phase_(self, name: str) -> None:
+        """
+        Pushes a phase onto the current thread's phase stack
+
+        Args:
+            name: the name of the phase
+
+        Returns:
+            None
+        """
+        ident = threading.get_ident()
+        # The sampler reads these lists from another thread, so they are replaced rather than mutated
+        self.phase_stacks[ident] = self.phase_stacks.get(ident, []) + [name]
+        self.phase_child_secs.setdefault(ident, []).append(0.0)
+
+    def exit_phase_(self, name: str, elapsed: float) -> None:
+        """
+        Pops a phase off the current thread's phase stack and records its duration
+
+        Args:
+            name: the name of the phase
+            elapsed: the number of seconds spent in it
+
+        Returns:
+            None
+        """
+        ident = threading.get_ident()
+        self.phase_stacks[ident] = self.phase_stacks[ident][:-1]
+        child_secs = self.phase_child_secs[ident]
+        self.phase_calls[name] += 1
+        self.phase_total_secs[name] += elapsed
+        self.phase_self_secs[name] += elapsed - child_secs.pop()
+        if child_secs:
+            child_secs[-1] += elapsed
+
+    def phase_summary(self) -> dict:
+        """
+        Summarises the time spent in each phase
+
+        Returns:
+            summary: a mapping of phase name to its calls, total seconds, self seconds, and stack sample count
+        """
+        samples = collections.Counter()
+        for stack, count in self.stacks.items():
+            for frame in stack:
+                if frame.startswith("phase:"):
+                    samples[frame[len("phase:"):]] += count
+        return {
+            name: {
+                "calls": self.phase_calls[name],
+                "total_secs": self.phase_total_secs[name],
+                "self_secs": self.phase_self_secs[name],
+                "samples": samples[name],
+            }
+            for name in self.phase_calls
+        }
+
+    def format_text(self) -> str:
+        """
+        Formats the phase summary as a table
+
+        Returns:
+            table: the formatted summary
+        """
+        lines = [f"{'phase':<24}{'calls':>10}{'total s':>12}{'self s':>12}{'samples':>10}"]
+        for name, s in self.phase_summary().items():
+            lines.append(f"{name:<24}{s['calls']:>10}{s['total_secs']:>12.3f}{s['self_secs']:>12.3f}"
+                         f"{s['samples']:>10}")
+        return "\n".join(lines)
+
+    def _sample_loop_(self) -> None:
+        """
+        Captures the stacks of every other thread until stopped
+
+        Returns:
+            None
+        """
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                phases = tuple(f"phase:{p}" for p in self.phase_stacks.get(ident, ()))
+                self.stacks[phases + tuple(reversed(frames))] += 1
@@ -0,0 +1,396 @@
+"""
+Declares and maintains the end-of-run performance report: throughput, per-stage latencies, real-time deadlines, and
+memory use
+"""
+import json
+import math
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+from utils.timing import LatencyHistogram, registry
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Finds the peak resident set size of this process
+
+    Returns:
+        peak_rss: the peak resident memory in bytes, or None if the platform cannot report it
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RunReport:
+    def __init__(self, sample_rate: float = None, name: str = None, record_stages: bool = True):
+        """
+        Collects the performance of a sampling run. Stage latencies are kept in histograms, so the report costs the
+        same at any run length.
+
+        Args:
+            sample_rate: [Optional] the requested sample rate in Hertz, reported next to the achieved rate
+            name: [Optional] a name for the run, like a vessel name
+            record_stages: whether to time the stages of each sample. Runs whose report is not shown leave them out,
+                so the per-sample timing cost is only paid when it was asked for.
+        """
+        self.sample_rate = sample_rate
+        self.name = name
+        self.record_stages = record_stages
+        self.stages = {}
+        self.samples = 0
+        self.emitted = 0
+        self.off_mesh = 0
+        self.skipped = 0
+        self.deadlines = 0
+        self.missed_deadlines = 0
+        self.worst_lateness = 0.0
+        self.sampling_secs = 0.0
+        self.lookups = {}
+        self._started = None
+
+    def start(self) -> None:
+        """
+        Starts timing a sampling pass. Only time between start and stop counts towards throughput, so set up and
+        waiting for user input are left out.
+
+        Returns:
+            None
+        """
+        self._started = time.perf_counter()
+
+    def stop(self) -> None:
+        """
+        Stops timing a sampling pass
+
+        Returns:
+            None
+        """
+        if self._started is not None:
+            self.sampling_secs += time.perf_counter() - self._started
+            self._started = None
+
+    def record_stage(self, stage: str, secs: float) -> None:
+        """
+        Records how long a stage of a sample took
+
+        Args:
+            stage: the name of the stage, like depth_lookup or emission
+            secs: the duration in seconds
+
+        Returns:
+            None
+        """
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.record(secs)
+
+    def record_sample(self, emitted: bool, off_mesh: bool = False) -> None:
+        """
+        Counts a processed position
+
+        Args:
+            emitted: whether a vector was emitted for it
+            off_mesh: whether the position was off the mesh
+
+        Returns:
+            None
+        """
+        self.samples += 1
+        if emitted:
+            self.emitted += 1
+        if off_mesh:
+            self.off_mesh += 1
+
+    def record_samples(self, count: int, emitted: int) -> None:
+        """
+        Counts a batch of processed positions, all of them on the mesh
+
+        Args:
+            count: the number of positions processed
+            emitted: how many of them had a vector emitted
+
+        Returns:
+            None
+        """
+        self.samples += count
+        self.emitted += emitted
+
+    def record_skip(self) -> None:
+        """
+        Counts a position that was skipped because the run fell behind
+
+        Returns:
+            None
+        """
+        self.skipped += 1
+
+    def record_deadline(self, lateness: float) -> None:
+        """
+        Records how a sample did against its real-time deadline
+
+        Args:
+            lateness: the number of seconds the sample finished after its deadline, negative or zero if it was on time
+
+        Returns:
+            None
+        """
+        self.deadlines += 1
+        if lateness > 0:
+            self.missed_deadlines += 1
+            if lateness > self.worst_lateness:
+                self.worst_lateness = lateness
+
+    def record_lookups(self, stats: dict) -> None:
+        """
+        Records how the depth lookups of the run were answered, replacing any earlier record
+
+        Args:
+            stats: the lookup counters and hit rate of the run's sounder, like CoherentLookup.stats()
+
+        Returns:
+            None
+        """
+        self.lookups = dict(stats)
+
+    def merge(self, other: "RunReport") -> None:
+        """
+        Adds the counts and latencies of another report to this one. The sampling time is the longest of the two, as
+        merged runs are expected to have run at the same time. Lookup counters are summed, and the hit rate is the mean
+        of the two weighted by their samples, as every sample is one lookup.
+
+        Args:
+            other: the report to merge in
+
+        Returns:
+            None
+        """
+        for stage, histogram in other.stages.items():
+            if stage not in self.stages:
+                self.stages[stage] = LatencyHistogram()
+            self.stages[stage].merge(histogram)
+        if other.lookups:
+            self._merge_lookups_(other)
+        self.samples += other.samples
+        self.emitted += other.emitted
+        self.off_mesh += other.off_mesh
+        self.skipped += other.skipped
+        self.deadlines += other.deadlines
+        self.missed_deadlines += other.missed_deadlines
+        self.worst_lateness = max(self.worst_lateness, other.worst_lateness)
+        self.sampling_secs = max(self.sampling_secs, other.sampling_secs)
+
+    def _merge_lookups_(self, other: "RunReport") -> None:
+        """
+        Adds the lookup counters of another report to this one's and recomputes the hit rate
+
+        Args:
+            other: the report to merge in
+
+        Returns:
+            None
+        """
+        weight = self.samples if self.lookups else 0
+        total = weight + other.samples
+        hits = self.lookups.get("hit_rate", 0.0) * weight + other.lookups["hit_rate"] * other.samples
+        for key, value in other.lookups.items():
+            if key != "hit_rate":
+                self.lookups[key] = self.lookups.get(key, 0) + value
+        self.lookups["hit_rate"] = hits / total if total > 0 else 0.0
+
+    def summary(self) -> dict:
+        """
+        Summarises the run
+
+        Returns:
+            summary: the sample counts, throughput, stage latency summaries, deadline statistics, and peak memory
+        """
+        return {
+            "name": self.name,
+            "samples": self.samples,
+            "emitted": self.emitted,
+            "off_mesh": self.off_mesh,
+            "skipped": self.skipped,
+            "sampling_secs": self.sampling_secs,
+            "samples_per_sec": self.samples / self.sampling_secs if self.sampling_secs > 0 else math.nan,
+            "requested_sample_rate": self.sample_rate,
+            "stages": {stage: h.summary() for stage, h in self.stages.items()},
+            "deadlines": {
+                "checked": self.deadlines,
+                "missed": self.missed_deadlines,
+                "worst_lateness_secs": self.worst_lateness,
+            },
+            "lookups": self.lookups,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    def format_text(self) -> str:
+        """
+        Formats the summary for the console, with durations in milliseconds
+
+        Returns:
+            text: the formatted summary
+        """
+        s = self.summary()
+        rate = f"{s['samples_per_sec']:.1f}/s"
+        if self.sample_rate:
+            rate += f" (requested {self.sample_rate:g}/s)"
+        rss = f"{s['peak_rss_bytes'] / 2 ** 20:.1f} MiB" if s["peak_rss_bytes"] is not None else "unknown"
+        lines = [
+            f"Run report{f' for {self.name}' if self.name else ''}",
+            f"  samples:          {self.samples} ({self.emitted} emitted, {self.off_mesh} off the mesh, "
+            f"{self.skipped} skipped)",
+            f"  sampling time:    {self.sampling_secs:.3f} s",
+            f"  throughput:       {rate}",
+            f"  missed deadlines: {self.missed_deadlines} of {self.deadlines}, worst {self.worst_lateness * 1e3:.3f} ms late",
+            f"  peak rss:         {rss}",
+        ]
+        if self.lookups:
+            counts = ", ".join(f"{k} {v}" for k, v in self.lookups.items() if k != "hit_rate")
+            lines.append(f"  lookups:          {self.lookups['hit_rate']:.1%} hit rate ({counts})")
+        lines.append(f"  {'stage':<22}{'count':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, h in s["stages"].items():
+            lines.append(f"  {stage:<22}{h['count']:>10}{h['p50_secs'] * 1e3:>10.3f}{h['p95_secs'] * 1e3:>10.3f}"
+                         f"{h['p99_secs'] * 1e3:>10.3f}{h['max_secs'] * 1e3:>10.3f}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the summary to a json file
+
+        Args:
+            path: the file to write to
+
+        Returns:
+            None
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+class FleetReport:
+    def __init__(self, reports: list[RunReport]):
+        """
+        Combines the reports of vessels that sampled at the same time. The combined throughput is the total number of
+        samples over the longest vessel's sampling time.
+
+        Args:
+            reports: the report of each vessel
+        """
+        self.reports = reports
+        self.combined = RunReport(name="fleet")
+        for report in reports:
+            self.combined.merge(report)
+        rates = [r.sample_rate for r in reports if r.sample_rate is not None]
+        self.combined.sample_rate = sum(rates) if rates else None
+
+    def summary(self) -> dict:
+        """
+        Summarises the fleet
+
+        Returns:
+            summary: the combined summary and the summary of each vessel
+        """
+        return {"fleet": self.combined.summary(), "vessels": [r.summary() for r in self.reports]}
+
+    def format_text(self) -> str:
+        """
+        Formats the combined report followed by each vessel's report
+
+        Returns:
+            text: the formatted reports
+        """
+        return "\n".join([self.combined.format_text()] + [r.format_text() for r in self.reports])
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the summary to a json file
+
+        Args:
+            path: the file to write to
+
+        Returns:
+            None
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+class StageTimer:
+    def __init__(self, report: RunReport, prefix: str):
+        """
+        Times the stages of each sample of a sampling loop, recording them in the run report if it records stages, and
+        in the metrics registry under <prefix>.<stage> if metrics are enabled. When neither wants them, nothing is
+        timed.
+
+        Args:
+            report: the RunReport of the run
+            prefix: the name of the sampling loop, to name its stages in the metrics registry
+        """
+        self.report = report
+        self.prefix = prefix
+        self.enabled = report.record_stages or registry.enabled
+        self._start = 0.0
+        self._last = 0.0
+
+    def start(self) -> None:
+        """
+        Starts timing a sample
+
+        Returns:
+            None
+        """
+        if self.enabled:
+            self._start = self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """
+        Records the time since the last lap, or the start of the sample, against a stage
+
+        Args:
+            stage: the name of the stage that just finished, like depth_lookup
+
+        Returns:
+            None
+        """
+        if self.enabled:
+            now = time.perf_counter()
+            self._record_(stage, now - self._last)
+            self._last = now
+
+    def total(self, stage: str) -> None:
+        """
+        Records the time since the start of the sample against a stage
+
+        Args:
+            stage: the name of the whole sample, like sample
+
+        Returns:
+            None
+        """
+        if self.enabled:
+            self._record_(stage, time.perf_counter() - self._start)
+
+    def _record_(self, stage: str, secs: float) -> None:
+        """
+        Records a duration wherever it was asked for
+
+        Args:
+            stage: the name of the stage
+            secs: the duration in seconds
+
+        Returns:
+            None
+        """
+        if self.report.record_stages:
+            self.report.record_stage(stage, secs)
+        if registry.enabled:
+            registry.record(f"{self.prefix}.{stage}", secs)
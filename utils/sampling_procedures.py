@@ -1,10 +1,13 @@
 """
 Declares and maintains utility functions for different sampling types
 """
+import itertools
+
 import numpy as np
 
 from utils.error_pipeline import run_pipeline
-from utils.timing import timed
+from utils.profiling import phase
+from utils.report import StageTimer
 
 
 def calculate_step_value(sample_rate: float, velocity: float) -> float:
@@ -133,15 +136,100 @@ def drawn_path_sampling_generator(path_coords: list[tuple[float, float]], sample
                 dist_to_travel = 0
 
 
-@timed
-def process_position(mesh, x, y, error_pipeline):
-    z = mesh.get_shallowest_depth(x, y)
-    if z is not None:
-        return run_pipeline(error_pipeline, (x, y, z))
-    return None
+def planned_path_sampling_generator(lines: list[tuple[tuple[float, float], tuple[float, float]]], sample_rate: float,
+                                    velocity: float, *args, **kwargs):
+    """
+    Generates sample points along each line of a survey plan in turn. Nothing is sampled on the transit between lines.
+
+    Args:
+        lines: the (start, end) [x y] points of each line, in survey order, see utils.survey_planning
+        sample_rate: The rate in hertz that we are sampling at
+        velocity: The velocity of the vessel in m/s
+
+    Yields:
+        [x y]: Successive [x y] positions
+    """
+    step_distance = calculate_step_value(sample_rate, velocity)
+    for start, end in lines:
+        start = np.asarray(start, dtype=float)
+        end = np.asarray(end, dtype=float)
+        length = np.linalg.norm(end - start)
+        direction = (end - start) / length if length > 0 else np.zeros(2)
+
+        for i in range(int(length // step_distance) + 1):
+            pos = start + direction * (i * step_distance)
+            yield pos[0], pos[1]
+
+
+def sample_path(mesh, path, error_pipeline, emitter, scheduler, report, side_effect=None, checkpointer=None,
+                metrics_prefix: str = "sample_path") -> None:
+    """
+    Runs a sampling path: looks up the depth at each position, runs it through the error pipeline, and emits it, on
+    the scheduler's cadence
+
+    Args:
+        mesh: the CustomTriMesh to sample, or a sounder with its get_shallowest_depth(), like a FootprintSounder or
+            CoherentLookup. The report records the lookup stats() of sounders that have them.
+        path: an iterator that yields x and y coordinates
+        error_pipeline: a list of ErrorType objects
+        emitter: the VectorEmitter to emit to, which is told the path position of each vector it emits
+        scheduler: a DeadlineScheduler that paces every position, including those off the mesh
+        report: a RunReport to record the run's performance in. The stages of each sample are also recorded in the
+            metrics registry when it is enabled.
+        side_effect: [Optional] a function called with each emitted vector
+        checkpointer: [Optional] a Checkpointer that periodically saves the run. Positions of the path before its
+            position are skipped, so a resumed run carries on where it stopped.
+        metrics_prefix: the name the stages are recorded under in the metrics registry, as <metrics_prefix>.<stage>
+
+    Returns:
+        None
+    """
+    first_position = checkpointer.position if checkpointer is not None else 0
+    if first_position > 0:
+        path = itertools.islice(path, first_position, None)
+
+    timer = StageTimer(report, metrics_prefix)
+    report.start()
+    scheduler.start()
+    with phase("sampling"):
+        for position, (x, y) in enumerate(path, first_position):
+            if not scheduler.wait():
+                report.record_skip()
+                if checkpointer is not None:
+                    checkpointer.advance(error_pipeline, emitter)
+                continue
+
+            timer.start()
+            z = mesh.get_shallowest_depth(x, y)
+            timer.lap("depth_lookup")
+            if z is None:
+                report.record_sample(emitted=False, off_mesh=True)
+            else:
+                new_vector = run_pipeline(error_pipeline, (x, y, z))
+                timer.lap("error_pipeline")
+
+                with phase("emission"):
+                    emitter.set_position(position)
+                    emitter.emit_vector(new_vector)
+                if side_effect:
+                    side_effect(new_vector)
+
+                timer.lap("emission")
+                timer.total("sample")
+                report.record_sample(emitted=True)
+
+            lateness = scheduler.complete()
+            if scheduler.paced:
+                report.record_deadline(lateness)
+            if checkpointer is not None:
+                checkpointer.advance(error_pipeline, emitter)
+    report.stop()
+    if hasattr(mesh, "stats"):
+        report.record_lookups(mesh.stats())
 
 
 PATH_GENERATORS = {
     "parallel": parallel_track_sampling_generator,
-    "drawn": drawn_path_sampling_generator
+    "drawn": drawn_path_sampling_generator,
+    "planned": planned_path_sampling_generator,
 }
@@ -0,0 +1,121 @@
+"""
+Declares and maintains the real-time scheduler that paces sampling to the requested sample rate
+"""
+import time
+from typing import Callable
+
+LATE_POLICIES = ["catch_up", "skip"]
+
+
+class DeadlineScheduler:
+    def __init__(self, sample_rate: float, time_scale: float = 1.0, late_policy: str = "catch_up", paced: bool = True,
+                 spin_secs: float = 0.001, clock: Callable[[], float] = time.perf_counter,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Paces samples against absolute deadlines on a monotonic clock. Sample k is released at start + k * period and
+        is due by the release of sample k + 1, so timing errors never accumulate: a sample that runs long only delays
+        the samples after it until the schedule is caught up.
+
+        When a sample is released more than a whole period late, the late policy decides what happens:
+            catch_up - run it anyway, back to back with the others, until the schedule is caught up
+            skip - drop it, like a real sounder that missed its ping, and move on to the current slot
+
+        Args:
+            sample_rate: the rate in Hertz that samples are taken at
+            time_scale: how much faster than real time to run, e.g. 10 for ten times real time
+            late_policy: "catch_up" or "skip"
+            paced: whether to wait at all. An unpaced scheduler releases every sample immediately.
+            spin_secs: how long before a release to stop sleeping and spin on the clock, as sleep can overshoot
+            clock: a monotonic clock returning seconds
+            sleep: a function that sleeps for a number of seconds
+
+        Raises:
+            ValueError if the late policy is unknown or the rate or time scale is not positive
+        """
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Unknown late policy '{late_policy}', expected one of {LATE_POLICIES}")
+        if sample_rate <= 0 or time_scale <= 0:
+            raise ValueError("The sample rate and time scale must be positive")
+        self.period = 1 / (sample_rate * time_scale)
+        self.late_policy = late_policy
+        self.paced = paced
+        self.spin_secs = spin_secs
+        self.clock = clock
+        self.sleep = sleep
+
+        self.start_time = None
+        self.k = 0
+        self.skipped = 0
+
+    def start(self) -> None:
+        """
+        Starts a new schedule, releasing the first sample now
+
+        Returns:
+            None
+        """
+        self.start_time = self.clock()
+        self.k = 0
+
+    def release_time(self, k: int) -> float:
+        """
+        Calculates when a sample is released
+
+        Args:
+            k: the index of the sample in the current schedule
+
+        Returns:
+            release: the release time on the scheduler's clock
+        """
+        return self.start_time + k * self.period
+
+    def wait(self) -> bool:
+        """
+        Waits for the release of the next sample
+
+        Returns:
+            run: True if the sample should be taken, or False if it was skipped under the skip policy
+        """
+        if not self.paced:
+            return True
+        if self.start_time is None:
+            self.start()
+
+        release = self.release_time(self.k)
+        now = self.clock()
+        if self.late_policy == "skip" and now > release + self.period:
+            self.k += 1
+            self.skipped += 1
+            return False
+
+        self._wait_until_(release, now)
+        return True
+
+    def complete(self) -> float:
+        """
+        Marks the current sample as finished
+
+        Returns:
+            lateness: how many seconds after its deadline the sample finished, negative if it was early
+        """
+        self.k += 1
+        if not self.paced:
+            return 0.0
+        return self.clock() - self.release_time(self.k)
+
+    def _wait_until_(self, target: float, now: float) -> None:
+        """
+        Sleeps until shortly before a time, then spins until it has passed
+
+        Args:
+            target: the time to wait until
+            now: the current time
+
+        Returns:
+            None
+        """
+        remaining = target - now
+        if remaining > self.spin_secs:
+            self.sleep(remaining - self.spin_secs)
+        while self.clock() < target:
+            pass
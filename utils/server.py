@@ -0,0 +1,300 @@
+"""
+Declares and maintains the simulator daemon: a local HTTP server, over TCP or a Unix socket, that keeps indexed meshes
+in memory and answers depth queries and simulation jobs against them
+"""
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from utils.cli_parsing import parse_error
+from utils.emitters import VectorEmitter
+from utils.error_pipeline import init_pipeline
+from utils.mesh import CustomTriMesh, load_mesh
+from utils.report import RunReport
+from utils.sampling_procedures import parallel_track_sampling_generator, sample_path
+from utils.scheduling import DeadlineScheduler, LATE_POLICIES
+
+
+class MeshCache:
+    def __init__(self, max_meshes: int = 4, loader: Callable[[str], CustomTriMesh] = load_mesh):
+        """
+        Keeps the most recently used meshes loaded and indexed. Every client asking for the same mesh shares one
+        index, and a mesh that is asked for while it is still loading is only loaded once.
+
+        Args:
+            max_meshes: the number of meshes to keep before evicting the least recently used one
+            loader: a function that loads and indexes a mesh from a data file or synthetic spec
+        """
+        self.max_meshes = max_meshes
+        self.loader = loader
+        self.meshes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, key: str) -> CustomTriMesh:
+        """
+        Finds a mesh, loading it if it is not cached
+
+        Args:
+            key: a 3D data file or synthetic:<faces>[:<terrain>[:<seed>]] spec
+
+        Returns:
+            mesh: the indexed mesh
+        """
+        with self._lock:
+            if key in self.meshes:
+                self.meshes.move_to_end(key)
+                self.hits += 1
+                return self.meshes[key]
+            self.misses += 1
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Loading can take minutes, so only requests for this mesh wait for it
+        with load_lock:
+            with self._lock:
+                if key in self.meshes:
+                    self.meshes.move_to_end(key)
+                    return self.meshes[key]
+            try:
+                mesh = self.loader(key)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            # Cache the mesh in the same step as dropping its load lock, so no request can find neither
+            with self._lock:
+                self.meshes[key] = mesh
+                while len(self.meshes) > self.max_meshes:
+                    self.meshes.popitem(last=False)
+                self._loading.pop(key, None)
+            return mesh
+
+    def info(self) -> dict:
+        """
+        Describes the cache
+
+        Returns:
+            info: the cached meshes from least to most recently used, the capacity, and the hit and miss counts
+        """
+        with self._lock:
+            return {
+                "meshes": [{"key": key, "faces": len(mesh.faces)} for key, mesh in self.meshes.items()],
+                "max_meshes": self.max_meshes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class NdjsonVectorEmitter(VectorEmitter):
+    def __init__(self, write: Callable[[bytes], None]):
+        """
+        An emitter that writes each vector as a line of json, used to stream simulation results to a client
+
+        Args:
+            write: a function that writes bytes to the client
+        """
+        self.write = write
+
+    def emit_vector(self, vector: tuple[float, float, float]) -> None:
+        """
+        Writes a vector as {"x": .., "y": .., "z": ..}
+
+        Args:
+            vector: an [x y z] vector
+
+        Returns:
+            None
+        """
+        x, y, z = vector
+        self.write(json.dumps({"x": float(x), "y": float(y), "z": None if z is None else float(z)}).encode() + b"\n")
+
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers requests against the server's mesh cache:
+        GET /meshes - the cached meshes
+        POST /depth - {"mesh": .., "points": [[x, y], ..]} answered with {"depths": [z or null, ..]}
+        POST /simulate - {"mesh": .., "velocity": .., "sample_rate": .., "errors": [..], "bounds": [..], "paced": ..,
+            "time_scale": .., "late_policy": ..} answered with a stream of json lines, one per vector, ending with a
+            {"report": ..} line
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        if self.path == "/meshes":
+            self._send_json_(200, self.server.mesh_cache.info())
+        else:
+            self._send_json_(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        try:
+            body = self._read_json_()
+            match self.path:
+                case "/depth":
+                    self._depth_(body)
+                case "/simulate":
+                    self._simulate_(body)
+                case _:
+                    self._send_json_(404, {"error": f"Unknown path {self.path}"})
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            self._send_json_(400, {"error": str(e)})
+
+    def _depth_(self, body: dict) -> None:
+        """
+        Answers a batched depth query
+
+        Args:
+            body: the request
+
+        Returns:
+            None
+        """
+        mesh = self.server.mesh_cache.get(body["mesh"])
+        depths = [mesh.get_shallowest_depth(float(x), float(y)) for x, y in body["points"]]
+        self._send_json_(200, {"depths": [None if z is None else float(z) for z in depths]})
+
+    def _simulate_(self, body: dict) -> None:
+        """
+        Runs a parallel track simulation job, streaming each vector as it is produced. The request is checked and the
+        job built before the response starts, so bad requests still get a 400. Once vectors are streaming, an error
+        ends the stream with an {"error": ..} line in place of the report.
+
+        Args:
+            body: the request
+
+        Returns:
+            None
+        """
+        mesh = self.server.mesh_cache.get(body["mesh"])
+        velocity = float(body.get("velocity", 1.0))
+        if velocity <= 0:
+            raise ValueError("The velocity must be positive")
+        sample_rate = float(body.get("sample_rate", 1.0))
+        time_scale = float(body.get("time_scale", 1.0))
+        late_policy = body.get("late_policy", "catch_up")
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Unknown late policy '{late_policy}', expected one of {LATE_POLICIES}")
+        errors = [err for err in (parse_error(spec) for spec in body.get("errors", [])) if err is not None]
+
+        if "bounds" in body:
+            min_x, min_y, max_x, max_y = (float(b) for b in body["bounds"])
+        else:
+            (min_x, min_y, _), (max_x, max_y, _) = mesh.bounds
+        init_pipeline(errors, min_x, min_y, max_x, max_y)
+
+        path = parallel_track_sampling_generator(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+                                                 sample_rate=sample_rate, velocity=velocity)
+        scheduler = DeadlineScheduler(sample_rate, time_scale=time_scale, late_policy=late_policy,
+                                      paced=bool(body.get("paced", False)))
+        report = RunReport(sample_rate=sample_rate * time_scale, name=body["mesh"])
+        emitter = NdjsonVectorEmitter(self._write_chunk_)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            sample_path(mesh, path, errors, emitter, scheduler, report)
+            last_line = {"report": report.summary()}
+        except Exception as e:
+            # The status has already been sent, so the error can only end the stream
+            self.close_connection = True
+            last_line = {"error": str(e)}
+        try:
+            self._write_chunk_(json.dumps(last_line).encode() + b"\n")
+            self._write_chunk_(b"")
+        except OSError:
+            # The client has gone
+            self.close_connection = True
+
+    def _read_json_(self) -> dict:
+        """
+        Reads the request body as json
+
+        Returns:
+            body: the parsed body
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json_(self, status: int, body: dict) -> None:
+        """
+        Sends a complete json response
+
+        Args:
+            status: the HTTP status code
+            body: the response body
+
+        Returns:
+            None
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk_(self, data: bytes) -> None:
+        """
+        Writes one chunk of a chunked response. An empty chunk ends the response.
+
+        Args:
+            data: the bytes to write
+
+        Returns:
+            None
+        """
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        # Replace a socket file left behind by a previous run
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(mesh_cache: MeshCache, host: str = "127.0.0.1", port: int = 8765, unix_socket: str = None,
+                quiet: bool = False) -> socketserver.BaseServer:
+    """
+    Creates a server that answers requests from a thread per connection, all sharing one mesh cache
+
+    Args:
+        mesh_cache: the cache of indexed meshes
+        host: the address to listen on
+        port: the TCP port to listen on, 0 for any free port
+        unix_socket: [Optional] listen on this Unix socket path instead of TCP
+        quiet: whether to stop logging requests
+
+    Returns:
+        server: the server, ready for serve_forever()
+    """
+    if unix_socket is not None:
+        server = ThreadingUnixHTTPServer(unix_socket, SimulatorRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), SimulatorRequestHandler)
+    server.mesh_cache = mesh_cache
+    server.quiet = quiet
+    return server
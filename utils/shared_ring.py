@@ -0,0 +1,209 @@
+"""
+Declares and maintains a shared memory ring buffer of sample records, so that processes on the same machine can read
+samples as they are produced without going through a file
+"""
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x45534852  # "ESHR"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"),
+    ("version", "<u4"),
+    ("capacity", "<u8"),
+    ("write_seq", "<u8"),
+    ("closed", "<u8"),
+])
+HEADER_SIZE = 64
+
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("z", "<f8"),
+])
+
+# Names of the rings created by this process, whose lifetime the resource tracker should keep managing
+_owned_names = set()
+
+
+def _views_(shm: shared_memory.SharedMemory, capacity: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Maps the header and the record array onto a shared memory block
+
+    Args:
+        shm: The shared memory block
+        capacity: The number of records in the ring
+
+    Returns:
+        (header, records): structured numpy views into the block
+    """
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf, offset=0)
+    records = np.ndarray((capacity,), dtype=RECORD_DTYPE, buffer=shm.buf, offset=HEADER_SIZE)
+    return header, records
+
+
+class SharedMemoryRing:
+    def __init__(self, name: str, capacity: int = 65536):
+        """
+        Creates a named shared memory block holding a header and a ring of fixed size [seq x y z] records. Sequence
+        numbers start at 1 and the header holds the sequence number of the last completed record, so readers can tell
+        when they have fallen more than one ring behind and records were overwritten.
+
+        Args:
+            name: The name of the shared memory block that readers attach to
+            capacity: The number of records the ring holds before the oldest is overwritten
+        """
+        self.name = name
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self.header, self.records = _views_(self.shm, capacity)
+        _owned_names.add(name)
+
+        self.header["magic"] = MAGIC
+        self.header["version"] = VERSION
+        self.header["capacity"] = capacity
+        self.header["write_seq"] = 0
+        self.header["closed"] = 0
+        self._seq = 0
+
+    def write(self, x: float, y: float, z: float) -> int:
+        """
+        Writes a record into the next slot of the ring. The slot's sequence number is cleared before its values are
+        overwritten and stored after them, and the header is advanced last, so a reader that finds the same sequence
+        number in the slot before and after copying it knows the copy is whole.
+
+        Args:
+            x: the x coordinate
+            y: the y coordinate
+            z: the z coordinate
+
+        Returns:
+            seq: the sequence number of the record
+        """
+        self._seq += 1
+        record = self.records[(self._seq - 1) % self.capacity]
+        record["seq"] = 0
+        record["x"] = x
+        record["y"] = y
+        record["z"] = z
+        record["seq"] = self._seq
+        self.header["write_seq"] = self._seq
+        return self._seq
+
+    def close(self, unlink: bool = True) -> None:
+        """
+        Marks the ring as finished and releases the block
+
+        Args:
+            unlink: Whether to remove the block's name. Readers that are already attached keep their mapping.
+
+        Returns:
+            None
+        """
+        self.header["closed"] = 1
+        del self.header, self.records
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _owned_names.discard(self.name)
+
+
+class SharedMemoryRingReader:
+    def __init__(self, name: str, start: str = "oldest"):
+        """
+        Attaches to a ring created by SharedMemoryRing
+
+        Args:
+            name: The name of the shared memory block
+            start: "oldest" to begin with the oldest record still in the ring, or "latest" to only read records
+                written after attaching
+
+        Raises:
+            FileNotFoundError if no block has the name, ValueError if the block is not a ring
+        """
+        self.shm = shared_memory.SharedMemory(name=name, create=False)
+        # The reader does not own the block, so stop the resource tracker from unlinking it when this process exits
+        if name not in _owned_names:
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf, offset=0)
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            del header
+            self.shm.close()
+            raise ValueError(f"Shared memory block '{name}' is not a sample ring")
+        self.capacity = int(header["capacity"])
+        del header
+
+        self.header, self.records = _views_(self.shm, self.capacity)
+        head = int(self.header["write_seq"])
+        self.next_seq = max(head - self.capacity, 0) + 1 if start == "oldest" else head + 1
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the writer has finished
+
+        Returns:
+            closed: True once the writer has closed the ring
+        """
+        return bool(self.header["closed"])
+
+    def read(self, max_records: int = None) -> tuple[np.ndarray, int]:
+        """
+        Reads the records written since the last call
+
+        Args:
+            max_records: [Optional] the most records to return
+
+        Returns:
+            (records, dropped): a copy of the new records, as a structured array with seq, x, y, and z fields, and the
+                number of records that were overwritten before or while they were being read
+        """
+        head = int(self.header["write_seq"])
+        dropped = 0
+
+        # The writer has lapped us
+        if head - self.next_seq + 1 > self.capacity:
+            dropped = head - self.capacity + 1 - self.next_seq
+            self.next_seq = head - self.capacity + 1
+
+        count = head - self.next_seq + 1
+        if max_records is not None:
+            count = min(count, max_records)
+        if count <= 0:
+            self.dropped += dropped
+            return np.empty(0, dtype=RECORD_DTYPE), dropped
+
+        start = (self.next_seq - 1) % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            out = self.records[start:end].copy()
+        else:
+            out = np.concatenate((self.records[start:], self.records[:end - self.capacity]))
+
+        # Anything the writer started overwriting before or while we were copying is dropped rather than returned torn
+        expected = np.arange(self.next_seq, self.next_seq + count, dtype=np.uint64)
+        slots = (expected - 1) % self.capacity
+        stale = np.flatnonzero((out["seq"] != expected) | (self.records["seq"][slots] != expected))
+        if len(stale) > 0:
+            keep_from = int(stale[-1]) + 1
+            dropped += keep_from
+            out = out[keep_from:]
+
+        self.next_seq += count
+        self.dropped += dropped
+        return out, dropped
+
+    def close(self) -> None:
+        """
+        Detaches from the block
+
+        Returns:
+            None
+        """
+        del self.header, self.records
+        self.shm.close()
@@ -0,0 +1,184 @@
+"""
+Declares and maintains the library API, which runs simulations in process and returns the samples as structured numpy
+arrays instead of emitting them
+"""
+from typing import Iterable, Iterator
+
+import numpy as np
+from trimesh import Trimesh
+
+from utils.depth_cache import DepthCache
+from utils.error_pipeline import ErrorType, Dropout, FalseBottom
+from utils.mesh import CustomTriMesh, load_mesh
+from utils.sampling_procedures import parallel_track_sampling_generator, planned_path_sampling_generator, \
+    calculate_step_value
+from utils.survey_planning import plan_survey
+
+# Bits of the flags field
+FLAG_OFF_MESH = 1
+FLAG_DROPOUT = 2
+FLAG_FALSE_BOTTOM = 4
+
+SAMPLE_DTYPE = np.dtype([
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("true_z", "<f8"),
+    ("measured_z", "<f8"),
+    ("t", "<f8"),
+    ("flags", "u1"),
+])
+
+
+def as_mesh(mesh: CustomTriMesh | DepthCache | Trimesh | str) -> CustomTriMesh | DepthCache:
+    """
+    Turns a mesh argument into an indexed mesh, without printing. Index a mesh once and pass the CustomTriMesh, or a
+    DepthCache of it, to run many simulations.
+
+    Args:
+        mesh: an indexed mesh, a DepthCache, a Trimesh to index, or a data file or synthetic spec to load and index
+
+    Returns:
+        mesh: the indexed mesh, or the DepthCache
+    """
+    if isinstance(mesh, (CustomTriMesh, DepthCache)):
+        return mesh
+    if isinstance(mesh, Trimesh):
+        return CustomTriMesh(mesh, verbose=False)
+    return load_mesh(mesh, verbose=False)
+
+
+def parallel_path(mesh: CustomTriMesh, velocity: float = 1.0, sample_rate: float = 1.0,
+                  bounds: tuple[float, float, float, float] = None) -> Iterator[tuple[float, float]]:
+    """
+    Makes a parallel track path over a mesh, for use with simulate()
+
+    Args:
+        mesh: the indexed mesh
+        velocity: the velocity of the vessel in m/s
+        sample_rate: the rate in Hertz that samples are taken at
+        bounds: [Optional] the (min_x, min_y, max_x, max_y) area to survey. Defaults to the whole mesh.
+
+    Returns:
+        path: an iterator of [x y] positions
+    """
+    if bounds is not None:
+        min_x, min_y, max_x, max_y = bounds
+    else:
+        (min_x, min_y, _), (max_x, max_y, _) = mesh.bounds
+    return parallel_track_sampling_generator(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+                                             sample_rate=sample_rate, velocity=velocity)
+
+
+def planned_path(mesh: CustomTriMesh, velocity: float = 1.0, sample_rate: float = 1.0, line_spacing: float = None,
+                 heading: float = 0.0) -> Iterator[tuple[float, float]]:
+    """
+    Makes a planned survey path over a mesh, clipped to its footprint, for use with simulate()
+
+    Args:
+        mesh: the indexed mesh
+        velocity: the velocity of the vessel in m/s
+        sample_rate: the rate in Hertz that samples are taken at
+        line_spacing: [Optional] the distance between survey lines. Defaults to the distance travelled between samples.
+        heading: the heading of the lines in degrees clockwise from the y axis
+
+    Returns:
+        path: an iterator of [x y] positions
+    """
+    line_spacing = line_spacing or calculate_step_value(sample_rate, velocity)
+    plan = plan_survey(mesh, line_spacing, heading)
+    return planned_path_sampling_generator(plan.lines, sample_rate=sample_rate, velocity=velocity)
+
+
+def _run_flagged_pipeline_(errors: list[ErrorType], vector: tuple[float, float, float]) \
+        -> tuple[tuple[float, float, float], int]:
+    """
+    Runs a vector through an error pipeline, noting which error types changed it
+
+    Args:
+        errors: the error pipeline
+        vector: an [x y z] vector
+
+    Returns:
+        (new_vector, flags): the processed vector and the flag bits of the errors that applied
+    """
+    flags = 0
+    for err in errors:
+        new_vector = err.eval(vector)
+        if isinstance(err, Dropout) and err.drops_in_a_row > 0:
+            flags |= FLAG_DROPOUT
+        elif isinstance(err, FalseBottom) and new_vector is not vector:
+            flags |= FLAG_FALSE_BOTTOM
+        vector = new_vector
+    return vector, flags
+
+
+def simulate_iter(mesh: CustomTriMesh | DepthCache | Trimesh | str, path: Iterable[tuple[float, float]],
+                  errors: list[ErrorType] = None, sample_rate: float = 1.0, start_time: float = 0.0,
+                  include_off_mesh: bool = True, chunk_size: int = 4096) -> Iterator[np.ndarray]:
+    """
+    Simulates sampling along a path, yielding the samples in chunks so long runs use constant memory. Nothing is
+    printed, emitted, or waited for.
+
+    Each sample has the fields:
+        x, y - the position
+        true_z - the depth of the mesh, nan off the mesh
+        measured_z - the depth after the error pipeline, nan off the mesh
+        t - the time of the sample, start_time + k / sample_rate for the k-th position of the path
+        flags - FLAG_OFF_MESH, FLAG_DROPOUT, and FLAG_FALSE_BOTTOM bits
+
+    Args:
+        mesh: an indexed mesh, a DepthCache to share between simulations, a Trimesh, or a data file or synthetic spec
+        path: the [x y] positions to sample, like parallel_path() or an (N, 2) array
+        errors: [Optional] the error pipeline. FalseBottom errors must already be initialised with init_debris.
+        sample_rate: the rate in Hertz that samples are taken at
+        start_time: the time of the first sample in seconds
+        include_off_mesh: whether to include positions off the mesh
+        chunk_size: the most samples per yielded array
+
+    Yields:
+        samples: structured arrays of SAMPLE_DTYPE
+    """
+    mesh = as_mesh(mesh)
+    errors = errors if errors is not None else []
+    rows = []
+
+    for k, (x, y) in enumerate(path):
+        t = start_time + k / sample_rate
+        z = mesh.get_shallowest_depth(x, y)
+        if z is None:
+            if not include_off_mesh:
+                continue
+            rows.append((x, y, np.nan, np.nan, t, FLAG_OFF_MESH))
+        else:
+            (_, _, measured_z), flags = _run_flagged_pipeline_(errors, (x, y, z))
+            rows.append((x, y, z, measured_z, t, flags))
+
+        if len(rows) == chunk_size:
+            yield np.array(rows, dtype=SAMPLE_DTYPE)
+            rows = []
+
+    if rows:
+        yield np.array(rows, dtype=SAMPLE_DTYPE)
+
+
+def simulate(mesh: CustomTriMesh | DepthCache | Trimesh | str, path: Iterable[tuple[float, float]],
+             errors: list[ErrorType] = None, sample_rate: float = 1.0, start_time: float = 0.0,
+             include_off_mesh: bool = True) -> np.ndarray:
+    """
+    Simulates sampling along a path and returns every sample, see simulate_iter() for the fields
+
+    Args:
+        mesh: an indexed mesh, a DepthCache to share between simulations, a Trimesh, or a data file or synthetic spec
+        path: the [x y] positions to sample, like parallel_path() or an (N, 2) array
+        errors: [Optional] the error pipeline. FalseBottom errors must already be initialised with init_debris.
+        sample_rate: the rate in Hertz that samples are taken at
+        start_time: the time of the first sample in seconds
+        include_off_mesh: whether to include positions off the mesh
+
+    Returns:
+        samples: a structured array of SAMPLE_DTYPE
+    """
+    chunks = list(simulate_iter(mesh, path, errors, sample_rate, start_time, include_off_mesh))
+    if not chunks:
+        return np.empty(0, dtype=SAMPLE_DTYPE)
+    return np.concatenate(chunks)
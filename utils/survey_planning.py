@@ -0,0 +1,214 @@
+"""
+Declares and maintains the survey line planner, which lays parallel survey lines at any spacing and heading, clips them
+to the mesh's footprint so no effort is spent off the mesh, and orders them to keep transits between lines short
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+from utils.mesh import CustomTriMesh
+
+
+class SurveyPlan:
+    def __init__(self, lines: list[tuple[tuple[float, float], tuple[float, float]]], line_spacing: float,
+                 heading: float, sweep_length: float):
+        """
+        An ordered set of survey lines
+
+        Args:
+            lines: the (start, end) [x y] points of each line, in the order and direction they are surveyed
+            line_spacing: the distance between neighbouring lines
+            heading: the heading of the lines in degrees clockwise from the y axis
+            sweep_length: the length of the same lines had they not been clipped to the footprint
+        """
+        self.lines = lines
+        self.line_spacing = line_spacing
+        self.heading = heading
+        self.sweep_length = sweep_length
+
+    @property
+    def survey_length(self) -> float:
+        """
+        The total length of the survey lines
+        """
+        return sum(math.dist(start, end) for start, end in self.lines)
+
+    @property
+    def transit_length(self) -> float:
+        """
+        The total distance between the end of each line and the start of the next
+        """
+        return sum(math.dist(self.lines[i][1], self.lines[i + 1][0]) for i in range(len(self.lines) - 1))
+
+    def summary(self) -> dict:
+        """
+        Summarises the plan
+
+        Returns:
+            summary: the number of lines, their spacing and heading, and the survey, transit, and unclipped lengths
+        """
+        return {
+            "lines": len(self.lines),
+            "line_spacing": self.line_spacing,
+            "heading": self.heading,
+            "survey_length": self.survey_length,
+            "transit_length": self.transit_length,
+            "sweep_length": self.sweep_length,
+        }
+
+    def format_text(self) -> str:
+        """
+        Formats the summary as text
+
+        Returns:
+            text: the formatted summary
+        """
+        saved = 1 - self.survey_length / self.sweep_length if self.sweep_length > 0 else 0.0
+        return (f"Planned {len(self.lines)} survey lines {self.line_spacing:g} m apart at {self.heading:g} degrees: "
+                f"{self.survey_length:.0f} m of survey and {self.transit_length:.0f} m of transit, "
+                f"{saved:.0%} less survey than sweeping the bounding box")
+
+
+def footprint(mesh: CustomTriMesh) -> np.ndarray:
+    """
+    Finds the search bins the mesh covers. A bin is indexed when the bounding box of a face overlaps it, which
+    overstates the footprint along coastlines, so bins on the edge of the footprint are dropped while their centre is
+    off the mesh.
+
+    Args:
+        mesh: the indexed mesh
+
+    Returns:
+        covered: a boolean array, indexed like search_field, of whether each bin is over the mesh
+    """
+    covered = np.vectorize(lambda faces: faces is not None, otypes=[bool])(mesh.search_field)
+    nx, ny = covered.shape
+
+    padded = np.pad(covered, 1)
+    interior = padded[2:, 1:-1] & padded[:-2, 1:-1] & padded[1:-1, 2:] & padded[1:-1, :-2]
+    edges = deque(zip(*np.nonzero(covered & ~interior)))
+    while edges:
+        i, j = edges.popleft()
+        if not covered[i, j]:
+            continue
+        if not mesh.point_in_mesh(mesh.min_x + (i + 0.5) * mesh.x_bin_size, mesh.min_y + (j + 0.5) * mesh.y_bin_size):
+            covered[i, j] = False
+            # Its neighbours are now on the edge
+            edges.extend((i + di, j + dj) for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                         if 0 <= i + di < nx and 0 <= j + dj < ny and covered[i + di, j + dj])
+    return covered
+
+
+def _clip_line_(mesh: CustomTriMesh, covered: np.ndarray, start: np.ndarray, direction: np.ndarray, length: float,
+                step: float) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Clips a line to the footprint
+
+    Args:
+        mesh: the indexed mesh
+        covered: the footprint, see footprint()
+        start: the [x y] start of the line
+        direction: the unit [x y] direction of the line
+        length: the length of the line
+        step: the distance between the points of the line tested against the footprint
+
+    Returns:
+        segments: the (start, end) [x y] points of each part of the line over the footprint
+    """
+    distances = np.arange(0, length + step / 2, step)
+    points = start + distances[:, None] * direction
+    # Rounding can put points on the edge of the bounding box just outside it
+    lower, upper = [mesh.min_x, mesh.min_y], [mesh.max_x, mesh.max_y]
+    points = np.where(np.isclose(points, lower), lower, points)
+    points = np.where(np.isclose(points, upper), upper, points)
+    x_idx = np.floor((points[:, 0] - mesh.min_x) / mesh.x_bin_size).astype(int)
+    y_idx = np.floor((points[:, 1] - mesh.min_y) / mesh.y_bin_size).astype(int)
+    # Points on the max edge of the bounding box belong in the last bin
+    x_idx = np.where(x_idx == covered.shape[0], x_idx - 1, x_idx)
+    y_idx = np.where(y_idx == covered.shape[1], y_idx - 1, y_idx)
+
+    inside = (x_idx >= 0) & (x_idx < covered.shape[0]) & (y_idx >= 0) & (y_idx < covered.shape[1])
+    over_mesh = np.zeros(len(points), dtype=bool)
+    over_mesh[inside] = covered[x_idx[inside], y_idx[inside]]
+
+    changes = np.diff(np.concatenate(([0], over_mesh.astype(np.int8), [0])))
+    return [(points[first], points[last]) for first, last in zip(np.flatnonzero(changes == 1),
+                                                                 np.flatnonzero(changes == -1) - 1)]
+
+
+def order_lines(segments: list[tuple[np.ndarray, np.ndarray]]) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Orders survey lines greedily: starting from the first line, each next line is the one with the nearest end,
+    surveyed from that end
+
+    Args:
+        segments: the (start, end) [x y] points of each line
+
+    Returns:
+        lines: the lines in survey order, some of them reversed
+    """
+    if len(segments) == 0:
+        return []
+    starts = np.asarray([s for s, _ in segments], dtype=float)
+    ends = np.asarray([e for _, e in segments], dtype=float)
+    remaining = np.ones(len(segments), dtype=bool)
+
+    lines = []
+    position = starts[0]
+    for _ in range(len(segments)):
+        to_start = np.where(remaining, np.hypot(*(starts - position).T), np.inf)
+        to_end = np.where(remaining, np.hypot(*(ends - position).T), np.inf)
+        i_start, i_end = int(np.argmin(to_start)), int(np.argmin(to_end))
+        if to_start[i_start] <= to_end[i_end]:
+            line = (starts[i_start], ends[i_start])
+            remaining[i_start] = False
+        else:
+            line = (ends[i_end], starts[i_end])
+            remaining[i_end] = False
+        lines.append(line)
+        position = line[1]
+    return lines
+
+
+def plan_survey(mesh: CustomTriMesh, line_spacing: float, heading: float = 0.0) -> SurveyPlan:
+    """
+    Plans survey lines over the mesh. Lines are laid line_spacing apart across the whole bounding box, clipped to the
+    footprint at the resolution of the search bins, then ordered to keep the transits between them short.
+
+    Args:
+        mesh: the indexed mesh
+        line_spacing: the distance between neighbouring lines, in meters
+        heading: the heading of the lines in degrees clockwise from the y axis. 0 runs lines along y like the parallel
+            track path, 90 runs them along x.
+
+    Returns:
+        plan: the ordered survey lines
+
+    Raises:
+        ValueError if the line spacing is not positive
+    """
+    if line_spacing <= 0:
+        raise ValueError("The line spacing must be positive")
+    theta = math.radians(heading)
+    along = np.asarray([math.sin(theta), math.cos(theta)])
+    across = np.asarray([math.cos(theta), -math.sin(theta)])
+
+    corners = np.asarray([[mesh.min_x, mesh.min_y], [mesh.min_x, mesh.max_y],
+                          [mesh.max_x, mesh.min_y], [mesh.max_x, mesh.max_y]])
+    u_min, u_max = (corners @ along).min(), (corners @ along).max()
+    v_min, v_max = (corners @ across).min(), (corners @ across).max()
+    # Test each line at least twice per search bin
+    step = min(mesh.x_bin_size, mesh.y_bin_size) / 2
+
+    covered = footprint(mesh)
+    segments = []
+    sweep_length = 0.0
+    for v in np.arange(v_min, v_max + line_spacing * 1e-9, line_spacing):
+        # Only the part of the line inside the bounding box counts towards the sweep
+        inside = _clip_line_(mesh, np.ones_like(covered), u_min * along + v * across, along, u_max - u_min, step)
+        sweep_length += sum(math.dist(s, e) for s, e in inside)
+        segments.extend(_clip_line_(mesh, covered, u_min * along + v * across, along, u_max - u_min, step))
+
+    lines = [(tuple(map(float, s)), tuple(map(float, e))) for s, e in order_lines(segments)]
+    return SurveyPlan(lines, line_spacing, heading, sweep_length)
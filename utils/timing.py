@@ -1,14 +1,199 @@
 """
-Declares and maintains utility decorators to time function calls
+Declares and maintains utility decorators to time function calls, and the registry that collects their timings
 """
 from functools import wraps
+import json
+import math
+import threading
 import time
 from typing import Callable, Any
 
 
+class LatencyHistogram:
+    def __init__(self, min_secs: float = 1e-7, max_secs: float = 1e3, growth: float = 1.05):
+        """
+        A histogram of durations with logarithmically sized buckets, so that recording is constant time and memory and
+        percentiles are accurate to within the bucket growth factor (5% by default) at any scale.
+
+        Args:
+            min_secs: Durations shorter than this are counted in the first bucket
+            max_secs: Durations longer than this are counted in the last bucket
+            growth: The ratio between the upper bounds of neighbouring buckets
+        """
+        self.min_secs = min_secs
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.num_buckets = int(math.ceil(math.log(max_secs / min_secs) / self._log_growth)) + 1
+        self.buckets = [0] * self.num_buckets
+
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, secs: float) -> None:
+        """
+        Adds a duration to the histogram
+
+        Args:
+            secs: the duration in seconds
+
+        Returns:
+            None
+        """
+        if secs > self.min_secs:
+            idx = min(int(math.log(secs / self.min_secs) / self._log_growth) + 1, self.num_buckets - 1)
+        else:
+            idx = 0
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += secs
+        if secs < self.min:
+            self.min = secs
+        if secs > self.max:
+            self.max = secs
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Adds the counts of another histogram with the same bucket layout to this one
+
+        Args:
+            other: the histogram to merge in
+
+        Returns:
+            None
+        """
+        for i, c in enumerate(other.buckets):
+            self.buckets[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """
+        Estimates a percentile of the recorded durations
+
+        Args:
+            p: the percentile, between 0 and 100
+
+        Returns:
+            secs: the estimated duration, or nan if nothing was recorded
+        """
+        if self.count == 0:
+            return math.nan
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for idx, c in enumerate(self.buckets):
+            seen += c
+            if seen >= rank:
+                # The geometric middle of the bucket, clamped to what was actually observed
+                upper = self.min_secs * self.growth ** idx
+                estimate = upper / math.sqrt(self.growth) if idx > 0 else self.min_secs
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Summarises the histogram
+
+        Returns:
+            summary: the count, total, mean, min, max, p50, p95, and p99 durations in seconds
+        """
+        return {
+            "count": self.count,
+            "total_secs": self.total,
+            "mean_secs": self.total / self.count if self.count else math.nan,
+            "min_secs": self.min if self.count else math.nan,
+            "p50_secs": self.percentile(50),
+            "p95_secs": self.percentile(95),
+            "p99_secs": self.percentile(99),
+            "max_secs": self.max if self.count else math.nan,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Collects call counts and latency histograms by name. Disabled registries record nothing, so the timing cost is
+        only paid when metrics were asked for. Recording is locked, as fleet vessels record from their own threads.
+        """
+        self.enabled = False
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, secs: float) -> None:
+        """
+        Records a duration against a name
+
+        Args:
+            name: the name of the timed operation
+            secs: the duration in seconds
+
+        Returns:
+            None
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(secs)
+
+    def reset(self) -> None:
+        """
+        Removes all recorded durations
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.histograms = {}
+
+    def summary(self) -> dict:
+        """
+        Summarises every histogram
+
+        Returns:
+            summary: a mapping of name to histogram summary
+        """
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def format_text(self) -> str:
+        """
+        Formats the summary as a table, with durations in milliseconds
+
+        Returns:
+            table: the formatted summary
+        """
+        lines = [f"{'function':<48}{'calls':>10}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<48}{s['count']:>10}{s['total_secs']:>10.3f}{s['p50_secs'] * 1e3:>10.3f}"
+                         f"{s['p95_secs'] * 1e3:>10.3f}{s['p99_secs'] * 1e3:>10.3f}{s['max_secs'] * 1e3:>10.3f}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the summary to a json file
+
+        Args:
+            path: the file to write to
+
+        Returns:
+            None
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+# The registry that @timed records into
+registry = MetricsRegistry()
+
+
 def timed(func: Callable) -> Callable:
     """
-    Function decorator for monitoring execution time
+    Function decorator for monitoring execution time. When the metrics registry is enabled, each call's duration is
+    recorded under the function's qualified name.
 
     Args:
         func: The function to time
@@ -16,12 +201,14 @@ def timed(func: Callable) -> Callable:
     Returns:
         result: the result of the function
     """
+    name = func.__qualname__
+
     @wraps(func)
-    def timed_wrapper(*args, **kwargs) -> (Any, float):
+    def timed_wrapper(*args, **kwargs) -> Any:
+        if not registry.enabled:
+            return func(*args, **kwargs)
         start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        total_time = end_time - start_time
-        print(f'Function {func.__name__}{args} {kwargs} Took {total_time:.5f} seconds')
+        registry.record(name, time.perf_counter() - start_time)
         return result
     return timed_wrapper
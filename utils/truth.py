@@ -0,0 +1,131 @@
+"""
+Declares and maintains ground truth recordings: the clean [x y z] soundings of a path, recorded once so that error
+pipelines can be replayed over them without loading the mesh or looking up a single depth
+"""
+import os
+import time
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from utils.emitters import BinaryVectorEmitter, VectorEmitter
+from utils.error_pipeline import ErrorType, init_pipeline, run_pipeline_array
+from utils.mesh import CustomTriMesh
+from utils.report import RunReport, StageTimer
+from utils.simulation import simulate_iter
+
+# A recording is the same packed little-endian float64 [x y z] records that the bin emitter writes
+TRUTH_DTYPE = np.dtype("<f8")
+
+
+def record_truth(mesh: CustomTriMesh, path: Iterable[tuple[float, float]], filename: str,
+                 chunk_size: int = 65536) -> int:
+    """
+    Samples a path as fast as possible and records the true depth of every position on the mesh
+
+    Args:
+        mesh: the indexed mesh
+        path: the [x y] positions to sample
+        filename: the path of the recording, which is replaced
+        chunk_size: the number of soundings written at a time
+
+    Returns:
+        count: the number of soundings recorded
+    """
+    count = 0
+    with open(filename, "wb") as f:
+        for samples in simulate_iter(mesh, path, include_off_mesh=False, chunk_size=chunk_size):
+            soundings = np.column_stack((samples["x"], samples["y"], samples["true_z"]))
+            f.write(soundings.astype(TRUTH_DTYPE).tobytes())
+            count += len(samples)
+    return count
+
+
+def load_truth(filename: str) -> np.ndarray:
+    """
+    Maps a recording into memory, so replays only read the pages they use
+
+    Args:
+        filename: the path of the recording
+
+    Returns:
+        soundings: a read only (N, 3) array of [x y z] soundings
+
+    Raises:
+        ValueError if the file is not a whole number of records
+    """
+    size = os.path.getsize(filename)
+    if size % BinaryVectorEmitter.record.size != 0:
+        raise ValueError(f"{filename} is not a recording of packed float64 [x y z] records")
+    if size == 0:
+        return np.empty((0, 3), dtype=TRUTH_DTYPE)
+    return np.memmap(filename, dtype=TRUTH_DTYPE, mode="r").reshape(-1, 3)
+
+
+def init_replay_errors(soundings: np.ndarray, errors: list[ErrorType]) -> None:
+    """
+    Places the debris of FalseBottom errors within the bounds of the recorded soundings, as there is no mesh to take
+    the bounds from
+
+    Args:
+        soundings: the (N, 3) recording
+        errors: the error pipeline
+
+    Returns:
+        None
+    """
+    if len(soundings) == 0:
+        return
+    min_x, min_y = soundings[:, :2].min(axis=0)
+    max_x, max_y = soundings[:, :2].max(axis=0)
+    init_pipeline(errors, float(min_x), float(min_y), float(max_x), float(max_y))
+
+
+def replay_iter(soundings: np.ndarray, errors: list[ErrorType], chunk_size: int = 65536) -> Iterator[np.ndarray]:
+    """
+    Runs a recording through an error pipeline a chunk at a time, using each error's vectorised eval_array()
+
+    Args:
+        soundings: the (N, 3) recording, see load_truth()
+        errors: the error pipeline. FalseBottom errors must already be initialised, see init_replay_errors().
+        chunk_size: the number of soundings processed at a time
+
+    Yields:
+        vectors: (chunk_size, 3) arrays of the processed vectors, the last one may be shorter
+    """
+    for start in range(0, len(soundings), chunk_size):
+        yield run_pipeline_array(errors, soundings[start:start + chunk_size])
+
+
+def replay(soundings: np.ndarray, errors: list[ErrorType], emitter: VectorEmitter, chunk_size: int = 65536,
+           report: RunReport = None) -> dict:
+    """
+    Replays a recording through an error pipeline into an emitter, without pacing
+
+    Args:
+        soundings: the (N, 3) recording, see load_truth()
+        errors: the error pipeline. FalseBottom errors must already be initialised, see init_replay_errors().
+        emitter: the emitter to write the processed vectors to
+        chunk_size: the number of soundings processed at a time
+        report: [Optional] a RunReport to count the soundings in and time each chunk's stages against
+
+    Returns:
+        summary: the number of soundings replayed, how long it took, and the rate
+    """
+    if report is None:
+        report = RunReport(record_stages=False)
+    timer = StageTimer(report, "replay")
+    report.start()
+    start = time.perf_counter()
+    # The pipeline runs inside the generator, so each chunk is timed from the end of the last one
+    timer.start()
+    for vectors in replay_iter(soundings, errors, chunk_size):
+        timer.lap("error_pipeline")
+        emitter.emit_vectors(vectors)
+        timer.lap("emission")
+        timer.total("chunk")
+        report.record_samples(len(vectors), len(vectors))
+        timer.start()
+    secs = time.perf_counter() - start
+    report.stop()
+    return {"soundings": len(soundings), "secs": secs, "soundings_per_sec": len(soundings) / secs if secs > 0 else 0.0}